@@ -0,0 +1,4 @@
+"""
+Бенчмарки Ryabot Island
+Запускаются без сети: локальный бэкенд БД (DB_BACKEND=memory) и фейковая сессия Bot API
+"""
@@ -0,0 +1,118 @@
+"""
+Фейковая сессия Telegram Bot API для бенчмарков Ryabot Island
+Запросы бота не уходят в сеть: сессия отвечает правдоподобными объектами
+и считает вызовы по методам
+"""
+import asyncio
+import itertools
+import typing
+from collections import Counter
+from datetime import datetime
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, TelegramMethod
+from aiogram.types import Message, Update, User
+
+# Токен в формате Telegram (проверяется aiogram при создании Bot)
+BENCH_TOKEN = "123456789:BENCHMARK-ryabot-island-fake-token"
+BOT_USER = User(id=123456789, is_bot=True, first_name="Ryabot", username="ryabot_bench_bot")
+
+
+def _returns_message(method: TelegramMethod) -> bool:
+    """Метод возвращает Message (sendMessage, editMessageText, ...)"""
+    returning = getattr(method, "__returning__", None)
+    return returning is Message or Message in typing.get_args(returning)
+
+
+class FakeSession(BaseSession):
+    """Сессия aiogram без сети с имитацией задержки Bot API"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        super().__init__()
+        self.latency_ms = latency_ms
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+        self.calls[type(method).__name__] += 1
+
+        if isinstance(method, GetMe):
+            return BOT_USER
+
+        if _returns_message(method):
+            chat_id = getattr(method, "chat_id", None) or 0
+            return Message.model_validate(
+                {
+                    "message_id": getattr(method, "message_id", None) or next(self._message_ids),
+                    "date": datetime.now(),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": BOT_USER.model_dump(),
+                    "text": getattr(method, "text", None) or "",
+                },
+                context={"bot": bot},
+            )
+
+        return True
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class UpdateFactory:
+    """Сборка входящих Update от имени игроков"""
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"Player{user_id}", "username": f"player{user_id}"}
+
+    def message(self, user_id: int, text: str) -> Update:
+        """Текстовое сообщение или команда"""
+        return Update.model_validate(
+            {
+                "update_id": next(self._update_ids),
+                "message": {
+                    "message_id": next(self._message_ids),
+                    "date": datetime.now(),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": self._user(user_id),
+                    "text": text,
+                },
+            },
+            context={"bot": self.bot},
+        )
+
+    def callback(self, user_id: int, data: str) -> Update:
+        """Нажатие inline кнопки под сообщением бота"""
+        return Update.model_validate(
+            {
+                "update_id": next(self._update_ids),
+                "callback_query": {
+                    "id": str(next(self._update_ids)),
+                    "from": self._user(user_id),
+                    "chat_instance": f"bench-{user_id}",
+                    "data": data,
+                    "message": {
+                        "message_id": next(self._message_ids),
+                        "date": datetime.now(),
+                        "chat": {"id": user_id, "type": "private"},
+                        "from": BOT_USER.model_dump(),
+                        "text": "🏝️",
+                    },
+                },
+            },
+            context={"bot": self.bot},
+        )
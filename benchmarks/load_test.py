@@ -0,0 +1,290 @@
+"""
+Нагрузочный тест Ryabot Island
+Прогоняет синтетические сессии игроков через настоящий Dispatcher из
+main.setup_bot (все middleware и роутеры) с фейковой сессией Bot API и
+локальным бэкендом БД. Отчет: p50/p95/p99 задержки апдейта, апдейтов в
+секунду, запросов к БД на апдейт и RSS процесса.
+
+Запуск:
+    python -m benchmarks.load_test --users 200 --db-latency-ms 5
+    DATABASE_URL=postgres://... python -m benchmarks.load_test --backend postgres
+    SUPABASE_URL=... SUPABASE_ANON_KEY=... python -m benchmarks.load_test --backend supabase
+"""
+import os
+from benchmarks.fake_bot import BENCH_TOKEN
+
+# Локальный бэкенд должен быть выбран до первого импорта database.*
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("BOT_TOKEN", BENCH_TOKEN)
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.callback_codec import HIRE_SLOT, START_EXPEDITION, TRAIN
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Шаги сессии: (тип апдейта, текст или callback_data)
+NEW_PLAYER: List[Tuple[str, str]] = [
+    ("message", "/start"),
+    ("callback", "lang_ru"),
+    ("message", "🏝️ Войти на остров"),
+    ("callback", "tutorial_skip"),
+    ("message", "🏢 Город"),
+    ("callback", "academy"),
+    ("callback", "labor_exchange"),
+    ("callback", HIRE_SLOT.pack(tier="free", slot=0)),
+    ("callback", "expert_courses"),
+    ("callback", TRAIN.pack(profession="builder")),
+    ("callback", "training_class"),
+    ("callback", "expeditions"),
+    ("callback", START_EXPEDITION.pack(zone=1)),
+    ("message", "/energy"),
+]
+
+RETURNING_PLAYER: List[Tuple[str, str]] = [
+    ("message", "/start"),
+    ("message", "🏝️ Войти на остров"),
+    ("message", "🏠 Ферма"),
+    ("message", "🏢 Город"),
+    ("callback", "academy"),
+    ("callback", "labor_exchange"),
+    ("callback", "expert_courses"),
+    ("callback", "training_class"),
+    ("callback", "expeditions"),
+    ("message", "👥 Друзья"),
+    ("message", "/energy"),
+]
+
+
+@dataclass
+class LoadReport:
+    """Результаты прогона"""
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    unhandled: int = 0
+    errors: int = 0
+    wall_time: float = 0.0
+    db_calls: int = 0
+    db_coalesced: int = 0
+    user_cache_hit_rate: float = 0.0
+    api_calls: int = 0
+    db_handlers: Dict[str, dict] = field(default_factory=dict)
+
+    @property
+    def updates(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+    def all_latencies(self) -> np.ndarray:
+        return np.concatenate([np.asarray(values) for values in self.latencies.values()]) if self.latencies else np.zeros(0)
+
+
+def _rss_mb() -> Tuple[Optional[float], Optional[float]]:
+    """(текущий, пиковый) RSS процесса в МБ"""
+    current = peak = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # ru_maxrss: КБ на Linux, байты на macOS
+        scale = 2 ** 20 if os.uname().sysname == "Darwin" else 2 ** 10
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    return current, peak
+
+
+async def seed_returning_players(backend, user_ids: List[int]):
+    """Профили игроков, уже прошедших туториал"""
+    for user_id in user_ids:
+        row = {
+            "user_id": user_id, "username": f"player{user_id}",
+            "tutorial_completed": True, "ryabucks": 5000
+        }
+        if hasattr(backend, "insert_row"):
+            backend.insert_row("users", row)
+        else:
+            await backend.execute_query("users", "upsert", row)
+
+
+async def run_session(dp, bot, factory, report: LoadReport, user_id: int,
+                      steps: List[Tuple[str, str]], think: float):
+    """Один игрок проходит сценарий последовательно"""
+    from aiogram.dispatcher.event.bases import UNHANDLED
+
+    # Случайный старт, чтобы игроки не шли строем
+    await asyncio.sleep(random.uniform(0, think))
+
+    for kind, payload in steps:
+        update = factory.message(user_id, payload) if kind == "message" else factory.callback(user_id, payload)
+
+        started = time.perf_counter()
+        try:
+            response = await dp.feed_update(bot, update)
+            if response is UNHANDLED:
+                report.unhandled += 1
+        except Exception as e:
+            report.errors += 1
+            logging.getLogger(__name__).error(f"Ошибка апдейта {payload} ({user_id}): {e}")
+        report.latencies[payload].append((time.perf_counter() - started) * 1000)
+
+        await asyncio.sleep(think)
+
+
+async def run_load_test(users: int = 100, returning_share: float = 0.5, referral_share: float = 0.3,
+                        think_ms: float = 1300, db_latency_ms: float = 0.0, api_latency_ms: float = 0.0,
+                        seed: int = 42, db_backend: str = "memory") -> LoadReport:
+    """
+    Прогон нагрузки
+
+    Args:
+        users: количество одновременных игроков
+        returning_share: доля вернувшихся игроков (профиль уже есть)
+        referral_share: доля новых игроков, пришедших по реферальной ссылке
+        think_ms: пауза игрока между действиями (throttling пропускает 8 действий за 10 с)
+        db_latency_ms: имитируемая задержка запроса к БД
+        api_latency_ms: имитируемая задержка Bot API
+        db_backend: memory - локальный бэкенд, postgres - пул asyncpg (DATABASE_URL),
+                    supabase - PostgREST (SUPABASE_URL/SUPABASE_ANON_KEY)
+    """
+    from database.supabase_client import supabase_manager
+    from database.local_backend import LocalBackend
+    from database.user_cache import user_cache
+    from benchmarks.fake_bot import FakeSession, UpdateFactory
+    from game.referrals import referral_batcher, build_referral_payload
+    from utils.db_metrics import db_metrics
+    from main import setup_bot
+
+    random.seed(seed)
+    if db_backend == "memory":
+        backend = LocalBackend(latency_ms=db_latency_ms, seed=seed)
+        supabase_manager.use_backend(backend)
+    elif db_backend == "postgres":
+        from database.pg_backend import PgBackend
+        backend = PgBackend.from_env()
+        supabase_manager.use_backend(backend)
+    else:
+        supabase_manager.backend = None
+        supabase_manager._initialized = False
+        backend = supabase_manager
+
+    bot, dp = await setup_bot()
+    session = FakeSession(latency_ms=api_latency_ms)
+    bot.session = session
+    factory = UpdateFactory(bot)
+
+    user_ids = list(range(1_000_000, 1_000_000 + users))
+    returning = user_ids[:int(users * returning_share)]
+    newcomers = user_ids[len(returning):]
+    await seed_returning_players(backend, returning)
+
+    sessions = [(user_id, RETURNING_PLAYER) for user_id in returning]
+    for user_id in newcomers:
+        steps = list(NEW_PLAYER)
+        if returning and random.random() < referral_share:
+            steps[0] = ("message", f"/start {build_referral_payload(random.choice(returning))}")
+        sessions.append((user_id, steps))
+
+    report = LoadReport()
+    db_metrics.reset()
+    user_cache.clear()
+    started = time.perf_counter()
+
+    await asyncio.gather(*(
+        run_session(dp, bot, factory, report, user_id, steps, think_ms / 1000)
+        for user_id, steps in sessions
+    ))
+    await referral_batcher.flush()
+
+    report.wall_time = time.perf_counter() - started
+    report.db_calls = sum(db_metrics.calls.values())
+    report.db_coalesced = sum(db_metrics.coalesced.values())
+    report.user_cache_hit_rate = user_cache.hit_rate()
+    report.api_calls = sum(session.calls.values())
+    report.db_handlers = db_metrics.snapshot()['handlers']
+    return report
+
+
+def print_report(report: LoadReport, top: int = 8):
+    """Отчет в консоль"""
+    latencies = report.all_latencies()
+    rss, peak = _rss_mb()
+
+    print("=" * 60)
+    print("🏝️  RYABOT ISLAND - НАГРУЗОЧНЫЙ ТЕСТ")
+    print("=" * 60)
+    print(f"📨 Апдейтов: {report.updates} (не обработано: {report.unhandled}, ошибок: {report.errors})")
+    print(f"⏱️ Время прогона: {report.wall_time:.2f} с")
+    print(f"🚀 Апдейтов/с: {report.updates / report.wall_time:.1f}" if report.wall_time else "🚀 Апдейтов/с: -")
+
+    if latencies.size:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"📊 Задержка, мс: p50={p50:.2f} p95={p95:.2f} p99={p99:.2f} max={latencies.max():.2f}")
+
+    if report.updates:
+        print(f"🗄️ Запросов к БД: {report.db_calls} ({report.db_calls / report.updates:.2f} на апдейт, "
+              f"склеено одновременных чтений: {report.db_coalesced})")
+        print(f"👤 Попаданий в кэш профилей: {report.user_cache_hit_rate:.1%}")
+        print(f"🤖 Вызовов Bot API: {report.api_calls} ({report.api_calls / report.updates:.2f} на апдейт)")
+
+    if rss is not None or peak is not None:
+        print(f"💾 RSS: {rss or 0:.1f} МБ (пик {peak or 0:.1f} МБ)")
+
+    print("-" * 60)
+    print("Самые медленные шаги (p95, мс):")
+    by_step = sorted(
+        ((step, np.percentile(values, 95), len(values)) for step, values in report.latencies.items()),
+        key=lambda item: item[1], reverse=True
+    )
+    for step, p95, count in by_step[:top]:
+        print(f"   {p95:9.2f}  {step} (x{count})")
+
+    if report.db_handlers:
+        print("-" * 60)
+        print("Запросы к БД по обработчикам (среднее / максимум за апдейт):")
+        for name, summary in list(report.db_handlers.items())[:top]:
+            print(f"   {summary['avg_calls']:6.2f} / {summary['max_calls']:<3}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест Ryabot Island")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--returning-share", type=float, default=0.5)
+    parser.add_argument("--referral-share", type=float, default=0.3)
+    parser.add_argument("--think-ms", type=float, default=1300)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--api-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", choices=("memory", "postgres", "supabase"), default="memory")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    # main.py включает INFO логирование при импорте - приглушаем после него
+    import main as _bot_main  # noqa: F401
+    logging.getLogger().setLevel(args.log_level)
+
+    report = asyncio.run(run_load_test(
+        users=args.users,
+        returning_share=args.returning_share,
+        referral_share=args.referral_share,
+        think_ms=args.think_ms,
+        db_latency_ms=args.db_latency_ms,
+        api_latency_ms=args.api_latency_ms,
+        seed=args.seed,
+        db_backend=args.backend
+    ))
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Бенчмарк маршрутизации нажатий Ryabot Island
+Сравнивает обычный обход aiogram (фильтры всех обработчиков по порядку) с
+таблицей utils.callback_routing на синтетических роутерах: половина кнопок -
+точные значения (F.data == "..."), половина - префиксы (F.data.startswith).
+Худший случай - кнопка последнего обработчика, случайный - любая кнопка.
+
+Запуск:
+    python -m benchmarks.routing_bench --handlers 11 100 500 1000
+"""
+import os
+from benchmarks.fake_bot import BENCH_TOKEN
+
+os.environ.setdefault("BOT_TOKEN", BENCH_TOKEN)
+
+import argparse
+import asyncio
+import random
+import time
+from typing import List, Tuple
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import CallbackQuery
+
+from benchmarks.fake_bot import FakeSession, UpdateFactory
+from utils.callback_routing import CallbackRoutingMiddleware, CallbackRoutingTable
+
+ROUTERS = 10
+
+
+async def _noop(callback: CallbackQuery):
+    return None
+
+
+def build_dispatcher(handlers: int, indexed: bool) -> Tuple[Dispatcher, List[str]]:
+    """Dispatcher с handlers обработчиками, разложенными по ROUTERS роутерам; кнопки в порядке регистрации"""
+    dp = Dispatcher()
+    routers = [Router(name=f"bench_{index}") for index in range(ROUTERS)]
+    buttons = []
+    for index in range(handlers):
+        router = routers[index * ROUTERS // handlers]
+        if index % 2:
+            router.callback_query.register(_noop, F.data.startswith(f"action{index}_"))
+            buttons.append(f"action{index}_business_4")
+        else:
+            router.callback_query.register(_noop, F.data == f"screen{index}")
+            buttons.append(f"screen{index}")
+    dp.include_routers(*routers)
+    if indexed:
+        dp.callback_query.outer_middleware(CallbackRoutingMiddleware(CallbackRoutingTable(), dp))
+    return dp, buttons
+
+
+async def measure(handlers: int, indexed: bool, iterations: int, seed: int) -> Tuple[float, float]:
+    """Среднее время обработки нажатия (мкс): худший случай и случайная кнопка"""
+    dp, buttons = build_dispatcher(handlers, indexed)
+    bot = Bot(token=BENCH_TOKEN, session=FakeSession())
+    factory = UpdateFactory(bot)
+    rng = random.Random(seed)
+
+    worst = [factory.callback(1, buttons[-1]) for _ in range(iterations)]
+    mixed = [factory.callback(1, rng.choice(buttons)) for _ in range(iterations)]
+
+    # Прогрев (и построение таблицы)
+    await dp.feed_update(bot, worst[0])
+
+    results = []
+    for updates in (worst, mixed):
+        started = time.perf_counter()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        results.append((time.perf_counter() - started) / iterations * 1e6)
+    return results[0], results[1]
+
+
+async def run(handler_counts: List[int], iterations: int, seed: int):
+    print("=" * 72)
+    print("🏝️  RYABOT ISLAND - МАРШРУТИЗАЦИЯ НАЖАТИЙ (мкс на нажатие)")
+    print("=" * 72)
+    print(f"{'обработчиков':>12} | {'обход: худший':>14} {'случайный':>10} | "
+          f"{'таблица: худший':>16} {'случайный':>10}")
+    print("-" * 72)
+    for handlers in handler_counts:
+        linear_worst, linear_mixed = await measure(handlers, False, iterations, seed)
+        table_worst, table_mixed = await measure(handlers, True, iterations, seed)
+        print(f"{handlers:>12} | {linear_worst:>14.1f} {linear_mixed:>10.1f} | "
+              f"{table_worst:>16.1f} {table_mixed:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк маршрутизации нажатий Ryabot Island")
+    parser.add_argument("--handlers", type=int, nargs="+", default=[11, 100, 500, 1000])
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args.handlers, args.iterations, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,10 +18,23 @@ class SupabaseConfig:
     anon_key: str = os.getenv("SUPABASE_ANON_KEY", "")
     service_role_key: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
 
+    # supabase - реальный проект, memory - локальный бэкенд в памяти (тесты, бенчмарки),
+    # postgres - прямое подключение asyncpg (DATABASE_URL)
+    database_url: str = os.getenv("DATABASE_URL", "")
+    backend: str = os.getenv("DB_BACKEND", "supabase").lower()
+
     def validate(self) -> tuple[bool, list[str]]:
         """Валидация обязательных параметров"""
         errors = []
 
+        if self.backend == "memory":
+            return True, errors
+
+        if self.backend == "postgres":
+            if not self.database_url:
+                errors.append("DATABASE_URL не установлен (DB_BACKEND=postgres)")
+            return len(errors) == 0, errors
+
         if not self.url:
             errors.append("SUPABASE_URL не установлен")
         elif not self.url.startswith("https://"):
@@ -88,6 +101,10 @@ class GameConfig:
     base_ryabucks: int = int(os.getenv("BASE_RYABUCKS", "1000"))
     rbtc_to_ryabucks_rate: float = float(os.getenv("RBTC_RATE", "100.0"))
 
+    # Эмиссия RBTC: глобальный бюджет на день и размер резерва процесса
+    rbtc_daily_budget: float = float(os.getenv("RBTC_DAILY_BUDGET", "100.0"))
+    rbtc_lease_size: float = float(os.getenv("RBTC_LEASE_SIZE", "1.0"))
+
     # Найм рабочих
     hire_base_cost: int = int(os.getenv("HIRE_BASE_COST", "30"))
     hire_cost_increment: int = int(os.getenv("HIRE_COST_INCREMENT", "5"))
@@ -97,6 +114,11 @@ class GameConfig:
     # Академия
     training_base_slots: int = int(os.getenv("TRAINING_BASE_SLOTS", "2"))
 
+    # Рефералы: награда предкам по уровням цепочки (1 - прямой пригласивший)
+    referral_rewards: tuple = tuple(
+        int(x) for x in os.getenv("REFERRAL_REWARDS", "100,30,10").split(",") if x.strip()
+    )
+
     def get_hire_cost(self, current_workers: int) -> int:
         """Расчет стоимости найма рабочего"""
         return self.hire_base_cost + (self.hire_cost_increment * current_workers)
@@ -142,9 +164,6 @@ class Config:
         self.server = ServerConfig()
         self.logging = LoggingConfig()
 
-        # Кеш для часто используемых значений
-        self._prices_cache = None
-
     def validate_all(self) -> tuple[bool, list[str]]:
         """Валидация всех конфигураций"""
         all_errors = []
@@ -158,88 +177,19 @@ class Config:
         return len(all_errors) == 0, all_errors
 
     def get_game_prices(self) -> dict:
-        """Получение игровых цен (с кешированием)"""
-        if self._prices_cache is not None:
-            return self._prices_cache
-
-        self._prices_cache = {
-            # Животные
-            'ryaba_price': int(os.getenv("RYABA_PRICE", "250")),
-            'rooster_price': int(os.getenv("ROOSTER_PRICE", "500")),
-            'chick_price': int(os.getenv("CHICK_PRICE", "100")),
-            'horse_price': int(os.getenv("HORSE_PRICE", "1500")),
-            'cow_price': int(os.getenv("COW_PRICE", "1200")),
-
-            # Семена
-            'grain_seeds_price': int(os.getenv("GRAIN_SEEDS_PRICE", "25")),
-            'tomato_seeds_price': int(os.getenv("TOMATO_SEEDS_PRICE", "50")),
-            'cucumber_seeds_price': int(os.getenv("CUCUMBER_SEEDS_PRICE", "40")),
-
-            # Постройки
-            'henhouse_price': int(os.getenv("HENHOUSE_PRICE", "800")),
-            'stable_price': int(os.getenv("STABLE_PRICE", "2000")),
-            'cowshed_price': int(os.getenv("COWSHED_PRICE", "1800")),
-
-            # Валюты
-            'rbtc_rate': self.game.rbtc_to_ryabucks_rate,
-            'shard_rate': float(os.getenv("SHARD_RATE", "50.0")),
-        }
-
-        return self._prices_cache
+        """Получение игровых цен (из единой таблицы цен game.economy)"""
+        from game.economy import pricing
+        return pricing.table.prices_dict()
 
     def get_training_data(self) -> dict:
-        """Данные о профессиях для обучения"""
-        return {
-            'builder': {
-                'name': '👷 Строитель',
-                'cost': int(os.getenv("BUILDER_COST", "100")),
-                'time_hours': float(os.getenv("BUILDER_TIME", "2.0"))
-            },
-            'farmer': {
-                'name': '👨‍🌾 Фермер',
-                'cost': int(os.getenv("FARMER_COST", "100")),
-                'time_hours': float(os.getenv("FARMER_TIME", "2.0"))
-            },
-            'woodman': {
-                'name': '🧑‍🚒 Лесник',
-                'cost': int(os.getenv("WOODMAN_COST", "120")),
-                'time_hours': float(os.getenv("WOODMAN_TIME", "3.0"))
-            },
-            'soldier': {
-                'name': '💂 Солдат',
-                'cost': int(os.getenv("SOLDIER_COST", "150")),
-                'time_hours': float(os.getenv("SOLDIER_TIME", "4.0"))
-            },
-            'fisherman': {
-                'name': '🎣 Рыбак',
-                'cost': int(os.getenv("FISHERMAN_COST", "110")),
-                'time_hours': float(os.getenv("FISHERMAN_TIME", "2.5"))
-            },
-            'scientist': {
-                'name': '👨‍🔬 Ученый',
-                'cost': int(os.getenv("SCIENTIST_COST", "200")),
-                'time_hours': float(os.getenv("SCIENTIST_TIME", "6.0"))
-            },
-            'cook': {
-                'name': '👨‍🍳 Повар',
-                'cost': int(os.getenv("COOK_COST", "130")),
-                'time_hours': float(os.getenv("COOK_TIME", "3.0"))
-            },
-            'teacher': {
-                'name': '👨‍🏫 Учитель',
-                'cost': int(os.getenv("TEACHER_COST", "180")),
-                'time_hours': float(os.getenv("TEACHER_TIME", "5.0"))
-            },
-            'doctor': {
-                'name': '🧑‍⚕️ Доктор',
-                'cost': int(os.getenv("DOCTOR_COST", "220")),
-                'time_hours': float(os.getenv("DOCTOR_TIME", "8.0"))
-            }
-        }
+        """Данные о профессиях для обучения (из единой таблицы цен game.economy)"""
+        from game.economy import pricing
+        return pricing.table.training_dict()
 
     def clear_cache(self):
-        """Очистка кеша (для перезагрузки цен)"""
-        self._prices_cache = None
+        """Перезагрузка цен из PRICES_FILE (переопределения из БД сохраняются)"""
+        from game.economy import pricing
+        pricing.reload_from_file()
 
 
 # Глобальный экземпляр конфигурации
@@ -66,6 +66,7 @@ try:
         get_user_language,
         update_user_language,
         update_user_resources,
+        charge_energy,
         complete_tutorial,
         set_user_state,
         clear_user_state,
@@ -80,6 +81,22 @@ try:
         complete_trainings,
         get_specialists_count,
 
+        # Экспедиции
+        create_expedition,
+        get_active_expeditions,
+        get_finished_expeditions,
+        save_expedition_results,
+
+        # Эмиссия RBTC
+        reserve_rbtc_budget,
+        record_rbtc_emission,
+
+        # Рефералы
+        register_referral,
+        pay_referral_rewards,
+        get_pending_referrals,
+        get_referral_summary,
+
         # Статистика
         get_island_stats,
 
@@ -157,6 +174,10 @@ def check_database_module() -> tuple[bool, list[str]]:
     if get_supabase_client is None:
         errors.append("Supabase client недоступен")
 
+    # Локальному бэкенду переменные Supabase не нужны
+    if supabase_manager is not None and supabase_manager.backend is not None:
+        return len(errors) == 0, errors
+
     # Проверяем переменные окружения
     import os
     if not os.getenv("SUPABASE_URL"):
@@ -0,0 +1,141 @@
+"""
+Пакетная загрузка строк для Ryabot Island (в духе DataLoader)
+Под нагрузкой get_user разных игроков приходят в пределах нескольких
+миллисекунд, и каждый - отдельный select по user_id. Загрузчик копит ключи
+один шаг event loop (или до DB_BATCH_WINDOW_MS) и делает один запрос
+"user_id in (...)", раздавая строки ожидающим. Вызывающий код не меняется.
+
+Переменные окружения:
+    DB_BATCH_LOADER     - 0 выключает пакетную загрузку
+    DB_BATCH_WINDOW_MS  - окно сбора ключей (0 - до конца текущего шага loop)
+    DB_BATCH_MAX        - максимум ключей в одном запросе
+"""
+import os
+import copy
+import time
+import asyncio
+import logging
+import contextvars
+from typing import Any, Dict, Hashable, List, Optional
+
+from database.supabase_client import supabase_manager
+from utils.db_metrics import db_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BatchLoader:
+    """Сбор одиночных чтений по ключу в один запрос с оператором in"""
+
+    def __init__(self, table: str, key_column: str, window_ms: float = 0.0, max_batch: int = 100,
+                 enabled: bool = True):
+        """
+        Args:
+            table: таблица
+            key_column: колонка ключа (уникальная)
+            window_ms: сколько ждать остальных ключей (0 - один шаг event loop)
+            max_batch: максимум ключей в запросе; полный пакет уходит сразу
+            enabled: False - каждый load идет отдельным запросом
+        """
+        self.table = table
+        self.key_column = key_column
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.enabled = enabled
+
+        # Ключ -> ожидающие; пакет еще не отправлен и принимает новые ключи
+        self._pending: Dict[Hashable, List[asyncio.Future]] = {}
+        self._handle: Optional[asyncio.Handle] = None
+
+        self.stats = {
+            'loads': 0,
+            'batches': 0,
+            'keys': 0,
+            'max_batch_size': 0
+        }
+
+    async def load(self, key: Hashable) -> Optional[dict]:
+        """Строка с данным ключом или None"""
+        self.stats['loads'] += 1
+        if not self.enabled:
+            return await self._query_one(key)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+
+        if len(self._pending) >= self.max_batch:
+            self._dispatch()
+        elif self._handle is None:
+            # Пакет выполняется вне контекста апдейта: запрос не принадлежит одному игроку
+            empty = contextvars.Context()
+            if self.window_ms > 0:
+                self._handle = loop.call_later(self.window_ms / 1000, self._dispatch, context=empty)
+            else:
+                self._handle = loop.call_soon(self._dispatch, context=empty)
+
+        started = time.perf_counter()
+        row = await future
+        # Чтение учитывается в бюджете апдейта, хотя запрос общий
+        db_metrics.attribute(self.table, "select", (time.perf_counter() - started) * 1000)
+        return row
+
+    def _dispatch(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch), context=contextvars.Context())
+
+    async def _run(self, batch: Dict[Hashable, List[asyncio.Future]]):
+        keys = list(batch)
+        self.stats['batches'] += 1
+        self.stats['keys'] += len(keys)
+        self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(keys))
+
+        try:
+            if len(keys) == 1:
+                row = await self._query_one(keys[0])
+                rows = {keys[0]: row} if row else {}
+            else:
+                result = await supabase_manager.execute_query(
+                    table=self.table,
+                    operation="select",
+                    filters={self.key_column: {"operator": "in", "value": keys}}
+                )
+                rows = {row[self.key_column]: row for row in result or []}
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        waiters = sum(len(futures) for futures in batch.values())
+        if waiters > 1:
+            db_metrics.record_coalesced(self.table, "select", waiters - 1)
+
+        for key, futures in batch.items():
+            row = rows.get(key)
+            for index, future in enumerate(futures):
+                if not future.done():
+                    # Каждый ожидающий получает свою копию строки
+                    future.set_result(row if index == 0 or row is None else copy.deepcopy(row))
+
+    async def _query_one(self, key: Hashable) -> Optional[dict]:
+        return await supabase_manager.execute_query(
+            table=self.table,
+            operation="select",
+            filters={self.key_column: key},
+            single=True
+        )
+
+
+# Глобальный загрузчик профилей игроков
+user_loader = BatchLoader(
+    "users", "user_id",
+    window_ms=float(os.getenv("DB_BATCH_WINDOW_MS", "0")),
+    max_batch=int(os.getenv("DB_BATCH_MAX", "100")),
+    enabled=os.getenv("DB_BATCH_LOADER", "1") == "1"
+)
@@ -0,0 +1,115 @@
+"""
+Предохранитель (circuit breaker) для запросов к БД Ryabot Island
+При сбое Supabase каждый апдейт ждал полный HTTP таймаут (и не один раз), а
+корутины копились тысячами. Предохранитель считает подряд идущие сбои
+(таймауты, ошибки соединения) и после порога размыкается: запросы сразу
+получают DatabaseUnavailable, не дожидаясь сети. Через reset_timeout
+пропускается пробный запрос - успех замыкает цепь, сбой снова размыкает.
+
+Переменные окружения:
+    DB_BREAKER_FAILURES  - сбоев подряд до размыкания
+    DB_BREAKER_RESET     - секунд до пробного запроса
+"""
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Классы исключений (по имени в MRO), означающие недоступность БД, а не ошибку запроса:
+# таймауты, сеть, httpx (PostgREST), соединения asyncpg
+_OUTAGE_ERRORS = frozenset({
+    "TimeoutError", "ConnectionError", "OSError",
+    "TransportError", "PoolTimeout",
+    "PostgresConnectionError", "InterfaceError", "TooManyConnectionsError", "CannotConnectNowError",
+})
+
+
+class DatabaseUnavailable(RuntimeError):
+    """БД недоступна: предохранитель разомкнут или запрос не уложился в таймаут"""
+
+
+def is_outage(error: BaseException) -> bool:
+    """Сбой инфраструктуры (считается предохранителем), а не ошибка конкретного запроса"""
+    return any(cls.__name__ in _OUTAGE_ERRORS for cls in type(error).__mro__)
+
+
+class CircuitBreaker:
+    """Предохранитель: closed -> open после failure_threshold сбоев -> half_open -> closed"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        """
+        Args:
+            failure_threshold: сбоев подряд до размыкания
+            reset_timeout: через сколько секунд после размыкания пропустить пробный запрос
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.stats = {
+            'failures': 0,
+            'rejected': 0,
+            'opened': 0
+        }
+
+    def allow(self) -> bool:
+        """Можно ли выполнять запрос (в half_open - только один пробный)"""
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.stats['rejected'] += 1
+        return False
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("✅ БД снова доступна - предохранитель замкнут")
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release_probe(self):
+        """Пробный запрос отменен, не дойдя до результата - следующий запрос станет пробным"""
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.stats['failures'] += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            if self.state == CLOSED:
+                logger.error(f"❌ БД недоступна ({self.failures} сбоев подряд) - предохранитель разомкнут "
+                             f"на {self.reset_timeout:.0f} с")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+            self.stats['opened'] += 1
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    def snapshot(self) -> dict:
+        return {'state': self.state, 'consecutive_failures': self.failures, **self.stats}
+
+
+# Глобальный предохранитель БД
+db_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv("DB_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("DB_BREAKER_RESET", "10"))
+)
@@ -0,0 +1,220 @@
+"""
+Адаптивное ограничение параллельных запросов к БД Ryabot Island
+Без ограничения всплеск трафика превращается в сотни одновременных запросов:
+БД насыщается, и задержка растет у всех. Лимитер (AIMD) держит число запросов
+в полете не выше текущего лимита и подстраивает лимит по наблюдаемой задержке:
++1 за каждые limit быстрых запросов, x0.9 при задержке выше цели или сбое.
+
+Запросы сверх лимита ждут в очереди по приоритету: записи, двигающие деньги
+(найм, обучение, ресурсы, награды), идут раньше обычных записей, те - раньше
+чтений, а косметические чтения (статистика острова) - последними. У каждого
+приоритета свой дедлайн ожидания; не дождавшийся запрос получает
+DatabaseOverloaded (обрабатывается как недоступность БД).
+
+Переменные окружения:
+    DB_CONCURRENCY_LIMIT      - начальный лимит (0 - без ограничения)
+    DB_CONCURRENCY_MIN / MAX  - границы лимита
+    DB_LATENCY_TARGET_MS      - целевая задержка запроса
+"""
+import os
+import heapq
+import itertools
+import asyncio
+import logging
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional, Tuple
+
+from database.circuit_breaker import DatabaseUnavailable
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты (меньше - раньше)
+PRIORITY_MONEY = 0
+PRIORITY_WRITE = 1
+PRIORITY_READ = 2
+PRIORITY_BACKGROUND = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_MONEY: "money",
+    PRIORITY_WRITE: "write",
+    PRIORITY_READ: "read",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Сколько запрос приоритета может ждать слота (секунды)
+QUEUE_DEADLINES = {
+    PRIORITY_MONEY: 10.0,
+    PRIORITY_WRITE: 5.0,
+    PRIORITY_READ: 1.5,
+    PRIORITY_BACKGROUND: 3.0,
+}
+
+_WRITE_OPERATIONS = frozenset({"insert", "update", "upsert", "delete"})
+_READ_RPCS = frozenset({"get_workers_count", "get_referral_summary"})
+_BACKGROUND_RPCS = frozenset({"get_pending_referrals"})
+_MONEY_RPCS = frozenset({"pay_referral_rewards", "complete_expeditions", "reserve_rbtc_budget"})
+
+# Приоритет, заданный вызывающим кодом (см. prioritized)
+_priority_override: ContextVar[Optional[int]] = ContextVar("db_priority", default=None)
+
+
+class DatabaseOverloaded(DatabaseUnavailable):
+    """Запрос не дождался слота в очереди к БД"""
+
+
+def request_priority(table: str, operation: str) -> int:
+    """Приоритет запроса (для RPC table - имя функции)"""
+    override = _priority_override.get()
+    if override is not None:
+        return override
+    if operation == "rpc":
+        if table in _MONEY_RPCS:
+            return PRIORITY_MONEY
+        if table in _BACKGROUND_RPCS:
+            return PRIORITY_BACKGROUND
+        return PRIORITY_READ if table in _READ_RPCS else PRIORITY_WRITE
+    return PRIORITY_WRITE if operation in _WRITE_OPERATIONS else PRIORITY_READ
+
+
+def prioritized(priority: int):
+    """Декоратор: все запросы функции (и вложенных вызовов) идут с данным приоритетом"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = _priority_override.set(priority)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _priority_override.reset(token)
+        return wrapper
+    return decorator
+
+
+class AdaptiveLimiter:
+    """AIMD лимит параллельных запросов с приоритетной очередью"""
+
+    def __init__(self, initial: int = 20, min_limit: int = 4, max_limit: int = 100,
+                 target_latency_ms: float = 250.0, backoff: float = 0.9):
+        """
+        Args:
+            initial: начальный лимит (0 - лимитер выключен)
+            min_limit / max_limit: границы лимита
+            target_latency_ms: задержка, выше которой лимит уменьшается
+            backoff: множитель уменьшения лимита
+        """
+        self.enabled = initial > 0
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial, max_limit))) if self.enabled else 0.0
+        self.target_latency_ms = target_latency_ms
+        self.backoff = backoff
+
+        self.in_flight = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        # Уменьшение не чаще раза на limit завершений: одна перегрузка - одно уменьшение
+        self._since_decrease = 0
+
+        self.stats = {
+            'acquired': 0,
+            'queued': 0,
+            'timeouts': 0,
+            'decreases': 0,
+            'max_queue': 0,
+        }
+        self.timeouts_by_priority: Dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    # ---------- Слоты ----------
+
+    async def acquire(self, priority: int = PRIORITY_READ):
+        """Ждет слот; DatabaseOverloaded - дедлайн приоритета истек"""
+        self.stats['acquired'] += 1
+        if not self.enabled:
+            self.in_flight += 1
+            return
+
+        if self.in_flight < int(self.limit) and not self._queue:
+            self.in_flight += 1
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self.stats['queued'] += 1
+        self.stats['max_queue'] = max(self.stats['max_queue'], len(self._queue))
+
+        deadline = QUEUE_DEADLINES.get(priority, 5.0)
+        timer = loop.call_later(deadline, self._expire, future, priority)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, а вызывающего отменили - возвращаем
+                self.release(None)
+            raise
+        finally:
+            timer.cancel()
+
+    def release(self, latency_ms: Optional[float], failed: bool = False):
+        """
+        Возврат слота и подстройка лимита
+
+        Args:
+            latency_ms: задержка запроса (None - запрос отменен, без оценки)
+            failed: таймаут или сбой соединения - лимит уменьшается
+        """
+        self.in_flight -= 1
+        if self.enabled and latency_ms is not None:
+            self._adjust(latency_ms, failed)
+        self._grant()
+
+    def _adjust(self, latency_ms: float, failed: bool):
+        self._since_decrease += 1
+        if failed or latency_ms > self.target_latency_ms:
+            if self._since_decrease >= self.limit:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._since_decrease = 0
+                self.stats['decreases'] += 1
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def _grant(self):
+        while self._queue and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(True)
+
+    def _expire(self, future: asyncio.Future, priority: int):
+        if not future.done():
+            self.stats['timeouts'] += 1
+            self.timeouts_by_priority[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            future.set_exception(DatabaseOverloaded(
+                f"очередь к БД: {len(self._queue)} запросов, лимит {int(self.limit)}"
+            ))
+
+    # ---------- Статистика ----------
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+    def snapshot(self) -> dict:
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'queue': self.queued,
+            'timeouts_by_priority': dict(self.timeouts_by_priority),
+            **self.stats
+        }
+
+
+# Глобальный лимитер запросов к БД
+db_limiter = AdaptiveLimiter(
+    initial=int(os.getenv("DB_CONCURRENCY_LIMIT", "20")),
+    min_limit=int(os.getenv("DB_CONCURRENCY_MIN", "4")),
+    max_limit=int(os.getenv("DB_CONCURRENCY_MAX", "100")),
+    target_latency_ms=float(os.getenv("DB_LATENCY_TARGET_MS", "250"))
+)
@@ -0,0 +1,424 @@
+"""
+Локальный бэкенд БД для Ryabot Island (DB_BACKEND=memory)
+Хранит таблицы в памяти процесса и повторяет поверхность SupabaseManager:
+execute_query (select/insert/update/upsert/delete/count) и execute_rpc с
+реализациями RPC функций из supabase/migrations. Нужен для запуска бота,
+тестов и бенчмарков без сети; задержку сети можно имитировать
+"""
+import os
+import copy
+import random
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, date
+from typing import Optional, Dict, List, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+# Первичные ключи таблиц (SERIAL id заполняется автоматически)
+_PRIMARY_KEYS = {
+    'users': 'user_id',
+    'referrals': 'referred_id',
+    'game_prices': 'key',
+    'game_prices_version': 'id',
+    'rbtc_emission': 'date',
+}
+
+# Ключи конфликта для upsert (UNIQUE ограничения схемы)
+_CONFLICT_KEYS = {
+    'hire_cooldowns': 'user_id',
+    'island_stats': 'date',
+    'user_ad_rewards': 'user_id',
+}
+
+# Значения по умолчанию из схемы (DEFAULT ...)
+_DEFAULTS = {
+    'users': {
+        'language': 'ru', 'level': 1, 'experience': 0, 'energy': 100,
+        'ryabucks': 1000, 'rbtc': 0.0, 'golden_shards': 0, 'quantum_keys': 0,
+        'land_plots': 1, 'tutorial_completed': False, 'current_state': None,
+        'activity_data': None,
+    },
+    'farm_buildings': {'level': 1, 'is_active': True},
+    'expeditions': {'status': 'active', 'rbtc_found': 0.0, 'ryabucks_found': 0},
+    'hired_workers': {'worker_type': 'laborer', 'status': 'idle'},
+    'training_units': {'status': 'training'},
+    'trained_specialists': {'level': 1, 'status': 'available'},
+    'hire_cooldowns': {'hires_count': 0},
+    'island_stats': {'total_players': 0, 'active_players': 0, 'daily_rbtc': 0.0, 'active_expeditions': 0},
+    'rbtc_emission': {'reserved': 0.0, 'emitted': 0.0},
+}
+
+# Столбцы с DEFAULT NOW()
+_TIMESTAMP_DEFAULTS = {
+    'users': ('created_at', 'last_active'),
+    'expeditions': ('started_at',),
+    'hired_workers': ('hired_at',),
+    'training_units': ('started_at',),
+    'trained_specialists': ('created_at',),
+    'referrals': ('created_at',),
+    'referral_rewards': ('created_at',),
+}
+
+# Ресурсы, которые add_user_resources не уводит в минус
+_GUARDED_RESOURCES = frozenset({'energy', 'ryabucks', 'rbtc', 'golden_shards', 'quantum_keys'})
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+def _comparable(value: Any) -> Any:
+    """Приводит даты к ISO строкам, чтобы их можно было сравнивать со строками из запросов"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _matches(row: dict, filters: Optional[Dict]) -> bool:
+    """Проверка строки на фильтры в формате SupabaseManager"""
+    if not filters:
+        return True
+
+    for key, condition in filters.items():
+        value = _comparable(row.get(key))
+
+        if isinstance(condition, dict) and 'operator' in condition:
+            op = condition['operator']
+            expected = condition['value']
+
+            if op == 'in':
+                if value not in expected:
+                    return False
+                continue
+            if op == 'neq':
+                if value == _comparable(expected):
+                    return False
+                continue
+
+            expected = _comparable(expected)
+            if value is None:
+                return False
+            if op == 'gte' and not value >= expected:
+                return False
+            if op == 'lte' and not value <= expected:
+                return False
+            if op == 'gt' and not value > expected:
+                return False
+            if op == 'lt' and not value < expected:
+                return False
+        elif value != _comparable(condition):
+            return False
+
+    return True
+
+
+class LocalBackend:
+    """Таблицы в памяти процесса + реестр RPC функций"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: Optional[int] = None):
+        """
+        Args:
+            latency_ms: имитируемая задержка каждого запроса (мс)
+            jitter_ms: случайный разброс задержки (+/- мс)
+            seed: seed генератора разброса (для воспроизводимых замеров)
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+
+        self.tables: Dict[str, Dict[Any, dict]] = defaultdict(dict)
+        self._sequences: Dict[str, int] = defaultdict(int)
+        self.rpcs: Dict[str, Callable] = {}
+
+        self.stats = {
+            'queries': 0,
+            'rpcs': 0
+        }
+
+        for name, function in _BUILTIN_RPCS.items():
+            self.register_rpc(name, function)
+
+    @classmethod
+    def from_env(cls) -> "LocalBackend":
+        """Создание из переменных окружения DB_LATENCY_MS / DB_LATENCY_JITTER_MS"""
+        return cls(
+            latency_ms=float(os.getenv("DB_LATENCY_MS", "0")),
+            jitter_ms=float(os.getenv("DB_LATENCY_JITTER_MS", "0"))
+        )
+
+    def register_rpc(self, name: str, function: Callable):
+        """Регистрация RPC функции: function(backend, **params)"""
+        self.rpcs[name] = function
+
+    def reset(self):
+        """Очистка всех таблиц и счетчиков"""
+        self.tables.clear()
+        self._sequences.clear()
+        self.stats = {key: 0 for key in self.stats}
+
+    async def _delay(self):
+        if self.latency_ms <= 0 and self.jitter_ms <= 0:
+            return
+        delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(delay, 0.0) / 1000)
+
+    # ---------- Строки ----------
+
+    def _key(self, table: str, row: dict) -> Any:
+        pk = _PRIMARY_KEYS.get(table)
+        if pk:
+            return row[pk]
+
+        conflict = _CONFLICT_KEYS.get(table)
+        if conflict and row.get(conflict) is not None:
+            for key, existing in self.tables[table].items():
+                if existing.get(conflict) == row[conflict]:
+                    return key
+
+        if row.get('id') is None:
+            self._sequences[table] += 1
+            row['id'] = self._sequences[table]
+        return row['id']
+
+    def _with_defaults(self, table: str, data: dict) -> dict:
+        row = copy.deepcopy(_DEFAULTS.get(table, {}))
+        for column in _TIMESTAMP_DEFAULTS.get(table, ()):
+            row[column] = _now()
+        row.update(copy.deepcopy(data))
+        return row
+
+    def rows(self, table: str, filters: Optional[Dict] = None) -> List[dict]:
+        """Строки таблицы по фильтру (ссылки на хранимые строки - для RPC и тестов)"""
+        return [row for row in self.tables[table].values() if _matches(row, filters)]
+
+    def insert_row(self, table: str, data: dict) -> dict:
+        row = self._with_defaults(table, data)
+        key = self._key(table, row)
+        if key in self.tables[table]:
+            raise ValueError(f"duplicate key value violates unique constraint ({table}: {key})")
+        self.tables[table][key] = row
+        return row
+
+    def upsert_row(self, table: str, data: dict) -> dict:
+        probe = dict(data)
+        key = self._key(table, probe)
+        existing = self.tables[table].get(key)
+        if existing is not None:
+            existing.update(copy.deepcopy(data))
+            return existing
+
+        row = self._with_defaults(table, probe)
+        self.tables[table][key] = row
+        return row
+
+    # ---------- Поверхность SupabaseManager ----------
+
+    async def execute_query(self, table: str, operation: str, data: Dict = None,
+                            filters: Dict = None, select: str = "*",
+                            single: bool = False, limit: int = None) -> Any:
+        """Тот же контракт, что и SupabaseManager.execute_query"""
+        await self._delay()
+        self.stats['queries'] += 1
+
+        if operation == "select":
+            rows = self.rows(table, filters)
+            if limit:
+                rows = rows[:limit]
+            if select != "*":
+                columns = [column.strip() for column in select.split(",")]
+                rows = [{column: row.get(column) for column in columns} for row in rows]
+            rows = copy.deepcopy(rows)
+
+            if single:
+                return rows[0] if rows else None
+            return rows
+
+        elif operation == "insert":
+            items = data if isinstance(data, list) else [data]
+            inserted = [self.insert_row(table, item) for item in items]
+            return copy.deepcopy(inserted[0]) if inserted else None
+
+        elif operation == "update":
+            rows = self.rows(table, filters)
+            for row in rows:
+                row.update(copy.deepcopy(data))
+            return copy.deepcopy(rows)
+
+        elif operation == "delete":
+            removed = []
+            for key, row in list(self.tables[table].items()):
+                if _matches(row, filters):
+                    removed.append(self.tables[table].pop(key))
+            return removed
+
+        elif operation == "upsert":
+            items = data if isinstance(data, list) else [data]
+            upserted = [self.upsert_row(table, item) for item in items]
+            return copy.deepcopy(upserted[0]) if upserted else None
+
+        elif operation == "count":
+            return len(self.rows(table, filters))
+
+        raise ValueError(f"Неизвестная операция: {operation}")
+
+    async def execute_rpc(self, function_name: str, params: Dict = None) -> Any:
+        """Тот же контракт, что и SupabaseManager.execute_rpc"""
+        await self._delay()
+        self.stats['rpcs'] += 1
+
+        function = self.rpcs.get(function_name)
+        if function is None:
+            raise ValueError(f"function {function_name} does not exist")
+        return copy.deepcopy(function(self, **(params or {})))
+
+
+# ================== RPC ФУНКЦИИ ==================
+# Повторяют SQL функции из supabase/migrations (и функции, созданные в Dashboard)
+
+def _rpc_get_workers_count(db: LocalBackend, p_user_id: int) -> List[dict]:
+    counts: Dict[str, int] = defaultdict(int)
+    for row in db.rows('hired_workers', {'user_id': p_user_id}):
+        if row.get('status') != 'consumed':
+            counts[row.get('worker_type', 'laborer')] += 1
+    return [{'worker_type': worker_type, 'count': count} for worker_type, count in counts.items()]
+
+
+def _rpc_pay_referral_rewards(db: LocalBackend, p_referred_ids: List[int], p_rewards: List[int]) -> List[dict]:
+    referrals = db.tables['referrals']
+    ledger = db.tables['referral_rewards']
+    paid = {(row['beneficiary_id'], row['source_id']) for row in ledger.values()}
+    credits: Dict[int, int] = defaultdict(int)
+
+    for referred_id in p_referred_ids:
+        edge = referrals.get(referred_id)
+        if edge is None or edge.get('rewarded_at') is not None:
+            continue
+        edge['rewarded_at'] = _now()
+
+        beneficiary, depth = edge['referrer_id'], 1
+        while beneficiary is not None and depth <= len(p_rewards):
+            if (beneficiary, referred_id) not in paid:
+                paid.add((beneficiary, referred_id))
+                db.insert_row('referral_rewards', {
+                    'beneficiary_id': beneficiary, 'source_id': referred_id,
+                    'depth': depth, 'ryabucks': p_rewards[depth - 1]
+                })
+                credits[beneficiary] += p_rewards[depth - 1]
+
+            parent = referrals.get(beneficiary)
+            beneficiary, depth = (parent['referrer_id'] if parent else None), depth + 1
+
+    result = []
+    for user_id, amount in credits.items():
+        user = db.tables['users'].get(user_id)
+        if user is not None:
+            user['ryabucks'] = user.get('ryabucks', 0) + amount
+            result.append({'user_id': user_id, 'ryabucks': amount})
+    return result
+
+
+def _rpc_get_referral_summary(db: LocalBackend, p_user_id: int) -> List[dict]:
+    return [{
+        'invited': len(db.rows('referrals', {'referrer_id': p_user_id})),
+        'earned': sum(row['ryabucks'] for row in db.rows('referral_rewards', {'beneficiary_id': p_user_id})),
+    }]
+
+
+def _rpc_get_pending_referrals(db: LocalBackend, p_older_than_seconds: int, p_limit: int) -> List[dict]:
+    cutoff = datetime.now().timestamp() - p_older_than_seconds
+    pending = [
+        row for row in db.tables['referrals'].values()
+        if row.get('rewarded_at') is None and datetime.fromisoformat(str(row['created_at'])).timestamp() < cutoff
+    ]
+    pending.sort(key=lambda row: str(row['created_at']))
+    return [{'referred_id': row['referred_id']} for row in pending[:p_limit]]
+
+
+def _rpc_complete_expeditions(db: LocalBackend, p_results: List[dict]) -> List[dict]:
+    finished = []
+    for result in p_results:
+        expedition = db.tables['expeditions'].get(result['id'])
+        if expedition is None or expedition.get('status') != 'active':
+            continue
+
+        expedition.update({
+            'status': 'completed',
+            'outcome': result['outcome'],
+            'rbtc_found': result['rbtc'],
+            'ryabucks_found': result['ryabucks'],
+            'completed_at': _now()
+        })
+        finished.append({'expedition_id': result['id']})
+
+        user = db.tables['users'].get(expedition['user_id'])
+        if user is not None:
+            user['rbtc'] = round(float(user.get('rbtc', 0)) + result['rbtc'], 2)
+            user['ryabucks'] = user.get('ryabucks', 0) + result['ryabucks']
+    return finished
+
+
+def _rpc_add_user_resources(db: LocalBackend, p_user_id: int, p_deltas: Dict[str, Any]) -> List[dict]:
+    user = db.tables['users'].get(p_user_id)
+    if user is None:
+        return []
+
+    current = {column: user.get(column) or 0 for column in p_deltas}
+    for column, delta in p_deltas.items():
+        if column in _GUARDED_RESOURCES and delta < 0 and current[column] + delta < 0:
+            return []
+
+    for column, delta in p_deltas.items():
+        value = current[column] + delta
+        if column == 'energy':
+            value = min(value, 100)
+        elif column == 'rbtc':
+            value = round(float(value), 2)
+        user[column] = value
+    user['last_active'] = _now()
+    return [user]
+
+
+def _rpc_reserve_rbtc_budget(db: LocalBackend, p_date: str, p_amount: float, p_budget: float) -> float:
+    row = db.tables['rbtc_emission'].get(p_date)
+    if row is None:
+        row = db.insert_row('rbtc_emission', {'date': p_date, 'budget': p_budget})
+
+    granted = round(min(p_amount, max(row['budget'] - row['reserved'], 0)), 2)
+    row['reserved'] = round(row['reserved'] + granted, 2)
+    return granted
+
+
+def _rpc_record_rbtc_emission(db: LocalBackend, p_date: str, p_emitted: float, p_released: float) -> float:
+    row = db.tables['rbtc_emission'].get(p_date)
+    total = 0.0
+    if row is not None:
+        row['emitted'] = round(row['emitted'] + p_emitted, 2)
+        row['reserved'] = round(max(row['reserved'] - p_released, 0), 2)
+        total = row['emitted']
+
+    db.upsert_row('island_stats', {'date': p_date, 'daily_rbtc': total, 'updated_at': _now()})
+    return total
+
+
+def _rpc_publish_game_prices(db: LocalBackend) -> int:
+    row = db.tables['game_prices_version'].get(1)
+    if row is None:
+        row = db.insert_row('game_prices_version', {'id': 1, 'version': 0})
+    row['version'] += 1
+    row['updated_at'] = _now()
+    return row['version']
+
+
+_BUILTIN_RPCS = {
+    'get_workers_count': _rpc_get_workers_count,
+    'pay_referral_rewards': _rpc_pay_referral_rewards,
+    'get_referral_summary': _rpc_get_referral_summary,
+    'get_pending_referrals': _rpc_get_pending_referrals,
+    'complete_expeditions': _rpc_complete_expeditions,
+    'add_user_resources': _rpc_add_user_resources,
+    'reserve_rbtc_budget': _rpc_reserve_rbtc_budget,
+    'record_rbtc_emission': _rpc_record_rbtc_emission,
+    'publish_game_prices': _rpc_publish_game_prices,
+}
@@ -1,6 +1,9 @@
 """
 Модели данных для Ryabot Island на Supabase
 Полная замена asyncpg на официальный Supabase Python SDK
+
+Переменные окружения:
+    ISLAND_STATS_TTL - сколько секунд кэшировать счетчики статистики острова
 """
 import os
 import logging
@@ -8,6 +11,11 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Any
 from database.supabase_client import supabase_manager
+from database.batch_loader import user_loader
+from database.user_cache import user_cache
+from database.circuit_breaker import DatabaseUnavailable
+from database.concurrency import prioritized, PRIORITY_MONEY, PRIORITY_WRITE
+from game.economy import pricing
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -28,7 +36,10 @@ async def initialize_db_pool():
 
 
 async def close_connection_pool():
-    """Заглушка для совместимости (Supabase не требует закрытия)"""
+    """Закрытие пула бэкенда (DB_BACKEND=postgres); Supabase клиенту закрытие не нужно"""
+    close = getattr(supabase_manager.backend, "close", None)
+    if close is not None:
+        await close()
     logger.info("✅ Supabase клиент: подключение завершено")
 
 
@@ -86,20 +97,25 @@ class User:
 # ================== USER FUNCTIONS ==================
 
 async def get_user(user_id: int) -> Optional[User]:
-    """Получение пользователя из Supabase"""
+    """Получение пользователя (кэш процесса, затем Supabase)"""
     try:
-        result = await supabase_manager.execute_query(
-            table="users",
-            operation="select",
-            filters={"user_id": user_id},
-            single=True
-        )
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
+        version = user_cache.version(user_id)
+        # Одновременные чтения разных игроков уходят одним запросом (database.batch_loader)
+        result = await user_loader.load(user_id)
 
-        # ИСПРАВЛЕНИЕ: result уже является словарем при single=True
         if result:
-            return User(result)
+            user = User(result)
+            user_cache.fill(user_id, user, version)
+            return user
         return None
 
+    except DatabaseUnavailable:
+        # Не "пользователь не найден": обработчик не должен начинать регистрацию заново
+        raise
     except Exception as e:
         logger.error(f"❌ Ошибка получения пользователя {user_id}: {e}")
         return None
@@ -134,7 +150,9 @@ async def create_user(user_id: int, username: str = None) -> Optional[User]:
         # ИСПРАВЛЕНИЕ: result уже является словарем, не нужно брать [0]
         if result:
             logger.info(f"✅ Пользователь {user_id} успешно создан в Supabase")
-            return User(result)
+            user = User(result)
+            user_cache.fill(user_id, user)
+            return user
         else:
             logger.error(f"❌ Supabase вернул None при создании пользователя {user_id}")
             return None
@@ -159,59 +177,71 @@ async def get_user_language(user_id: int) -> str:
         return 'ru'
 
 
+def _write_through(user_id: int, updates: dict, result: Any):
+    """Запись строки users отражается в кэше; при ошибке запроса запись сбрасывается"""
+    if result is None:
+        user_cache.invalidate(user_id)
+    else:
+        user_cache.apply(user_id, updates)
+
+
 async def update_user_language(user_id: int, language: str):
     """Обновление языка пользователя"""
     try:
-        await supabase_manager.execute_query(
+        updates = {"language": language, "last_active": datetime.now().isoformat()}
+        result = await supabase_manager.execute_query(
             table="users",
             operation="update",
-            data={"language": language, "last_active": datetime.now().isoformat()},
+            data=updates,
             filters={"user_id": user_id}
         )
+        _write_through(user_id, updates, result)
     except Exception as e:
+        user_cache.invalidate(user_id)
         logger.error(f"Ошибка обновления языка пользователя {user_id}: {e}")
 
 
 async def complete_tutorial(user_id: int):
     """Завершение туториала"""
     try:
-        # Получаем текущие данные пользователя
-        user = await get_user(user_id)
-        if not user:
-            return
-
-        # Обновляем данные
         updates = {
             "tutorial_completed": True,
-            "ryabucks": user.ryabucks + 500,
-            "energy": min(user.energy + 20, 100),
             "last_active": datetime.now().isoformat()
         }
 
-        await supabase_manager.execute_query(
+        # Фильтр по tutorial_completed: награда выдается один раз
+        result = await supabase_manager.execute_query(
             table="users",
             operation="update",
             data=updates,
-            filters={"user_id": user_id}
+            filters={"user_id": user_id, "tutorial_completed": False}
         )
+        _write_through(user_id, updates, result)
+
+        if result:
+            await update_user_resources(user_id, ryabucks=500, energy=20)
     except Exception as e:
+        user_cache.invalidate(user_id)
         logger.error(f"Ошибка завершения туториала {user_id}: {e}")
 
 
 async def set_user_state(user_id: int, state: str, activity_data: str = None):
     """Установка состояния пользователя"""
     try:
-        await supabase_manager.execute_query(
+        updates = {
+            "current_state": state,
+            "activity_data": activity_data,
+            "last_active": datetime.now().isoformat()
+        }
+        result = await supabase_manager.execute_query(
             table="users",
             operation="update",
-            data={
-                "current_state": state,
-                "activity_data": activity_data,
-                "last_active": datetime.now().isoformat()
-            },
+            data=updates,
             filters={"user_id": user_id}
         )
+        _write_through(user_id, updates, result)
     except Exception as e:
+        user_cache.invalidate(user_id)
         logger.error(f"Ошибка установки состояния пользователя {user_id}: {e}")
 
 
@@ -220,39 +250,67 @@ async def clear_user_state(user_id: int):
     await set_user_state(user_id, None, None)
 
 
-async def update_user_resources(user_id: int, **resources):
-    """Обновление ресурсов пользователя"""
-    if not resources:
-        return
+# Числовые столбцы users, которые меняются приращением (add_user_resources)
+_RESOURCE_COLUMNS = ('energy', 'ryabucks', 'rbtc', 'golden_shards', 'quantum_keys', 'experience', 'level', 'land_plots')
 
-    try:
-        # Получаем текущие данные пользователя
-        user = await get_user(user_id)
-        if not user:
-            return False
 
-        # Подготавливаем обновления
-        updates = {"last_active": datetime.now().isoformat()}
+async def _add_user_resources(user_id: int, **deltas) -> Optional[User]:
+    """
+    Атомарное изменение ресурсов: в БД уходит приращение (col = col + delta),
+    а не значение, посчитанное по кэшу, - начисления RPC других процессов
+    (экспедиции, рефералы) не затираются
 
-        for resource, amount in resources.items():
-            if hasattr(user, resource):
-                current_value = getattr(user, resource)
-                if resource == 'energy':
-                    # Энергия не может превышать 100
-                    updates[resource] = min(current_value + amount, 100)
-                else:
-                    updates[resource] = current_value + amount
+    Returns:
+        User со свежими ресурсами из БД или None (ресурса не хватает, игрок
+        не найден, ошибка)
+    """
+    unknown = set(deltas) - set(_RESOURCE_COLUMNS)
+    if unknown:
+        logger.warning(f"Неизвестные ресурсы {sorted(unknown)} для {user_id} пропущены")
+    deltas = {column: amount for column, amount in deltas.items() if column in _RESOURCE_COLUMNS and amount}
+    if not deltas:
+        return None
 
-        await supabase_manager.execute_query(
-            table="users",
-            operation="update",
-            data=updates,
-            filters={"user_id": user_id}
+    try:
+        rows = await supabase_manager.execute_rpc(
+            "add_user_resources",
+            {"p_user_id": user_id, "p_deltas": deltas}
         )
-        return True
+        if rows is None:
+            user_cache.invalidate(user_id)
+            return None
+        if not rows:
+            return None
+
+        user = User(rows[0])
+        fresh = {column: getattr(user, column) for column in _RESOURCE_COLUMNS}
+        fresh['last_active'] = user.last_active
+        _write_through(user_id, fresh, rows)
+        return user
     except Exception as e:
+        user_cache.invalidate(user_id)
         logger.error(f"Ошибка обновления ресурсов пользователя {user_id}: {e}")
-        return False
+        return None
+
+
+async def update_user_resources(user_id: int, **resources):
+    """
+    Обновление ресурсов пользователя на приращения (ryabucks=-100, energy=5)
+    Приоритет задает вызывающий: найм и обучение - PRIORITY_MONEY.
+
+    Returns:
+        bool: False - ресурса не хватает (списание не выполнено), игрок не найден или ошибка
+    """
+    if not resources:
+        return
+
+    return await _add_user_resources(user_id, **resources) is not None
+
+
+@prioritized(PRIORITY_WRITE)
+async def charge_energy(user_id: int, cost: int):
+    """Списание энергии за действие игрока (на каждом апдейте - обычный приоритет записи)"""
+    return await update_user_resources(user_id, energy=-cost)
 
 
 # ================== ACADEMY FUNCTIONS ==================
@@ -318,15 +376,17 @@ async def can_hire_worker(user_id: int) -> tuple[bool, str, int]:
             if reset_date != today:
                 hires_today = 0
 
-            # Проверяем кулдаун (24 часа)
+            hire = pricing.table.hire
+
+            # Проверяем кулдаун
+            cooldown_period = timedelta(hours=hire['cooldown_hours'])
             time_since_last_hire = datetime.now().replace(tzinfo=None) - last_hire.replace(tzinfo=None)
-            if time_since_last_hire < timedelta(hours=24):
-                remaining_seconds = int((timedelta(hours=24) - time_since_last_hire).total_seconds())
+            if time_since_last_hire < cooldown_period:
+                remaining_seconds = int((cooldown_period - time_since_last_hire).total_seconds())
                 return False, "cooldown", remaining_seconds
 
             # Проверяем лимит найма в день
-            max_hires = 3
-            if hires_today >= max_hires:
+            if hires_today >= hire['daily_limit']:
                 return False, "limit_reached", 0
 
         return True, "ok", 0
@@ -335,6 +395,7 @@ async def can_hire_worker(user_id: int) -> tuple[bool, str, int]:
         return True, "ok", 0  # При ошибке разрешаем найм
 
 
+@prioritized(PRIORITY_MONEY)
 async def hire_worker(user_id: int) -> tuple[bool, str]:
     """Найм рабочего через Supabase"""
     try:
@@ -354,9 +415,10 @@ async def hire_worker(user_id: int) -> tuple[bool, str]:
 
         workers_count = await get_hired_workers_count(user_id)
         total_workers = sum(workers_count.values())
-        hire_cost = 30 + (5 * total_workers)
+        hire_cost = pricing.table.hire_cost(total_workers)
 
-        if user.ryabucks < hire_cost:
+        # Кэш отсекает заведомо недоступный найм, окончательно баланс проверяет списание в БД
+        if user.ryabucks < hire_cost or not await update_user_resources(user_id, ryabucks=-hire_cost):
             return False, f"❌ Недостаточно рябаксов! Нужно: {hire_cost}💵"
 
         # Добавляем рабочего
@@ -390,11 +452,10 @@ async def hire_worker(user_id: int) -> tuple[bool, str]:
                 data=cooldown_data
             )
 
-            # Списываем деньги
-            await update_user_resources(user_id, ryabucks=-hire_cost)
-
             return True, f"✅ Разнорабочий нанят! Потрачено: {hire_cost}💵"
 
+        # Рабочий не добавлен - возвращаем деньги
+        await update_user_resources(user_id, ryabucks=hire_cost)
         return False, "Ошибка найма рабочего"
     except Exception as e:
         logger.error(f"Ошибка найма рабочего {user_id}: {e}")
@@ -414,7 +475,7 @@ async def get_training_slots_info(user_id: int) -> dict:
         if trainings:
             active_training = len([t for t in trainings if t.get("status") == "training"])
 
-        base_slots = 2
+        base_slots = pricing.table.training_base_slots
         total_slots = base_slots
 
         return {
@@ -427,6 +488,7 @@ async def get_training_slots_info(user_id: int) -> dict:
         return {'used': 0, 'total': 2, 'available': 2}
 
 
+@prioritized(PRIORITY_MONEY)
 async def start_training(user_id: int, unit_type: str) -> tuple[bool, str]:
     """Начать обучение специалиста"""
     try:
@@ -438,23 +500,14 @@ async def start_training(user_id: int, unit_type: str) -> tuple[bool, str]:
         if slots_info['available'] <= 0:
             return False, "❌ Все учебные места заняты! Дождитесь окончания обучения."
 
-        training_data = {
-            'builder': {'name': '👷 Строитель', 'cost': 100, 'time_hours': 2},
-            'farmer': {'name': '👨‍🌾 Фермер', 'cost': 100, 'time_hours': 2},
-            'woodman': {'name': '🧑‍🚒 Лесник', 'cost': 120, 'time_hours': 3},
-            'soldier': {'name': '💂 Солдат', 'cost': 150, 'time_hours': 4},
-            'fisherman': {'name': '🎣 Рыбак', 'cost': 110, 'time_hours': 2.5},
-            'scientist': {'name': '👨‍🔬 Ученый', 'cost': 200, 'time_hours': 6},
-            'cook': {'name': '👨‍🍳 Повар', 'cost': 130, 'time_hours': 3},
-            'teacher': {'name': '👨‍🏫 Учитель', 'cost': 180, 'time_hours': 5},
-            'doctor': {'name': '🧑‍⚕️ Доктор', 'cost': 220, 'time_hours': 8}
-        }
-
-        if unit_type not in training_data:
+        # Данные профессии из текущей таблицы цен
+        unit_info = pricing.table.profession(unit_type)
+        if unit_info is None:
             return False, "❌ Неизвестная профессия!"
 
         user = await get_user(user_id)
-        unit_info = training_data[unit_type]
+        if not user:
+            return False, "❌ Пользователь не найден!"
 
         if user.ryabucks < unit_info['cost']:
             return False, f"❌ Недостаточно рябаксов! Нужно: {unit_info['cost']}💵"
@@ -476,6 +529,10 @@ async def start_training(user_id: int, unit_type: str) -> tuple[bool, str]:
         if not worker:
             return False, "❌ Нет свободных разнорабочих!"
 
+        # Окончательная проверка баланса - само списание в БД (кэш мог отстать)
+        if not await update_user_resources(user_id, ryabucks=-unit_info['cost']):
+            return False, f"❌ Недостаточно рябаксов! Нужно: {unit_info['cost']}💵"
+
         worker_id = worker['id']
         completion_time = (datetime.now() + timedelta(hours=unit_info['time_hours'])).isoformat()
 
@@ -504,13 +561,12 @@ async def start_training(user_id: int, unit_type: str) -> tuple[bool, str]:
                 filters={"id": worker_id}
             )
 
-            # Списываем деньги
-            await update_user_resources(user_id, ryabucks=-unit_info['cost'])
-
             hours = int(unit_info['time_hours'])
             minutes = int((unit_info['time_hours'] % 1) * 60)
             return True, f"✅ {unit_info['name']} отправлен на обучение!\\n⏰ Завершится через: {hours}ч {minutes}мин"
 
+        # Обучение не добавлено - возвращаем деньги
+        await update_user_resources(user_id, ryabucks=unit_info['cost'])
         return False, "Ошибка при запуске обучения"
 
     except Exception as e:
@@ -555,6 +611,7 @@ async def get_active_trainings(user_id: int) -> list:
         return []
 
 
+@prioritized(PRIORITY_MONEY)
 async def complete_trainings(user_id: int) -> int:
     """Завершение готовых обучений"""
     try:
@@ -645,70 +702,295 @@ async def get_specialists_count(user_id: int) -> dict:
         return {}
 
 
-# ================== ISLAND STATS ==================
+# ================== FARM FUNCTIONS ==================
 
-async def get_island_stats() -> dict:
-    """Получение статистики острова через RPC функции"""
+async def get_farm_buildings(user_id: int) -> list:
+    """Все постройки фермы игрока"""
     try:
-        # Используем RPC функцию для получения статистики
-        stats = await supabase_manager.execute_rpc("get_island_statistics")
+        buildings = await supabase_manager.execute_query(
+            table="farm_buildings",
+            operation="select",
+            filters={"user_id": user_id}
+        )
+        return buildings or []
+    except Exception as e:
+        logger.error(f"Ошибка получения построек {user_id}: {e}")
+        return []
+
+
+async def get_farm_buildings_batch(user_ids: List[int]) -> list:
+    """Постройки сразу многих игроков одним запросом (для фоновых задач)"""
+    if not user_ids:
+        return []
+
+    try:
+        buildings = await supabase_manager.execute_query(
+            table="farm_buildings",
+            operation="select",
+            filters={"user_id": {"operator": "in", "value": list(user_ids)}}
+        )
+        return buildings or []
+    except Exception as e:
+        logger.error(f"Ошибка пакетного получения построек ({len(user_ids)} игроков): {e}")
+        return []
+
 
-        if stats:
-            return {
-                'total_players': max(42, int(stats.get('total_players', 42))),
-                'online_players': max(12, int(stats.get('active_players', 12))),
-                'daily_rbtc': max(15.67, float(stats.get('daily_rbtc', 15.67))),
-                'active_expeditions': max(8, int(stats.get('active_expeditions', 8)))
+# ================== EXPEDITION FUNCTIONS ==================
+
+async def create_expedition(user_id: int, zone_id: int, seed: int, params: dict,
+                            ends_at: datetime) -> Optional[dict]:
+    """Создает экспедицию (хранятся только seed и параметры, без состояния)"""
+    try:
+        return await supabase_manager.execute_query(
+            table="expeditions",
+            operation="insert",
+            data={
+                "user_id": user_id,
+                "zone_id": zone_id,
+                "status": "active",
+                "seed": seed,
+                "params": params,
+                "started_at": datetime.now().isoformat(),
+                "ends_at": ends_at.isoformat()
             }
+        )
     except Exception as e:
-        logger.error(f"Ошибка получения статистики через RPC: {e}")
+        logger.error(f"Ошибка создания экспедиции {user_id}: {e}")
+        return None
+
 
-    # Fallback - получаем статистику обычными запросами
+async def get_active_expeditions(user_id: int) -> list:
+    """Экспедиции игрока, которые еще не вернулись"""
     try:
-        # Общее количество игроков
-        total_count = await supabase_manager.execute_query(
-            table="users",
-            operation="count"
+        expeditions = await supabase_manager.execute_query(
+            table="expeditions",
+            operation="select",
+            select="id, zone_id, ends_at",
+            filters={"user_id": user_id, "status": "active"}
         )
+        return expeditions or []
+    except Exception as e:
+        logger.error(f"Ошибка получения активных экспедиций {user_id}: {e}")
+        return []
 
+
+async def get_finished_expeditions(limit: int = 5000) -> list:
+    """Активные экспедиции, время которых вышло (для пакетного завершения)"""
+    try:
+        expeditions = await supabase_manager.execute_query(
+            table="expeditions",
+            operation="select",
+            select="id, user_id, zone_id, seed, params",
+            filters={
+                "status": "active",
+                "ends_at": {"operator": "lte", "value": datetime.now().isoformat()}
+            },
+            limit=limit
+        )
+        return expeditions or []
+    except Exception as e:
+        logger.error(f"Ошибка получения завершенных экспедиций: {e}")
+        return []
+
+
+async def save_expedition_results(results: List[dict]) -> set:
+    """
+    Записывает результаты пачки экспедиций и начисляет награды одним RPC
+
+    Returns:
+        set: id сохраненных экспедиций (пустое множество - ничего не сохранено)
+    """
+    if not results:
+        return set()
+
+    try:
+        saved = await supabase_manager.execute_rpc(
+            "complete_expeditions",
+            {"p_results": results}
+        )
+        # RPC начисляет награды в users в обход кэша
+        user_cache.invalidate_many({result['user_id'] for result in results if 'user_id' in result})
+        return {int(row['expedition_id']) for row in saved or []}
+    except Exception as e:
+        logger.error(f"Ошибка сохранения результатов экспедиций ({len(results)} шт.): {e}")
+        return set()
+
+
+# ================== RBTC EMISSION ==================
+
+async def reserve_rbtc_budget(day: str, amount: float, budget: float) -> float:
+    """Резервирует часть дневного бюджета RBTC для процесса (0 - бюджет исчерпан)"""
+    try:
+        granted = await supabase_manager.execute_rpc(
+            "reserve_rbtc_budget",
+            {"p_date": day, "p_amount": amount, "p_budget": budget}
+        )
+        return float(granted or 0)
+    except Exception as e:
+        logger.error(f"Ошибка резервирования RBTC на {day}: {e}")
+        return 0.0
+
+
+async def record_rbtc_emission(day: str, emitted: float, released: float) -> Optional[float]:
+    """Сверка эмиссии процесса с БД. Возвращает общую эмиссию за день"""
+    try:
+        total = await supabase_manager.execute_rpc(
+            "record_rbtc_emission",
+            {"p_date": day, "p_emitted": emitted, "p_released": released}
+        )
+        return float(total) if total is not None else None
+    except Exception as e:
+        logger.error(f"Ошибка сверки эмиссии RBTC на {day}: {e}")
+        return None
+
+
+# ================== REFERRAL FUNCTIONS ==================
+
+async def register_referral(referrer_id: int, referred_id: int) -> bool:
+    """Сохраняет ребро приглашения (один пригласивший на игрока)"""
+    if referrer_id == referred_id:
+        return False
+
+    try:
+        result = await supabase_manager.execute_query(
+            table="referrals",
+            operation="insert",
+            data={
+                "referrer_id": referrer_id,
+                "referred_id": referred_id,
+                "created_at": datetime.now().isoformat()
+            }
+        )
+        return result is not None
+    except Exception as e:
+        logger.error(f"Ошибка регистрации реферала {referred_id} от {referrer_id}: {e}")
+        return False
+
+
+async def pay_referral_rewards(referred_ids: List[int], rewards: List[int]) -> Optional[Dict[int, int]]:
+    """
+    Выплачивает бонусы всей цепочке пригласивших для пачки новых игроков
+    Один RPC вызов (рекурсивный CTE) вместо запросов на каждого предка
+
+    Returns:
+        dict: user_id -> начисленные рябаксы; None - RPC не выполнен (пачку нужно повторить)
+    """
+    if not referred_ids or not rewards:
+        return {}
+
+    try:
+        result = await supabase_manager.execute_rpc(
+            "pay_referral_rewards",
+            {"p_referred_ids": list(referred_ids), "p_rewards": list(rewards)}
+        )
+
+        if result is None:
+            return None
+        if result:
+            # Балансы пригласивших изменились в обход кэша
+            user_cache.invalidate_many(int(row['user_id']) for row in result)
+        return {int(row['user_id']): int(row['ryabucks']) for row in result}
+    except Exception as e:
+        logger.error(f"Ошибка выплаты реферальных бонусов ({len(referred_ids)} игроков): {e}")
+        return None
+
+
+async def get_pending_referrals(older_than: float, limit: int) -> List[int]:
+    """Приглашенные игроки без выплаты бонусов старше older_than секунд"""
+    try:
+        result = await supabase_manager.execute_rpc(
+            "get_pending_referrals",
+            {"p_older_than_seconds": int(older_than), "p_limit": limit}
+        )
+        return [int(row['referred_id']) for row in result or []]
+    except Exception as e:
+        logger.error(f"Ошибка получения невыплаченных рефералов: {e}")
+        return []
+
+
+async def get_referral_summary(user_id: int) -> dict:
+    """Количество приглашенных и заработок с рефералов"""
+    try:
+        result = await supabase_manager.execute_rpc(
+            "get_referral_summary",
+            {"p_user_id": user_id}
+        )
+
+        if result:
+            row = result[0]
+            return {'invited': int(row.get('invited', 0)), 'earned': int(row.get('earned', 0))}
+    except Exception as e:
+        logger.error(f"Ошибка получения реферальной сводки через RPC {user_id}: {e}")
+
+    # Fallback - только количество приглашенных
+    try:
+        invited = await supabase_manager.execute_query(
+            table="referrals",
+            operation="count",
+            filters={"referrer_id": user_id}
+        )
+        return {'invited': invited or 0, 'earned': 0}
+    except Exception as e:
+        logger.error(f"Ошибка получения рефералов {user_id}: {e}")
+        return {'invited': 0, 'earned': 0}
+
+
+# ================== ISLAND STATS ==================
+
+# Счетчики острова меняются медленно: один набор запросов на ISLAND_STATS_TTL секунд
+_ISLAND_STATS_TTL = float(os.getenv("ISLAND_STATS_TTL", "60"))
+_island_counts: Dict[str, int] = {}
+_island_counts_expires = 0.0
+
+
+async def _count_island() -> Dict[str, int]:
+    """Игроки, активные сегодня и экспедиции в пути (кэш на _ISLAND_STATS_TTL)"""
+    global _island_counts, _island_counts_expires
+
+    now = asyncio.get_running_loop().time()
+    if _island_counts and now < _island_counts_expires:
+        return _island_counts
+
+    today = datetime.now().date().isoformat()
+    total, online, expeditions = await asyncio.gather(
+        supabase_manager.execute_query(table="users", operation="count"),
+        supabase_manager.execute_query(
+            table="users", operation="count",
+            filters={"last_active": {"operator": "gte", "value": today}}
+        ),
+        supabase_manager.execute_query(table="expeditions", operation="count", filters={"status": "active"})
+    )
+    _island_counts = {'total_players': total or 0, 'online_players': online or 0, 'active_expeditions': expeditions or 0}
+    _island_counts_expires = now + _ISLAND_STATS_TTL
+    return _island_counts
+
+
+async def get_island_stats() -> dict:
+    """Статистика острова: счетчики из БД, добытый за сутки RBTC - из движка эмиссии (без запроса к БД)"""
+    # game.rbtc импортирует этот модуль - импорт на месте
+    from game.rbtc import rbtc_emission
+
+    daily_rbtc = rbtc_emission.daily_emitted()
+    try:
+        counts = await _count_island()
         return {
-            'total_players': max(42, total_count or 42),
-            'online_players': 12,  # Заглушка
-            'daily_rbtc': 15.67,  # Заглушка
-            'active_expeditions': 8  # Заглушка
+            'total_players': max(42, counts['total_players']),
+            'online_players': max(12, counts['online_players']),
+            'daily_rbtc': daily_rbtc,
+            'active_expeditions': max(8, counts['active_expeditions'])
         }
     except Exception as e:
         logger.error(f"Ошибка получения статистики: {e}")
         return {
             'total_players': 42,
             'online_players': 12,
-            'daily_rbtc': 15.67,
+            'daily_rbtc': daily_rbtc,
             'active_expeditions': 8
         }
 
 
 # ================== ENERGY SYSTEM ==================
 
-async def update_user_energy(user_id: int, new_energy: int):
-    """Обновляет энергию пользователя"""
-    try:
-        # Ограничиваем энергию от 0 до 100
-        clamped_energy = max(0, min(100, new_energy))
-
-        await supabase_manager.execute_query(
-            table="users",
-            operation="update",
-            data={
-                "energy": clamped_energy,
-                "last_active": datetime.now().isoformat()
-            },
-            filters={"user_id": user_id}
-        )
-        logger.debug(f"Энергия пользователя {user_id} обновлена: {clamped_energy}")
-    except Exception as e:
-        logger.error(f"Ошибка обновления энергии для {user_id}: {e}")
-
-
 async def give_ad_energy(user_id: int) -> tuple[bool, str]:
     """Выдает энергию за просмотр рекламы"""
     try:
@@ -735,8 +1017,10 @@ async def give_ad_energy(user_id: int) -> tuple[bool, str]:
         if not user:
             return False, "❌ Пользователь не найден"
 
-        new_energy = min(100, user.energy + 20)
-        await update_user_energy(user_id, new_energy)
+        updated = await _add_user_resources(user_id, energy=20)
+        if not updated:
+            return False, "❌ Произошла ошибка. Попробуйте позже"
+        new_energy = updated.energy
 
         # Обновляем время последнего просмотра
         ad_data = {
@@ -751,7 +1035,7 @@ async def give_ad_energy(user_id: int) -> tuple[bool, str]:
             data=ad_data
         )
 
-        energy_gained = new_energy - user.energy
+        energy_gained = max(0, min(20, 100 - user.energy))
         logger.info(f"🎬 Пользователь {user_id} получил {energy_gained} энергии за рекламу")
 
         return True, f"🎉 Получено +{energy_gained} энергии! Текущая энергия: {new_energy}/100"
@@ -804,10 +1088,10 @@ async def get_stable_energy(user_id: int) -> tuple[bool, str, int]:
             # Выдаем энергию пользователю
             user = await get_user(user_id)
             if user:
-                new_energy = min(100, user.energy + total_energy)
-                await update_user_energy(user_id, new_energy)
+                updated = await _add_user_resources(user_id, energy=total_energy)
+                new_energy = updated.energy if updated else user.energy
 
-                actual_gained = new_energy - user.energy
+                actual_gained = max(0, min(total_energy, 100 - user.energy)) if updated else 0
                 logger.info(f"🐴 Пользователь {user_id} собрал {actual_gained} энергии из {ready_stables} конюшен")
 
                 return True, f"🐴 Собрано +{actual_gained} энергии из {ready_stables} конюшен! Текущая: {new_energy}/100", actual_gained
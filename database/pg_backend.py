@@ -0,0 +1,397 @@
+"""
+Бэкенд прямого подключения к PostgreSQL для Ryabot Island (DB_BACKEND=postgres)
+Пул asyncpg с той же поверхностью, что у SupabaseManager: execute_query
+(select/insert/update/upsert/delete/count) и execute_rpc. Запросы идут в
+базу напрямую, минуя PostgREST (HTTP + JSON).
+
+SQL строится по "форме" запроса (таблица, операция, столбцы фильтров и
+данных) и кэшируется, поэтому одинаковые запросы дают одинаковый текст и
+используют подготовленные выражения asyncpg. Самые частые формы (профиль
+игрока, списание энергии, сводка академии) готовятся заранее на каждом
+новом соединении пула.
+
+Типы приводятся как у PostgREST: даты и время - ISO строки, NUMERIC - float,
+JSON - dict/list; строки ISO во входных данных приводятся к типам столбцов
+по information_schema.
+
+Переменные окружения:
+    DATABASE_URL       - DSN PostgreSQL (в Supabase: Settings -> Database)
+    DB_POOL_MIN_SIZE   - минимум соединений (по умолчанию 2)
+    DB_POOL_MAX_SIZE   - максимум соединений (по умолчанию 10)
+"""
+import os
+import re
+import json
+import uuid
+import asyncio
+import logging
+from datetime import datetime, date, time as dt_time
+from decimal import Decimal
+from typing import Optional, Dict, List, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_OPERATORS = {'gte': '>=', 'lte': '<=', 'gt': '>', 'lt': '<', 'neq': '<>'}
+
+# Ключи конфликта для upsert (UNIQUE ограничения схемы, как в local_backend)
+_CONFLICT_KEYS = {
+    'hire_cooldowns': 'user_id',
+    'island_stats': 'date',
+    'user_ad_rewards': 'user_id',
+}
+
+# Горячие запросы: готовятся на каждом новом соединении пула. Форма должна
+# совпадать с запросом database.models до оператора фильтра, иначе выражение
+# не попадет в кэш (tests/test_pg_hot_queries.py)
+# (table, operation, filters (столбец, оператор), data, select, limit)
+_HOT_QUERIES: Tuple[Tuple[str, str, Tuple[Tuple[str, str], ...], Tuple[str, ...], str, bool], ...] = (
+    # get_user: один игрок и пачка database.batch_loader
+    ('users', 'select', (('user_id', 'eq'),), (), '*', False),
+    ('users', 'select', (('user_id', 'in'),), (), '*', False),
+    # сводка академии: рабочие, обучения и специалисты игрока
+    ('hired_workers', 'select', (('user_id', 'eq'),), (), '*', False),
+    ('training_units', 'select', (('user_id', 'eq'),), (), '*', False),
+    ('trained_specialists', 'select', (('user_id', 'eq'),), (), '*', False),
+    # биржа труда: кулдаун найма
+    ('hire_cooldowns', 'select', (('user_id', 'eq'),), (), '*', False),
+)
+_HOT_RPCS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    # сводка академии: рабочие по типам
+    ('get_workers_count', ('p_user_id',)),
+    # списание энергии (charge_energy из EnergyMiddleware) и другие изменения ресурсов
+    ('add_user_resources', ('p_user_id', 'p_deltas')),
+)
+
+
+def _quote(name: str) -> str:
+    if not _IDENTIFIER.match(name):
+        raise ValueError(f"Недопустимое имя в запросе: {name!r}")
+    return f'"{name}"'
+
+
+def _parse_datetime(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _to_db(value: Any, pg_type: Optional[str]) -> Any:
+    """Значение из кода (как для PostgREST) -> тип параметра asyncpg"""
+    if value is None or pg_type is None:
+        return value
+    if pg_type.startswith("timestamp") and isinstance(value, str):
+        return _parse_datetime(value)
+    if pg_type == "date" and isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if pg_type == "date" and isinstance(value, datetime):
+        return value.date()
+    if pg_type == "numeric" and isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if pg_type in ("double precision", "real") and isinstance(value, int):
+        return float(value)
+    if pg_type in ("integer", "bigint", "smallint") and isinstance(value, str):
+        return int(value)
+    if pg_type in ("text", "character varying") and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def _from_db(value: Any) -> Any:
+    """Значение asyncpg -> как вернул бы PostgREST"""
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, list):
+        return [_from_db(item) for item in value]
+    return value
+
+
+def _record(record) -> dict:
+    return {key: _from_db(value) for key, value in record.items()}
+
+
+class PgBackend:
+    """Пул asyncpg за интерфейсом execute_query/execute_rpc"""
+
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+
+        self.pool = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._sql_cache: Dict[tuple, str] = {}
+        self._columns: Dict[str, Dict[str, str]] = {}            # таблица -> столбец -> тип
+        self._primary_keys: Dict[str, List[str]] = {}
+        self._rpc_params: Dict[str, Dict[str, str]] = {}         # функция -> параметр -> тип
+
+        self.stats = {'queries': 0, 'rpcs': 0, 'prepared_hot': 0}
+
+    @classmethod
+    def from_env(cls) -> "PgBackend":
+        """Бэкенд из DATABASE_URL и DB_POOL_*"""
+        dsn = os.getenv("DATABASE_URL", "")
+        if not dsn:
+            raise ValueError("DATABASE_URL должен быть установлен для DB_BACKEND=postgres")
+        return cls(
+            dsn,
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+        )
+
+    # ---------- Подключение ----------
+
+    async def connect(self):
+        """Создание пула и чтение схемы (выполняется один раз, при первом запросе)"""
+        if self.pool is not None:
+            return
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self.pool is not None:
+                return
+
+            import asyncpg
+
+            pool = await asyncpg.create_pool(
+                self.dsn, min_size=self.min_size, max_size=self.max_size,
+                init=self._init_connection
+            )
+            async with pool.acquire() as connection:
+                await self._load_schema(connection)
+            self.pool = pool
+
+            # Соединения, открытые до чтения схемы, готовят горячие запросы сейчас
+            async with pool.acquire() as connection:
+                await self._prepare_hot(connection)
+
+            logger.info(f"✅ Пул PostgreSQL: {self.min_size}-{self.max_size} соединений, "
+                        f"таблиц в схеме: {len(self._columns)}")
+
+    async def _init_connection(self, connection):
+        """Новое соединение пула: JSON кодеки и подготовка горячих запросов"""
+        for json_type in ("json", "jsonb"):
+            await connection.set_type_codec(json_type, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+        if self._columns:
+            await self._prepare_hot(connection)
+
+    async def _load_schema(self, connection):
+        rows = await connection.fetch(
+            "SELECT table_name, column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = 'public'"
+        )
+        for row in rows:
+            self._columns.setdefault(row['table_name'], {})[row['column_name']] = row['data_type']
+
+        rows = await connection.fetch(
+            "SELECT tc.table_name, kcu.column_name FROM information_schema.table_constraints tc "
+            "JOIN information_schema.key_column_usage kcu "
+            "ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema "
+            "WHERE tc.table_schema = 'public' AND tc.constraint_type = 'PRIMARY KEY' "
+            "ORDER BY kcu.ordinal_position"
+        )
+        for row in rows:
+            self._primary_keys.setdefault(row['table_name'], []).append(row['column_name'])
+
+        rows = await connection.fetch(
+            "SELECT r.routine_name, p.parameter_name, p.data_type FROM information_schema.routines r "
+            "JOIN information_schema.parameters p ON p.specific_name = r.specific_name "
+            "AND p.specific_schema = r.specific_schema "
+            "WHERE r.routine_schema = 'public' AND p.parameter_mode = 'IN'"
+        )
+        for row in rows:
+            self._rpc_params.setdefault(row['routine_name'], {})[row['parameter_name']] = row['data_type']
+
+    async def _prepare_hot(self, connection):
+        """
+        Прогрев кэша подготовленных выражений соединения: горячие запросы
+        выполняются с NULL параметрами (WHERE ... = NULL не задевает строк),
+        и asyncpg кладет их подготовленные выражения в кэш по тексту SQL
+        """
+        for table, operation, filter_keys, data_keys, select, limit in _HOT_QUERIES:
+            if table not in self._columns:
+                continue
+            filters = {
+                key: None if operator == 'eq' else {'operator': operator, 'value': None}
+                for key, operator in filter_keys
+            }
+            data = {key: None for key in data_keys}
+            sql, params = self._build(table, operation, data, filters, select, limit and 1)
+            await connection.fetch(sql, *params)
+            self.stats['prepared_hot'] += 1
+        for function_name, params in _HOT_RPCS:
+            if function_name in self._rpc_params:
+                await connection.fetch(self._rpc_sql(function_name, params), *[None] * len(params))
+                self.stats['prepared_hot'] += 1
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("✅ Пул PostgreSQL закрыт")
+
+    # ---------- Построение SQL ----------
+
+    def _column_type(self, table: str, column: str) -> Optional[str]:
+        return self._columns.get(table, {}).get(column)
+
+    def _select_list(self, select: str) -> Tuple[str, List[str]]:
+        """Список столбцов PostgREST -> SQL (с count(*) и группировкой по остальным столбцам)"""
+        if not select or select.strip() == "*":
+            return "*", []
+
+        columns, group_by, aggregate = [], [], False
+        for item in (part.strip() for part in select.split(",")):
+            if item.replace(" ", "").lower() == "count(*)":
+                columns.append('count(*) AS "count"')
+                aggregate = True
+            else:
+                columns.append(_quote(item))
+                group_by.append(_quote(item))
+        return ", ".join(columns), group_by if aggregate else []
+
+    def _where(self, table: str, filters: Optional[Dict], params: list) -> str:
+        if not filters:
+            return ""
+
+        conditions = []
+        for key, condition in filters.items():
+            column = _quote(key)
+            pg_type = self._column_type(table, key)
+
+            if isinstance(condition, dict) and 'operator' in condition:
+                operator, value = condition['operator'], condition['value']
+                if operator == 'in':
+                    params.append([_to_db(item, pg_type) for item in value] if value is not None else None)
+                    conditions.append(f"{column} = ANY(${len(params)})")
+                    continue
+                params.append(_to_db(value, pg_type))
+                conditions.append(f"{column} {_OPERATORS[operator]} ${len(params)}")
+            else:
+                params.append(_to_db(condition, pg_type))
+                conditions.append(f"{column} = ${len(params)}")
+
+        return " WHERE " + " AND ".join(conditions)
+
+    def _build(self, table: str, operation: str, data: Optional[Dict], filters: Optional[Dict],
+               select: str, limit: Optional[int]) -> Tuple[str, list]:
+        """SQL и параметры; текст SQL кэшируется по форме запроса"""
+        params: list = []
+        data = data or {}
+        row_keys = tuple(data.keys()) if isinstance(data, dict) else ()
+
+        shape = (
+            table, operation, select, bool(limit), row_keys,
+            tuple((key, condition['operator'] if isinstance(condition, dict) and 'operator' in condition else 'eq')
+                  for key, condition in (filters or {}).items())
+        )
+
+        # Параметры собираются всегда, SQL - только при промахе кэша
+        for key in row_keys:
+            params.append(_to_db(data[key], self._column_type(table, key)))
+        where = self._where(table, filters, params)
+        if limit:
+            params.append(int(limit))
+
+        sql = self._sql_cache.get(shape)
+        if sql is not None:
+            return sql, params
+
+        name = _quote(table)
+        placeholders = [f"${index + 1}" for index in range(len(row_keys))]
+        columns = [_quote(key) for key in row_keys]
+        limit_sql = f" LIMIT ${len(params)}" if limit else ""
+
+        if operation == "select":
+            select_sql, group_by = self._select_list(select)
+            sql = f"SELECT {select_sql} FROM {name}{where}"
+            if group_by:
+                sql += " GROUP BY " + ", ".join(group_by)
+            sql += limit_sql
+
+        elif operation == "count":
+            sql = f"SELECT count(*) FROM {name}{where}"
+
+        elif operation == "insert":
+            sql = f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) RETURNING *"
+
+        elif operation == "upsert":
+            conflict = [_CONFLICT_KEYS[table]] if table in _CONFLICT_KEYS else self._primary_keys.get(table, [])
+            if not conflict:
+                raise ValueError(f"Нет ключа конфликта для upsert в {table}")
+            updates = [f"{column} = EXCLUDED.{column}" for key, column in zip(row_keys, columns) if key not in conflict]
+            action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+            sql = (f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join(placeholders)}) "
+                   f"ON CONFLICT ({', '.join(map(_quote, conflict))}) {action} RETURNING *")
+
+        elif operation == "update":
+            assignments = [f"{column} = {placeholder}" for column, placeholder in zip(columns, placeholders)]
+            sql = f"UPDATE {name} SET {', '.join(assignments)}{where} RETURNING *"
+
+        elif operation == "delete":
+            sql = f"DELETE FROM {name}{where} RETURNING *"
+
+        else:
+            raise ValueError(f"Неизвестная операция: {operation}")
+
+        self._sql_cache[shape] = sql
+        return sql, params
+
+    @staticmethod
+    def _rpc_sql(function_name: str, param_names) -> str:
+        arguments = ", ".join(f"{_quote(name)} => ${index + 1}" for index, name in enumerate(param_names))
+        return f"SELECT * FROM {_quote(function_name)}({arguments})"
+
+    # ---------- Интерфейс SupabaseManager ----------
+
+    async def execute_query(self, table: str, operation: str, data: Dict = None,
+                            filters: Dict = None, select: str = "*",
+                            single: bool = False, limit: int = None) -> Any:
+        await self.connect()
+        self.stats['queries'] += 1
+
+        if operation in ("insert", "upsert") and isinstance(data, list):
+            # Пакетная вставка: по строке, в одной транзакции
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    rows = []
+                    for row in data:
+                        sql, params = self._build(table, operation, row, None, select, None)
+                        record = await connection.fetchrow(sql, *params)
+                        if record is not None:
+                            rows.append(_record(record))
+            return rows
+
+        sql, params = self._build(table, operation, data, filters, select, limit)
+
+        if operation == "count":
+            return await self.pool.fetchval(sql, *params)
+
+        records = await self.pool.fetch(sql, *params)
+        rows = [_record(record) for record in records]
+
+        if operation in ("insert", "upsert"):
+            return rows[0] if rows else None
+        if single:
+            return rows[0] if rows else None
+        return rows
+
+    async def execute_rpc(self, function_name: str, params: Dict = None) -> Any:
+        await self.connect()
+        self.stats['rpcs'] += 1
+
+        params = params or {}
+        types = self._rpc_params.get(function_name, {})
+        sql = self._rpc_sql(function_name, params.keys())
+        values = [_to_db(value, types.get(name)) for name, value in params.items()]
+
+        records = await self.pool.fetch(sql, *values)
+
+        # Скалярная функция (RETURNS INTEGER/NUMERIC/JSON): PostgREST возвращает само значение
+        if len(records) == 1 and list(records[0].keys()) == [function_name]:
+            return _from_db(records[0][function_name])
+        return [_record(record) for record in records]
@@ -3,22 +3,69 @@ Supabase клиент для Ryabot Island
 Полная замена asyncpg на официальный Supabase Python SDK
 """
 import os
+import json
+import time
+import asyncio
 import logging
-from typing import Optional, Dict, List, Any, Union
-from supabase import create_client, Client
+from typing import Optional, Dict, List, Any, Union, TYPE_CHECKING
 from dotenv import load_dotenv
+from utils.db_metrics import db_metrics
+from utils.singleflight import SingleFlight
+from database.circuit_breaker import db_breaker, is_outage, DatabaseUnavailable
+from database.concurrency import db_limiter, request_priority, DatabaseOverloaded
+
+# SDK Supabase (~0.3 с на импорт) загружается при первом подключении:
+# с локальным бэкендом и на холодном старте он не нужен
+if TYPE_CHECKING:
+    from supabase import Client
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Операции чтения, одновременные одинаковые вызовы которых склеиваются
+_READ_OPERATIONS = ("select", "count")
+_READ_RPCS = frozenset({"get_workers_count", "get_referral_summary", "get_pending_referrals"})
+
+# Таймауты запросов (секунды): по операции и отдельно для тяжелых пакетных запросов.
+# Только для чтений и RPC без записи (_READ_RPCS): таймаут бросает ожидание, но не
+# сам запрос - запись, брошенная по таймауту, могла бы выполниться уже после повтора
+# вызывающего. Запись ждет ответа БД (ее ограничивает таймаут HTTP клиента SDK).
+# DB_TIMEOUT_SCALE масштабирует все значения (медленная сеть, отладка)
+_TIMEOUTS = {"select": 3.0, "count": 3.0, "rpc": 5.0}
+_TIMEOUT_OVERRIDES = {
+    ("expeditions", "select"): 10.0,
+}
+
 class SupabaseManager:
     """Менеджер подключения к Supabase"""
 
     def __init__(self):
-        self.client: Optional[Client] = None
+        self.client: Optional['Client'] = None
         self._initialized = False
 
+        self.timeout_scale = float(os.getenv("DB_TIMEOUT_SCALE", "1"))
+
+        # Склейка одновременных одинаковых чтений (DB_SINGLEFLIGHT=0 - выключить)
+        self.singleflight = SingleFlight() if os.getenv("DB_SINGLEFLIGHT", "1") == "1" else None
+
+        # Локальный бэкенд (DB_BACKEND=memory): запросы не уходят в сеть
+        # Прямое подключение (DB_BACKEND=postgres): пул asyncpg вместо PostgREST
+        self.backend = None
+        backend = os.getenv("DB_BACKEND", "supabase").lower()
+        if backend == "memory":
+            from database.local_backend import LocalBackend
+            self.use_backend(LocalBackend.from_env())
+        elif backend == "postgres":
+            from database.pg_backend import PgBackend
+            self.use_backend(PgBackend.from_env())
+
+    def use_backend(self, backend):
+        """Подключение альтернативного бэкенда с тем же execute_query/execute_rpc"""
+        self.backend = backend
+        self._initialized = True
+        logger.info(f"✅ Бэкенд БД: {type(backend).__name__}")
+
     def initialize(self):
         """Инициализация Supabase клиента"""
         if self._initialized:
@@ -31,6 +78,7 @@ class SupabaseManager:
             raise ValueError("SUPABASE_URL и SUPABASE_ANON_KEY должны быть установлены в .env")
 
         try:
+            from supabase import create_client
             self.client = create_client(url, key)
             self._initialized = True
             logger.info("✅ Supabase клиент инициализирован")
@@ -38,7 +86,7 @@ class SupabaseManager:
             logger.error(f"❌ Ошибка инициализации Supabase: {e}")
             raise
 
-    def get_client(self) -> Client:
+    def get_client(self) -> 'Client':
         """Получить клиент Supabase"""
         if not self._initialized or not self.client:
             self.initialize()
@@ -46,38 +94,104 @@ class SupabaseManager:
 
     async def execute_query(self, table: str, operation: str, data: Dict = None,
                             filters: Dict = None, select: str = "*",
-                            single: bool = False) -> Any:
+                            single: bool = False, limit: int = None) -> Any:
         """
         Универсальный метод для выполнения запросов к Supabase
+        Каждый вызов учитывается в utils.db_metrics (счетчик апдейта, задержка).
+        Одновременные одинаковые чтения склеиваются в один запрос (singleflight).
+
+        Ошибка запроса - None, как и раньше. Недоступность БД (таймаут, сеть,
+        разомкнутый предохранитель) - исключение DatabaseUnavailable
         """
+        call = lambda: self._guarded(
+            table, operation, lambda: self._execute_query(table, operation, data, filters, select, single, limit)
+        )
+        if self.singleflight is not None:
+            if operation in _READ_OPERATIONS:
+                key = (table, operation, json.dumps(filters, sort_keys=True, default=str), select, single, limit)
+                return await self._coalesced(key, table, table, operation, call)
+            # Запись: следующие чтения таблицы не должны получить результат чтения, начатого до нее
+            self.singleflight.forget_group(table)
+            self.singleflight.forget_group("rpc")
+
+        started = time.perf_counter()
         try:
+            return await call()
+        finally:
+            db_metrics.record(table, operation, (time.perf_counter() - started) * 1000)
+
+    async def _coalesced(self, key, group: str, table: str, operation: str, call) -> Any:
+        """Чтение через singleflight: в метрики попадает только реальный запрос"""
+        started = time.perf_counter()
+        result, shared = await self.singleflight.do(key, call, group=group)
+        if shared:
+            db_metrics.record_coalesced(table, operation)
+        else:
+            db_metrics.record(table, operation, (time.perf_counter() - started) * 1000)
+        return result
+
+    def timeout_for(self, table: str, operation: str) -> Optional[float]:
+        """Таймаут запроса (для RPC table - имя функции); None - запись, ждем ее завершения"""
+        if operation not in _TIMEOUTS or (operation == "rpc" and table not in _READ_RPCS):
+            return None
+        timeout = _TIMEOUT_OVERRIDES.get((table, operation)) or _TIMEOUTS[operation]
+        return timeout * self.timeout_scale
+
+    async def _guarded(self, table: str, operation: str, call) -> Any:
+        """
+        Запрос через предохранитель, адаптивный лимит параллельных запросов
+        (database.concurrency) и с таймаутом операции (у записи таймаута нет)
+        """
+        if not db_breaker.allow():
+            raise DatabaseUnavailable(f"{table}.{operation}: БД недоступна (предохранитель разомкнут)")
+
+        try:
+            await db_limiter.acquire(request_priority(table, operation))
+        except (DatabaseOverloaded, asyncio.CancelledError):
+            # Запрос до БД не дошел - это не сбой БД
+            db_breaker.release_probe()
+            raise
+
+        started = time.perf_counter()
+        latency_ms = None
+        failed = False
+        try:
+            # timeout=None - без таймаута
+            result = await asyncio.wait_for(call(), self.timeout_for(table, operation))
+            latency_ms = (time.perf_counter() - started) * 1000
+        except asyncio.CancelledError:
+            db_breaker.release_probe()
+            raise
+        except Exception as e:
+            # Сюда доходят только сбои инфраструктуры - ошибки запроса _execute_* превращают в None
+            latency_ms = (time.perf_counter() - started) * 1000
+            failed = True
+            db_breaker.record_failure()
+            logger.error(f"❌ БД недоступна: {type(e).__name__} {e} | Table: {table} | Operation: {operation}")
+            raise DatabaseUnavailable(f"{table}.{operation}: {type(e).__name__}") from e
+        finally:
+            db_limiter.release(latency_ms, failed)
+
+        db_breaker.record_success()
+        return result
+
+    async def _execute_query(self, table: str, operation: str, data: Dict = None,
+                             filters: Dict = None, select: str = "*",
+                             single: bool = False, limit: int = None) -> Any:
+        try:
+            if self.backend is not None:
+                return await self.backend.execute_query(table, operation, data, filters, select, single, limit)
+
             client = self.get_client()
             query = client.table(table)
 
             if operation == "select":
-                query = query.select(select)
-                if filters:
-                    for key, value in filters.items():
-                        if isinstance(value, dict) and 'operator' in value:
-                            # Поддержка сложных операторов
-                            op = value['operator']
-                            val = value['value']
-                            if op == 'gte':
-                                query = query.gte(key, val)
-                            elif op == 'lte':
-                                query = query.lte(key, val)
-                            elif op == 'gt':
-                                query = query.gt(key, val)
-                            elif op == 'lt':
-                                query = query.lt(key, val)
-                            elif op == 'neq':
-                                query = query.neq(key, val)
-                            elif op == 'in':
-                                query = query.in_(key, val)
-                        else:
-                            query = query.eq(key, value)
-
-                response = query.execute()
+                query = _apply_filters(query.select(select), filters)
+
+                if limit:
+                    query = query.limit(limit)
+
+                response = await _execute(query)
 
                 # ИСПРАВЛЕНИЕ: правильная обработка single
                 if single:
@@ -85,7 +199,7 @@ class SupabaseManager:
                 return response.data
 
             elif operation == "insert":
-                response = query.insert(data).execute()
+                response = await _execute(query.insert(data))
                 # ИСПРАВЛЕНИЕ: возвращаем первый элемент для insert
                 return response.data[0] if response.data else None
 
@@ -94,42 +208,94 @@ class SupabaseManager:
                 if filters:
                     for key, value in filters.items():
                         query = query.eq(key, value)
-                response = query.execute()
+                response = await _execute(query)
                 return response.data
 
             elif operation == "delete":
                 if filters:
                     for key, value in filters.items():
                         query = query.eq(key, value)
-                response = query.delete().execute()
+                response = await _execute(query.delete())
                 return response.data
 
             elif operation == "upsert":
-                response = query.upsert(data).execute()
+                response = await _execute(query.upsert(data))
                 return response.data[0] if response.data else None
 
             elif operation == "count":
-                query = query.select("*", count="exact")
-                if filters:
-                    for key, value in filters.items():
-                        query = query.eq(key, value)
-                response = query.execute()
+                query = _apply_filters(query.select("*", count="exact"), filters)
+                response = await _execute(query)
                 return response.count
 
         except Exception as e:
+            if is_outage(e):
+                raise
             logger.error(f"❌ Ошибка Supabase запроса: {e} | Table: {table} | Operation: {operation}")
             return None
 
     async def execute_rpc(self, function_name: str, params: Dict = None) -> Any:
-        """Выполнение RPC функций в Supabase"""
+        """Выполнение RPC функций в Supabase (учитывается в utils.db_metrics, см. execute_query)"""
+        call = lambda: self._guarded(function_name, "rpc", lambda: self._execute_rpc(function_name, params))
+        if self.singleflight is not None:
+            if function_name in _READ_RPCS:
+                key = ("rpc", function_name, json.dumps(params, sort_keys=True, default=str))
+                return await self._coalesced(key, "rpc", function_name, "rpc", call)
+            # RPC с записью могут менять любые таблицы
+            self.singleflight.forget_group("rpc")
+
+        started = time.perf_counter()
+        try:
+            return await call()
+        finally:
+            db_metrics.record(function_name, "rpc", (time.perf_counter() - started) * 1000)
+
+    async def _execute_rpc(self, function_name: str, params: Dict = None) -> Any:
         try:
+            if self.backend is not None:
+                return await self.backend.execute_rpc(function_name, params)
+
             client = self.get_client()
-            response = client.rpc(function_name, params or {}).execute()
+            response = await _execute(client.rpc(function_name, params or {}))
             return response.data
         except Exception as e:
+            if is_outage(e):
+                raise
             logger.error(f"Ошибка RPC: {e} | Function: {function_name}")
             return None
 
+def _apply_filters(query, filters: Optional[Dict]):
+    """Фильтры выборки: значение - равенство, {'operator': ..., 'value': ...} - сравнение"""
+    for key, value in (filters or {}).items():
+        if isinstance(value, dict) and 'operator' in value:
+            # Поддержка сложных операторов
+            op = value['operator']
+            val = value['value']
+            if op == 'gte':
+                query = query.gte(key, val)
+            elif op == 'lte':
+                query = query.lte(key, val)
+            elif op == 'gt':
+                query = query.gt(key, val)
+            elif op == 'lt':
+                query = query.lt(key, val)
+            elif op == 'neq':
+                query = query.neq(key, val)
+            elif op == 'in':
+                query = query.in_(key, val)
+        else:
+            query = query.eq(key, value)
+    return query
+
+
+async def _execute(request) -> Any:
+    """
+    Запрос SDK Supabase синхронный: в потоке он не блокирует event loop.
+    Таймаут _guarded прерывает только ожидание - поток дорабатывает запрос,
+    поэтому таймаут есть только у чтений (см. _TIMEOUTS)
+    """
+    return await asyncio.to_thread(request.execute)
+
+
 # Глобальный экземпляр менеджера
 supabase_manager = SupabaseManager()
 
@@ -138,6 +304,6 @@ async def execute_db(query_type: str = "select", table: str = "", **kwargs):
     """Обертка для совместимости со старым кодом"""
     return await supabase_manager.execute_query(table, query_type, **kwargs)
 
-def get_supabase_client() -> Client:
+def get_supabase_client() -> 'Client':
     """Получить Supabase клиент"""
     return supabase_manager.get_client()
@@ -0,0 +1,195 @@
+"""
+Кэш профилей игроков Ryabot Island
+Активные игроки перечитывают свою строку users на каждое нажатие. Кэш процесса
+(LRU + TTL, размер по бюджету памяти) заполняется чтениями get_user и
+обновляется на месте каждой функцией записи database.models, поэтому
+повторные чтения не ходят в БД.
+
+Апдейты игрока обрабатывает один процесс (utils.sharding), так что записи
+идут через этот же кэш; изменения в обход бота (админка Supabase, RPC)
+доживают до TTL или сбрасываются через invalidate.
+
+Балансы (энергия, рябаксы, RBTC) начисляют и RPC других процессов, поэтому
+из кэша они только показываются: в БД уходят приращения (RPC
+add_user_resources), списание в минус БД отклоняет, а свежие значения из ее
+ответа записываются в кэш.
+
+Переменные окружения:
+    USER_CACHE_MB   - бюджет памяти кэша (0 - кэш выключен)
+    USER_CACHE_TTL  - время жизни записи (секунды)
+"""
+import os
+import sys
+import copy
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _sizeof(obj: Any) -> int:
+    """Приблизительный размер объекта с атрибутами (байты)"""
+    size = sys.getsizeof(obj)
+    attrs = getattr(obj, "__dict__", None)
+    if attrs is not None:
+        size += sys.getsizeof(attrs)
+        size += sum(sys.getsizeof(value) for value in attrs.values())
+    return size
+
+
+class UserCache:
+    """LRU кэш объектов User с TTL и ограничением по памяти"""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, ttl: float = 60.0):
+        """
+        Args:
+            max_bytes: бюджет памяти; при превышении вытесняются давно не читанные
+            ttl: время жизни записи с момента заполнения (секунды)
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = max_bytes > 0
+
+        # user_id -> (User, срок жизни, размер)
+        self._entries: "OrderedDict[int, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        # Версия записи: чтение, начатое до записи, не кладет в кэш устаревшую строку
+        self._versions: Dict[int, int] = {}
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'writes': 0,
+            'invalidations': 0
+        }
+
+    # ---------- Чтение ----------
+
+    def get(self, user_id: int) -> Optional[Any]:
+        """Копия закэшированного User или None (промах)"""
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(user_id)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+
+        user, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._drop(user_id)
+            self.stats['expired'] += 1
+            self.stats['misses'] += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.stats['hits'] += 1
+        # Вызывающие иногда меняют поля локально - кэш от этого не страдает
+        return copy.copy(user)
+
+    def version(self, user_id: int) -> int:
+        """Версия записи перед чтением из БД (передается в fill)"""
+        return self._versions.get(user_id, 0)
+
+    def fill(self, user_id: int, user: Any, version: Optional[int] = None):
+        """Кладет прочитанного из БД User, если с начала чтения не было записей"""
+        if not self.enabled:
+            return
+        if version is not None and self._versions.get(user_id, 0) != version:
+            return
+        self._store(user_id, copy.copy(user))
+
+    # ---------- Запись ----------
+
+    def apply(self, user_id: int, updates: Dict[str, Any]):
+        """Записанные в БД поля применяются к закэшированному User на месте"""
+        self._bump(user_id)
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+
+        user = entry[0]
+        for field, value in updates.items():
+            if hasattr(user, field):
+                setattr(user, field, value)
+        self.stats['writes'] += 1
+        # Размер мог измениться (activity_data, username)
+        self._store(user_id, user, expires_at=entry[1])
+
+    def invalidate(self, user_id: int):
+        """Сброс записи (исход записи неизвестен или она прошла в обход кэша)"""
+        self._bump(user_id)
+        if self._drop(user_id):
+            self.stats['invalidations'] += 1
+
+    def invalidate_many(self, user_ids: Iterable[int]):
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._versions.clear()
+        self._bytes = 0
+
+    # ---------- Внутреннее ----------
+
+    def _bump(self, user_id: int):
+        if self.enabled:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            if len(self._versions) > 4 * max(len(self._entries), 1024):
+                # Версии нужны только пока идет чтение - старые можно забыть
+                self._versions = {key: value for key, value in self._versions.items() if key in self._entries}
+
+    def _store(self, user_id: int, user: Any, expires_at: Optional[float] = None):
+        self._drop(user_id)
+        size = _sizeof(user)
+        if expires_at is None:
+            expires_at = time.monotonic() + self.ttl
+        self._entries[user_id] = (user, expires_at, size)
+        self._bytes += size
+
+        while self._bytes > self.max_bytes and self._entries:
+            evicted, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.stats['evictions'] += 1
+
+    def _drop(self, user_id: int) -> bool:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[2]
+        return True
+
+    # ---------- Статистика ----------
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def hit_rate(self) -> float:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            'entries': self.size,
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hit_rate': round(self.hit_rate(), 4)
+        }
+
+
+# Глобальный экземпляр
+user_cache = UserCache(
+    max_bytes=int(float(os.getenv("USER_CACHE_MB", "16")) * 1024 * 1024),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60"))
+)
@@ -0,0 +1,166 @@
+"""
+Производство построек фермы Ryabot Island
+Накопленный выход считается в закрытой форме (ставка × прошедшее время)
+сразу для всех построек одним проходом NumPy, без тиков и циклов по строкам
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Iterable
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Типы построек: ресурс, базовая ставка в час (1 уровень), прибавка ставки за уровень
+# и вместимость склада в часах производства (дальше накопление останавливается)
+BUILDING_TYPES = {
+    'henhouse': {'name': '🐔 Курятник', 'resource': 'eggs', 'base_rate': 6.0, 'level_bonus': 0.25, 'capacity_hours': 12.0},
+    'stable': {'name': '🐴 Конюшня', 'resource': 'energy', 'base_rate': 1.25, 'level_bonus': 1.0, 'capacity_hours': 4.0},
+    'cowshed': {'name': '🐄 Коровник', 'resource': 'milk', 'base_rate': 4.0, 'level_bonus': 0.25, 'capacity_hours': 12.0},
+    'field': {'name': '🌾 Поле', 'resource': 'grain', 'base_rate': 10.0, 'level_bonus': 0.2, 'capacity_hours': 24.0},
+    'garden': {'name': '🍅 Огород', 'resource': 'vegetables', 'base_rate': 5.0, 'level_bonus': 0.2, 'capacity_hours': 24.0},
+}
+
+# Ресурсы в фиксированном порядке (столбцы результирующих матриц)
+RESOURCES = tuple(dict.fromkeys(info['resource'] for info in BUILDING_TYPES.values()))
+
+_TYPE_INDEX = {name: i for i, name in enumerate(BUILDING_TYPES)}
+_UNKNOWN_TYPE = len(BUILDING_TYPES)
+
+# Таблицы параметров по индексу типа (последняя строка - неизвестный тип с нулевой ставкой)
+_BASE_RATE = np.array([info['base_rate'] for info in BUILDING_TYPES.values()] + [0.0])
+_LEVEL_BONUS = np.array([info['level_bonus'] for info in BUILDING_TYPES.values()] + [0.0])
+_CAPACITY_SECONDS = np.array([info['capacity_hours'] * 3600 for info in BUILDING_TYPES.values()] + [0.0])
+_RESOURCE_INDEX = np.array(
+    [RESOURCES.index(info['resource']) for info in BUILDING_TYPES.values()] + [0]
+)
+
+
+def _to_timestamp(value, default: float) -> float:
+    """ISO-строка / datetime из Supabase -> unix timestamp"""
+    if not value:
+        return default
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+@dataclass(frozen=True)
+class ProductionColumns:
+    """Колонки построек в виде массивов (одна строка = одна постройка)"""
+    ids: np.ndarray
+    user_ids: np.ndarray
+    type_idx: np.ndarray
+    levels: np.ndarray
+    last_collected: np.ndarray
+    next_collection: np.ndarray
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict], now: float) -> "ProductionColumns":
+        """
+        Строит колонки из строк таблицы farm_buildings
+        Неактивные постройки отбрасываются, постройки без last_collected
+        считаются собранными в момент created_at
+        """
+        rows = [row for row in rows if row.get('is_active', True)]
+        count = len(rows)
+
+        ids = np.fromiter((row.get('id', 0) for row in rows), dtype=np.int64, count=count)
+        user_ids = np.fromiter((row.get('user_id', 0) for row in rows), dtype=np.int64, count=count)
+        type_idx = np.fromiter(
+            (_TYPE_INDEX.get(row.get('building_type'), _UNKNOWN_TYPE) for row in rows),
+            dtype=np.int64, count=count
+        )
+        levels = np.fromiter((row.get('level') or 1 for row in rows), dtype=np.float64, count=count)
+        last_collected = np.fromiter(
+            (_to_timestamp(row.get('last_collected') or row.get('created_at'), now) for row in rows),
+            dtype=np.float64, count=count
+        )
+        next_collection = np.fromiter(
+            (_to_timestamp(row.get('next_collection'), 0.0) for row in rows),
+            dtype=np.float64, count=count
+        )
+
+        return cls(ids, user_ids, type_idx, levels, last_collected, next_collection)
+
+
+@dataclass(frozen=True)
+class ProductionResult:
+    """Результат расчета для набора построек"""
+    ids: np.ndarray
+    user_ids: np.ndarray
+    resource_idx: np.ndarray
+    accrued: np.ndarray
+    ready: np.ndarray
+    seconds_to_full: np.ndarray
+
+    def totals(self) -> Dict[str, float]:
+        """Сумма готового к сбору по ресурсам"""
+        sums = np.bincount(
+            self.resource_idx, weights=np.where(self.ready, self.accrued, 0.0),
+            minlength=len(RESOURCES)
+        )
+        return {resource: float(sums[i]) for i, resource in enumerate(RESOURCES) if sums[i] > 0}
+
+    def ready_ids(self) -> List[int]:
+        """ID построек, с которых можно собрать урожай"""
+        return self.ids[self.ready & (self.accrued > 0)].tolist()
+
+
+class ProductionEngine:
+    """Векторный расчет производства построек"""
+
+    def compute(self, columns: ProductionColumns, now: float) -> ProductionResult:
+        """
+        Накопленный выход для всех построек одним проходом
+
+        accrued = base_rate × (1 + bonus × (level - 1)) × min(now - last_collected, capacity)
+        """
+        t = columns.type_idx
+        rate_per_second = _BASE_RATE[t] * (1.0 + _LEVEL_BONUS[t] * (columns.levels - 1)) / 3600.0
+        capacity = _CAPACITY_SECONDS[t]
+
+        elapsed = np.clip(now - columns.last_collected, 0.0, None)
+        accrued = rate_per_second * np.minimum(elapsed, capacity)
+        ready = columns.next_collection <= now
+
+        return ProductionResult(
+            ids=columns.ids,
+            user_ids=columns.user_ids,
+            resource_idx=_RESOURCE_INDEX[t],
+            accrued=np.floor(accrued),
+            ready=ready,
+            seconds_to_full=np.clip(capacity - elapsed, 0.0, None)
+        )
+
+    def compute_rows(self, rows: Iterable[dict], now: Optional[float] = None) -> ProductionResult:
+        """Расчет по строкам farm_buildings (один игрок или любой набор)"""
+        now = now if now is not None else datetime.now(timezone.utc).timestamp()
+        return self.compute(ProductionColumns.from_rows(rows, now), now)
+
+    def compute_batch(self, rows: Iterable[dict], now: Optional[float] = None) -> Dict[int, Dict[str, float]]:
+        """
+        Готовый к сбору выход сразу для многих игроков
+
+        Returns:
+            dict: user_id -> {resource: amount}
+        """
+        result = self.compute_rows(rows, now)
+        if result.ids.size == 0:
+            return {}
+
+        users, user_pos = np.unique(result.user_ids, return_inverse=True)
+        matrix = np.zeros((users.size, len(RESOURCES)))
+        np.add.at(matrix, (user_pos, result.resource_idx), np.where(result.ready, result.accrued, 0.0))
+
+        return {
+            int(user_id): {RESOURCES[j]: float(matrix[i, j]) for j in np.flatnonzero(matrix[i])}
+            for i, user_id in enumerate(users)
+        }
+
+
+# Глобальный экземпляр
+production_engine = ProductionEngine()
@@ -0,0 +1,282 @@
+"""
+Экономика Ryabot Island: единый источник цен
+Все цены, стоимость найма и данные обучения загружаются один раз в неизменяемую
+версионированную таблицу. Горячая перезагрузка (из файла или БД) собирает новую
+таблицу и атомарно подменяет ссылку - обработчики никогда не видят смесь версий
+
+Таблица всегда собирается из всех источников в одном порядке (следующий важнее):
+переменные окружения -> PRICES_FILE -> таблица game_prices. Перезагрузка одного
+источника не сбрасывает последние загруженные переопределения другого
+
+Несколько воркеров (webhook_front): /reload_prices db публикует новую версию цен
+в game_prices_version, а каждый воркер раз в PRICES_DB_POLL секунд (по умолчанию
+30, 0 - не следить) сравнивает ее со своей и перечитывает game_prices (watch_db)
+"""
+import os
+import json
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Optional, Mapping, Any
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Период опроса опубликованной в БД версии цен (секунды, 0 - не опрашивать)
+PRICES_DB_POLL = float(os.getenv("PRICES_DB_POLL", "30"))
+
+# Профессии Академии: ключ -> (название, env стоимости, цена по умолчанию, env времени, часы по умолчанию)
+_PROFESSIONS = {
+    'builder': ('👷 Строитель', "BUILDER_COST", 100, "BUILDER_TIME", 2.0),
+    'farmer': ('👨‍🌾 Фермер', "FARMER_COST", 100, "FARMER_TIME", 2.0),
+    'woodman': ('🧑‍🚒 Лесник', "WOODMAN_COST", 120, "WOODMAN_TIME", 3.0),
+    'soldier': ('💂 Солдат', "SOLDIER_COST", 150, "SOLDIER_TIME", 4.0),
+    'fisherman': ('🎣 Рыбак', "FISHERMAN_COST", 110, "FISHERMAN_TIME", 2.5),
+    'scientist': ('👨‍🔬 Ученый', "SCIENTIST_COST", 200, "SCIENTIST_TIME", 6.0),
+    'cook': ('👨‍🍳 Повар', "COOK_COST", 130, "COOK_TIME", 3.0),
+    'teacher': ('👨‍🏫 Учитель', "TEACHER_COST", 180, "TEACHER_TIME", 5.0),
+    'doctor': ('🧑‍⚕️ Доктор', "DOCTOR_COST", 220, "DOCTOR_TIME", 8.0),
+}
+
+# Цены магазина: ключ -> (env, значение по умолчанию)
+_SHOP_PRICES = {
+    # Животные
+    'ryaba_price': ("RYABA_PRICE", 250),
+    'rooster_price': ("ROOSTER_PRICE", 500),
+    'chick_price': ("CHICK_PRICE", 100),
+    'horse_price': ("HORSE_PRICE", 1500),
+    'cow_price': ("COW_PRICE", 1200),
+
+    # Семена
+    'grain_seeds_price': ("GRAIN_SEEDS_PRICE", 25),
+    'tomato_seeds_price': ("TOMATO_SEEDS_PRICE", 50),
+    'cucumber_seeds_price': ("CUCUMBER_SEEDS_PRICE", 40),
+
+    # Постройки
+    'henhouse_price': ("HENHOUSE_PRICE", 800),
+    'stable_price': ("STABLE_PRICE", 2000),
+    'cowshed_price': ("COWSHED_PRICE", 1800),
+
+    # Снаряжение экспедиций (по зонам game.expedition.ZONES)
+    'expedition_zone1_price': ("EXPEDITION_ZONE1_PRICE", 20),
+    'expedition_zone2_price': ("EXPEDITION_ZONE2_PRICE", 50),
+    'expedition_zone3_price': ("EXPEDITION_ZONE3_PRICE", 100),
+}
+
+
+def _freeze(value: Any) -> Any:
+    """Рекурсивно превращает словари в read-only MappingProxyType"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    """Обратное преобразование (для совместимости со старым кодом, ожидающим dict)"""
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    return value
+
+
+@dataclass(frozen=True)
+class PriceTable:
+    """Неизменяемая версия всех игровых цен"""
+    version: int
+    source: str
+    prices: Mapping[str, Any]
+    training: Mapping[str, Mapping[str, Any]]
+    hire: Mapping[str, Any]
+    training_base_slots: int
+    loaded_at: datetime = field(default_factory=datetime.now)
+
+    def price(self, key: str, default: Any = None) -> Any:
+        """Цена товара магазина"""
+        return self.prices.get(key, default)
+
+    def hire_cost(self, current_workers: int) -> int:
+        """Стоимость найма следующего рабочего"""
+        return self.hire['base_cost'] + self.hire['cost_increment'] * current_workers
+
+    def profession(self, unit_type: str) -> Optional[Mapping[str, Any]]:
+        """Данные профессии для обучения (None - неизвестная профессия)"""
+        return self.training.get(unit_type)
+
+    def prices_dict(self) -> dict:
+        """Изменяемая копия цен (для старого кода, ожидающего dict)"""
+        return _thaw(self.prices)
+
+    def training_dict(self) -> dict:
+        """Изменяемая копия данных обучения (для старого кода, ожидающего dict)"""
+        return _thaw(self.training)
+
+
+def _env_defaults() -> dict:
+    """Значения из переменных окружения (читаются только при загрузке таблицы)"""
+    return {
+        'prices': {
+            **{key: int(os.getenv(env, str(default))) for key, (env, default) in _SHOP_PRICES.items()},
+            'rbtc_rate': config.game.rbtc_to_ryabucks_rate,
+            'shard_rate': float(os.getenv("SHARD_RATE", "50.0")),
+        },
+        'training': {
+            key: {
+                'name': name,
+                'cost': int(os.getenv(cost_env, str(cost))),
+                'time_hours': float(os.getenv(time_env, str(hours)))
+            }
+            for key, (name, cost_env, cost, time_env, hours) in _PROFESSIONS.items()
+        },
+        'hire': {
+            'base_cost': config.game.hire_base_cost,
+            'cost_increment': config.game.hire_cost_increment,
+            'cooldown_hours': config.game.hire_cooldown_hours,
+            'daily_limit': config.game.hire_daily_limit,
+        },
+        'training_base_slots': config.game.training_base_slots,
+    }
+
+
+def _merge(base: dict, overrides: Mapping) -> dict:
+    """Накладывает переопределения (из файла/БД) на значения по умолчанию"""
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, Mapping) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class PricingEngine:
+    """Хранит текущую таблицу цен и умеет атомарно ее перезагружать"""
+
+    def __init__(self, prices_file: Optional[str] = None):
+        self.prices_file = prices_file
+        self._version = 0
+        self._file_mtime: Optional[float] = None
+        # Последние загруженные переопределения каждого источника
+        self._file_overrides: dict = self._load_file_overrides()
+        self._db_overrides: dict = {}
+        # Версия опубликованных в БД цен, загруженная этим процессом (0 - ни одной)
+        self._db_version = 0
+        self._table = self._build()
+
+    @property
+    def table(self) -> PriceTable:
+        """Текущая версия таблицы цен (одно чтение ссылки, без блокировок)"""
+        return self._table
+
+    def _build(self) -> PriceTable:
+        """Таблица из env + файла + БД (в порядке возрастания приоритета)"""
+        data = _merge(_merge(_env_defaults(), self._file_overrides), self._db_overrides)
+        self._version += 1
+
+        sources = ["env"]
+        if self._file_overrides:
+            sources.append("file")
+        if self._db_overrides:
+            sources.append("db")
+
+        return PriceTable(
+            version=self._version,
+            source="+".join(sources),
+            prices=_freeze(data['prices']),
+            training=_freeze(data['training']),
+            hire=_freeze(data['hire']),
+            training_base_slots=int(data['training_base_slots'])
+        )
+
+    def _load_file_overrides(self) -> dict:
+        """Читает JSON с переопределениями цен (PRICES_FILE)"""
+        if not self.prices_file or not os.path.exists(self.prices_file):
+            return {}
+
+        self._file_mtime = os.path.getmtime(self.prices_file)
+        with open(self.prices_file, encoding="utf-8") as f:
+            return json.load(f)
+
+    def reload_from_file(self) -> PriceTable:
+        """Перезагрузка цен из файла (переопределения из БД сохраняются)"""
+        self._file_overrides = self._load_file_overrides()
+        self._table = self._build()
+        logger.info(f"💵 Таблица цен перезагружена из файла (версия {self._table.version})")
+        return self._table
+
+    async def _published_version(self) -> int:
+        """Версия опубликованных в БД цен (0 - цены ни разу не публиковались)"""
+        from database.supabase_client import supabase_manager
+
+        rows = await supabase_manager.execute_query(
+            table="game_prices_version",
+            operation="select",
+            select="version",
+            filters={"id": 1}
+        )
+        if rows is None:
+            raise RuntimeError("таблица game_prices_version недоступна")
+        return int(rows[0]['version']) if rows else 0
+
+    async def reload_from_db(self, publish: bool = False) -> PriceTable:
+        """
+        Перезагрузка цен из таблицы game_prices (переопределения из файла сохраняются)
+
+        Args:
+            publish: опубликовать новую версию цен - остальные воркеры перечитают
+                     game_prices на следующем опросе (watch_db)
+        """
+        from database.supabase_client import supabase_manager
+
+        # Версия читается до строк: изменение между ними подхватит следующий опрос
+        if publish:
+            version = int(await supabase_manager.execute_rpc("publish_game_prices"))
+        else:
+            version = await self._published_version()
+
+        rows = await supabase_manager.execute_query(table="game_prices", operation="select")
+        if rows is None:
+            raise RuntimeError("таблица game_prices недоступна")
+
+        self._db_overrides = {row['key']: row['value'] for row in rows}
+        self._db_version = version
+        self._table = self._build()
+        logger.info(f"💵 Таблица цен перезагружена из БД (версия {self._table.version}, опубликована {version})")
+        return self._table
+
+    async def watch_file(self, interval: float = 30.0):
+        """Фоновая задача: перезагрузка при изменении PRICES_FILE"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self.prices_file and os.path.exists(self.prices_file):
+                    if os.path.getmtime(self.prices_file) != self._file_mtime:
+                        self.reload_from_file()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка перезагрузки цен из файла: {e}")
+
+    async def watch_db(self, interval: float = PRICES_DB_POLL):
+        """
+        Фоновая задача каждого воркера: перезагрузка, когда в БД опубликована новая версия цен
+        Первая проверка - сразу при запуске: новый воркер не отстает от уже опубликованных цен
+        """
+        while True:
+            try:
+                if await self._published_version() != self._db_version:
+                    await self.reload_from_db()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка перезагрузки цен из БД: {e}")
+            await asyncio.sleep(interval)
+
+
+# Глобальный экземпляр
+pricing = PricingEngine(prices_file=os.getenv("PRICES_FILE"))
+
+
+def get_price_table() -> PriceTable:
+    """Текущая таблица цен"""
+    return pricing.table
@@ -0,0 +1,275 @@
+"""
+Экспедиции Ryabot Island
+Исход экспедиции полностью определяется seed и параметрами, сохраненными при старте:
+в БД не хранится промежуточное состояние, а завершение тысяч экспедиций -
+один векторный расчет NumPy и один RPC вызов
+
+Экспедиция разрешается той версией формулы, с которой ее отправили
+(params['version']): изменение формулы - новая функция в _ENGINES и новый
+ENGINE_VERSION, старая остается, пока в БД есть ее активные экспедиции.
+Экспедиции неизвестной версии (отправлены более новым кодом) не завершаются
+и ждут воркер, который знает их формулу.
+
+Отправка - start_expedition (экран handlers.expedition): снаряжение списывается
+из рябаксов по цене из game.economy, энергию списывает EnergyMiddleware
+(действие start_expedition).
+"""
+import asyncio
+import logging
+import secrets
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+from database.concurrency import prioritized, PRIORITY_MONEY
+from database.models import (
+    create_expedition, get_active_expeditions, get_finished_expeditions,
+    save_expedition_results, update_user_resources
+)
+from game.economy import pricing
+from game.rbtc import rbtc_emission
+
+logger = logging.getLogger(__name__)
+
+# Версия формулы исхода: сохраняется в params, чтобы старые seed давали прежний результат
+ENGINE_VERSION = 1
+
+# Сколько экспедиций игрок может держать в пути одновременно
+MAX_ACTIVE_EXPEDITIONS = 1
+
+# Зоны экспедиций
+ZONES = {
+    1: {'name': '🌴 Пальмовая роща', 'duration_hours': 1.0, 'success_chance': 0.9,
+        'rbtc': (0.01, 0.05), 'ryabucks': (20, 60)},
+    2: {'name': '⛰️ Скалистые холмы', 'duration_hours': 3.0, 'success_chance': 0.75,
+        'rbtc': (0.05, 0.20), 'ryabucks': (50, 150)},
+    3: {'name': '🌋 Вулкан', 'duration_hours': 8.0, 'success_chance': 0.5,
+        'rbtc': (0.20, 1.00), 'ryabucks': (100, 400)},
+}
+
+# Шанс находки-джекпота (x3 к RBTC) при успешной экспедиции
+JACKPOT_CHANCE = 0.02
+JACKPOT_MULTIPLIER = 3.0
+
+# Потоки случайных чисел внутри одного seed
+_STREAM_SUCCESS = 0
+_STREAM_RBTC = 1
+_STREAM_RYABUCKS = 2
+_STREAM_JACKPOT = 3
+
+# Параметры зон по zone_id (строка 0 - неизвестная зона, экспедиция всегда неудачна)
+_MAX_ZONE = max(ZONES)
+_SUCCESS = np.zeros(_MAX_ZONE + 1)
+_RBTC_LO = np.zeros(_MAX_ZONE + 1)
+_RBTC_HI = np.zeros(_MAX_ZONE + 1)
+_RYABUCKS_LO = np.zeros(_MAX_ZONE + 1)
+_RYABUCKS_HI = np.zeros(_MAX_ZONE + 1)
+for _zone_id, _zone in ZONES.items():
+    _SUCCESS[_zone_id] = _zone['success_chance']
+    _RBTC_LO[_zone_id], _RBTC_HI[_zone_id] = _zone['rbtc']
+    _RYABUCKS_LO[_zone_id], _RYABUCKS_HI[_zone_id] = _zone['ryabucks']
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def new_seed() -> int:
+    """Seed для новой экспедиции (влезает в BIGINT)"""
+    return secrets.randbits(63)
+
+
+def _uniform(seeds: np.ndarray, stream: int) -> np.ndarray:
+    """
+    Счетчиковый генератор (splitmix64): u = f(seed, stream) в [0, 1)
+    Каждое число зависит только от seed и номера потока, поэтому результат
+    не зависит от состава и порядка пачки
+    """
+    with np.errstate(over='ignore'):
+        z = seeds + np.uint64(stream + 1) * _GOLDEN
+        z = (z ^ (z >> np.uint64(30))) * _MIX_1
+        z = (z ^ (z >> np.uint64(27))) * _MIX_2
+        z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+@dataclass(frozen=True)
+class ExpeditionOutcomes:
+    """Исходы пачки экспедиций (столбцы одинаковой длины)"""
+    success: np.ndarray
+    jackpot: np.ndarray
+    rbtc: np.ndarray
+    ryabucks: np.ndarray
+
+    def outcome_labels(self) -> List[str]:
+        """Текстовый статус для каждой экспедиции"""
+        return np.where(self.jackpot, 'jackpot', np.where(self.success, 'success', 'failed')).tolist()
+
+
+def _resolve_v1(seeds: np.ndarray, zones: np.ndarray) -> ExpeditionOutcomes:
+    """Формула версии 1 (seeds - uint64, zones - проверенные номера зон)"""
+    success = _uniform(seeds, _STREAM_SUCCESS) < _SUCCESS[zones]
+    jackpot = success & (_uniform(seeds, _STREAM_JACKPOT) < JACKPOT_CHANCE)
+
+    rbtc = _RBTC_LO[zones] + _uniform(seeds, _STREAM_RBTC) * (_RBTC_HI[zones] - _RBTC_LO[zones])
+    rbtc = np.where(jackpot, rbtc * JACKPOT_MULTIPLIER, rbtc)
+    rbtc = np.where(success, np.round(rbtc, 2), 0.0)
+
+    ryabucks = _RYABUCKS_LO[zones] + _uniform(seeds, _STREAM_RYABUCKS) * (_RYABUCKS_HI[zones] - _RYABUCKS_LO[zones] + 1)
+    ryabucks = np.where(success, np.floor(ryabucks), 0).astype(np.int64)
+
+    return ExpeditionOutcomes(success=success, jackpot=jackpot, rbtc=rbtc, ryabucks=ryabucks)
+
+
+# Формулы исхода по версии (старые версии не удаляются, пока есть их активные экспедиции)
+_ENGINES = {
+    1: _resolve_v1,
+}
+
+
+def expedition_version(row: dict) -> int:
+    """Версия формулы экспедиции (строки до появления версии - 1)"""
+    return int((row.get('params') or {}).get('version', 1))
+
+
+def resolve_batch(seeds, zone_ids, version: int = ENGINE_VERSION) -> ExpeditionOutcomes:
+    """
+    Векторное разрешение пачки экспедиций одной версии формулы
+
+    Args:
+        seeds: seed каждой экспедиции
+        zone_ids: зона каждой экспедиции
+        version: версия формулы (KeyError - неизвестная версия)
+    """
+    engine = _ENGINES[version]
+    seeds = np.asarray(seeds, dtype=np.int64).astype(np.uint64)
+    zones = np.asarray(zone_ids, dtype=np.int64)
+    zones = np.where((zones >= 1) & (zones <= _MAX_ZONE), zones, 0)
+    return engine(seeds, zones)
+
+
+def resolve(seed: int, zone_id: int, version: int = ENGINE_VERSION) -> dict:
+    """Исход одной экспедиции (та же формула, что и в пачке)"""
+    outcome = resolve_batch([seed], [zone_id], version)
+    return {
+        'outcome': outcome.outcome_labels()[0],
+        'rbtc': float(outcome.rbtc[0]),
+        'ryabucks': int(outcome.ryabucks[0])
+    }
+
+
+def build_results(expeditions: List[dict]) -> List[dict]:
+    """
+    Разрешает строки таблицы expeditions и готовит пачку результатов для RPC
+
+    Каждая версия формулы считается своей пачкой; экспедиции неизвестной
+    версии пропускаются (остаются активными)
+
+    Args:
+        expeditions: строки с полями id, user_id, seed, zone_id, params
+    """
+    by_version = defaultdict(list)
+    for row in expeditions:
+        by_version[expedition_version(row)].append(row)
+
+    results = []
+    for version, rows in by_version.items():
+        if version not in _ENGINES:
+            logger.warning(f"⚠️ Экспедиции версии {version} не завершены ({len(rows)} шт.): формула неизвестна")
+            continue
+
+        outcome = resolve_batch(
+            [row['seed'] for row in rows],
+            [row.get('zone_id') or 0 for row in rows],
+            version
+        )
+        labels = outcome.outcome_labels()
+        results.extend(
+            {
+                'id': row['id'],
+                'user_id': row['user_id'],
+                'outcome': labels[i],
+                'rbtc': float(outcome.rbtc[i]),
+                'ryabucks': int(outcome.ryabucks[i])
+            }
+            for i, row in enumerate(rows)
+        )
+    return results
+
+
+def expedition_price(zone_id: int) -> int:
+    """Цена снаряжения экспедиции в зону (рябаксы)"""
+    return int(pricing.table.price(f"expedition_zone{zone_id}_price", 0))
+
+
+@prioritized(PRIORITY_MONEY)
+async def start_expedition(user_id: int, zone_id: int) -> tuple[bool, str]:
+    """Отправляет экспедицию: списывает снаряжение, сохраняет seed и версию формулы"""
+    zone = ZONES.get(zone_id)
+    if not zone:
+        return False, "❌ Неизвестная зона экспедиции!"
+
+    if len(await get_active_expeditions(user_id)) >= MAX_ACTIVE_EXPEDITIONS:
+        return False, "🗺️ Экспедиция уже в пути - дождитесь ее возвращения"
+
+    price = expedition_price(zone_id)
+    if price and not await update_user_resources(user_id, ryabucks=-price):
+        return False, f"❌ Недостаточно рябаксов! Снаряжение стоит {price} 💵"
+
+    ends_at = datetime.now() + timedelta(hours=zone['duration_hours'])
+    expedition = await create_expedition(
+        user_id=user_id,
+        zone_id=zone_id,
+        seed=new_seed(),
+        params={'version': ENGINE_VERSION, 'zone_id': zone_id},
+        ends_at=ends_at
+    )
+
+    if not expedition:
+        if price:
+            await update_user_resources(user_id, ryabucks=price)
+        return False, "⚠️ Ошибка отправки экспедиции. Попробуйте позже"
+
+    return True, f"🗺️ Экспедиция в зону {zone['name']} отправлена!\n⏰ Вернется через: {zone['duration_hours']:g}ч"
+
+
+async def complete_finished_expeditions(limit: int = 5000) -> int:
+    """
+    Завершает все закончившиеся экспедиции: одна выборка, один векторный
+    расчет и одна запись результатов
+
+    Returns:
+        int: количество завершенных экспедиций
+    """
+    finished = await get_finished_expeditions(limit)
+    if not finished:
+        return 0
+
+    results = build_results(finished)
+
+    # Найденный RBTC ограничен глобальным дневным бюджетом эмиссии
+    granted = await rbtc_emission.allocate_many(result['rbtc'] for result in results)
+    for result, amount in zip(results, granted):
+        result['rbtc'] = amount
+
+    saved = await save_expedition_results(results)
+    # RBTC несохраненных результатов не начислен - возвращаем в резерв эмиссии
+    unsaved = sum(amount for result, amount in zip(results, granted) if result['id'] not in saved)
+    if unsaved:
+        rbtc_emission.refund(unsaved)
+
+    logger.info(f"🗺️ Завершено экспедиций: {len(saved)} из {len(results)}")
+    return len(saved)
+
+
+async def expedition_completion_loop(interval: float = 60.0):
+    """Фоновая задача завершения экспедиций"""
+    while True:
+        try:
+            await complete_finished_expeditions()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка фонового завершения экспедиций: {e}")
+        await asyncio.sleep(interval)
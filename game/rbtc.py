@@ -0,0 +1,210 @@
+"""
+Эмиссия RBTC Ryabot Island
+Глобальный дневной бюджет раздается процессам резервами (lease): события добычи
+списываются из локального резерва без обращения к БД, а фактическая эмиссия
+периодически сверяется с БД одним атомарным RPC
+"""
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Optional, Iterable, List
+from config import config
+from database.models import reserve_rbtc_budget, record_rbtc_emission
+
+logger = logging.getLogger(__name__)
+
+# Все суммы внутри движка - целые сотые RBTC (как NUMERIC(10,2) в БД)
+_CENTS = 100
+
+
+def _to_cents(amount: float) -> int:
+    return max(0, int(round(amount * _CENTS)))
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class RBTCEmissionEngine:
+    """Локальный аккумулятор эмиссии с резервированием дневного бюджета"""
+
+    def __init__(self, daily_budget: float, lease_size: float, reconcile_interval: float = 30.0):
+        """
+        Args:
+            daily_budget: глобальный бюджет RBTC на сутки (UTC)
+            lease_size: сколько бюджета процесс резервирует за один запрос к БД
+            reconcile_interval: период сверки эмиссии с БД (секунды)
+        """
+        self.daily_budget = daily_budget
+        self.lease_size = lease_size
+        self.reconcile_interval = reconcile_interval
+
+        self._day = _today()
+        self._lease = 0             # остаток резерва процесса
+        self._unreconciled = 0      # выдано, но еще не записано в БД (< 0 - возвраты уже записанного)
+        self._allocated = 0         # выдано за сутки - предел возвратов
+        self._db_emitted = 0        # эмиссия за день по данным последней сверки
+        self._exhausted = False     # бюджет дня исчерпан - в БД больше не ходим
+
+        self._refill_lock = asyncio.Lock()
+        self._reconcile_lock = asyncio.Lock()
+        self._rollover_lock = asyncio.Lock()
+
+        self.stats = {
+            'allocations': 0,
+            'leases': 0,
+            'reconciles': 0,
+            'denied': 0
+        }
+
+    async def _rollover(self):
+        """Смена суток: закрываем прошлый день и начинаем с нуля"""
+        if self._day == _today():
+            return
+
+        async with self._rollover_lock:
+            if self._day == _today():
+                return
+
+            if await self.reconcile(release_lease=True) is None:
+                # Прошлый день не сверен: остаемся в нем, иначе его эмиссия уйдет в новые сутки
+                logger.warning(f"💠 Эмиссия RBTC за {self._day} не сверена - смена суток отложена")
+                return
+
+            self._day = _today()
+            self._lease = 0
+            self._allocated = 0
+            self._db_emitted = 0
+            self._exhausted = False
+            logger.info(f"💠 Новые сутки эмиссии RBTC: {self._day}")
+
+    async def _refill(self, needed: int):
+        """Берет новый резерв из глобального бюджета (одна блокировка строки в БД)"""
+        async with self._refill_lock:
+            if self._lease >= needed or self._exhausted:
+                return
+
+            request = max(_to_cents(self.lease_size), needed - self._lease)
+            granted = _to_cents(await reserve_rbtc_budget(self._day, request / _CENTS, self.daily_budget))
+
+            self.stats['leases'] += 1
+            self._lease += granted
+
+            if granted < request:
+                self._exhausted = True
+                logger.warning(f"💠 Дневной бюджет RBTC исчерпан ({self._day})")
+
+    async def allocate(self, amount: float) -> float:
+        """
+        Выдает RBTC из бюджета
+
+        Returns:
+            float: выданная сумма (может быть меньше запрошенной или 0)
+        """
+        await self._rollover()
+
+        cents = _to_cents(amount)
+        if cents == 0:
+            return 0.0
+
+        if self._lease < cents and not self._exhausted:
+            await self._refill(cents)
+
+        granted = min(cents, self._lease)
+        self._lease -= granted
+        self._unreconciled += granted
+        self._allocated += granted
+
+        self.stats['allocations'] += 1
+        if granted < cents:
+            self.stats['denied'] += 1
+
+        return granted / _CENTS
+
+    async def allocate_many(self, amounts: Iterable[float]) -> List[float]:
+        """Выдача для пачки событий (в порядке следования) с одним резервом на всю пачку"""
+        await self._rollover()
+
+        wanted = [_to_cents(amount) for amount in amounts]
+        total = sum(wanted)
+
+        if self._lease < total and not self._exhausted:
+            await self._refill(total)
+
+        granted = []
+        for cents in wanted:
+            part = min(cents, self._lease)
+            self._lease -= part
+            self._unreconciled += part
+            self._allocated += part
+            granted.append(part / _CENTS)
+
+        self.stats['allocations'] += len(wanted)
+        self.stats['denied'] += sum(1 for cents, part in zip(wanted, granted) if _to_cents(part) < cents)
+        return granted
+
+    def refund(self, amount: float):
+        """
+        Возвращает в резерв RBTC, который так и не был начислен
+        Если выдача уже записана сверкой, _unreconciled уходит в минус и
+        следующая сверка уменьшит эмиссию дня в БД
+        """
+        cents = min(_to_cents(amount), self._allocated)
+        self._allocated -= cents
+        self._unreconciled -= cents
+        self._lease += cents
+
+    async def reconcile(self, release_lease: bool = False) -> Optional[float]:
+        """
+        Записывает накопленную эмиссию в БД одним RPC
+        Сверка без новой эмиссии тоже идет в БД: общую эмиссию дня выдают
+        и другие процессы, а daily_emitted показывается игрокам
+
+        Args:
+            release_lease: вернуть неиспользованный резерв в глобальный бюджет
+        """
+        async with self._reconcile_lock:
+            emitted = self._unreconciled
+            released = self._lease if release_lease else 0
+
+            total = await record_rbtc_emission(self._day, emitted / _CENTS, released / _CENTS)
+            if total is None:
+                # БД недоступна - суммы останутся до следующей сверки
+                return None
+
+            self._unreconciled -= emitted
+            self._lease -= released
+            self._db_emitted = _to_cents(total)
+            self.stats['reconciles'] += 1
+            return self.daily_emitted()
+
+    def daily_emitted(self) -> float:
+        """Эмиссия за текущие сутки (O(1), без обращения к БД; общая - по последней сверке)"""
+        return max(self._db_emitted + self._unreconciled, 0) / _CENTS
+
+    def lease_remaining(self) -> float:
+        """Остаток локального резерва процесса"""
+        return self._lease / _CENTS
+
+    async def run(self):
+        """Фоновая задача периодической сверки (первая - сразу: общая эмиссия дня для daily_emitted)"""
+        while True:
+            try:
+                await self._rollover()
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка сверки эмиссии RBTC: {e}")
+            await asyncio.sleep(self.reconcile_interval)
+
+    async def close(self):
+        """Финальная сверка с возвратом резерва (при остановке процесса)"""
+        await self.reconcile(release_lease=True)
+
+
+# Глобальный экземпляр
+rbtc_emission = RBTCEmissionEngine(
+    daily_budget=config.game.rbtc_daily_budget,
+    lease_size=config.game.rbtc_lease_size
+)
@@ -0,0 +1,165 @@
+"""
+Реферальная система Ryabot Island
+Разбор deep-link ссылок и пакетная выплата бонусов по цепочке приглашений
+"""
+import asyncio
+import logging
+from typing import Optional, Dict
+from config import config
+from database.models import pay_referral_rewards, get_pending_referrals
+
+logger = logging.getLogger(__name__)
+
+# Префикс payload в ссылке t.me/<bot>?start=ref_<user_id>
+REFERRAL_PREFIX = "ref_"
+
+
+def build_referral_payload(user_id: int) -> str:
+    """Payload для deep-link ссылки приглашения"""
+    return f"{REFERRAL_PREFIX}{user_id}"
+
+
+def build_referral_link(bot_username: str, user_id: int) -> str:
+    """Полная ссылка приглашения"""
+    return f"https://t.me/{bot_username}?start={build_referral_payload(user_id)}"
+
+
+def parse_referral_payload(args: Optional[str]) -> Optional[int]:
+    """
+    Извлекает ID пригласившего из аргумента /start
+
+    Args:
+        args: аргумент команды ("ref_123456" или "123456")
+
+    Returns:
+        int: ID пригласившего или None, если payload не реферальный
+    """
+    if not args:
+        return None
+
+    payload = args.strip()
+    if payload.startswith(REFERRAL_PREFIX):
+        payload = payload[len(REFERRAL_PREFIX):]
+
+    if not payload.isdigit():
+        return None
+
+    referrer_id = int(payload)
+    return referrer_id if referrer_id > 0 else None
+
+
+class ReferralRewardBatcher:
+    """
+    Копит новых приглашенных игроков и выплачивает бонусы пачкой
+    Волна регистраций превращается в один RPC вызов вместо запросов на каждого.
+    Пачка, которую не удалось выплатить, возвращается в очередь; пропавшие при
+    остановке процесса выплаты досыпает sweep по rewarded_at IS NULL
+    """
+
+    def __init__(self, flush_interval: float = 1.0, max_batch: int = 500,
+                 retry_interval: float = 30.0, sweep_age: float = 300.0):
+        """
+        Args:
+            flush_interval: максимальная задержка выплаты (секунды)
+            max_batch: размер пачки, при котором выплата идет сразу
+            retry_interval: пауза перед повтором неудавшейся выплаты (секунды)
+            sweep_age: sweep выплачивает приглашения старше (секунды)
+        """
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.retry_interval = retry_interval
+        self.sweep_age = sweep_age
+
+        self._pending: set[int] = set()
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+        self.stats = {
+            'queued': 0,
+            'flushes': 0,
+            'failed_flushes': 0,
+            'swept': 0,
+            'credited_users': 0,
+            'credited_ryabucks': 0
+        }
+
+    async def add(self, referred_id: int):
+        """Ставит нового игрока в очередь на выплату бонусов"""
+        self._pending.add(referred_id)
+        self.stats['queued'] += 1
+
+        if len(self._pending) >= self.max_batch:
+            await self.flush()
+        else:
+            self._schedule(self.flush_interval)
+
+    def _schedule(self, delay: float):
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(delay, lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self) -> Dict[int, int]:
+        """Выплачивает бонусы за всех накопленных игроков одним запросом"""
+        async with self._lock:
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+                self._flush_handle = None
+
+            if not self._pending:
+                return {}
+
+            batch = list(self._pending)
+            self._pending.clear()
+
+            credited = await pay_referral_rewards(batch, list(config.game.referral_rewards))
+            if credited is None:
+                # RPC не выполнен (ошибка, БД недоступна) - пачка ждет повтора
+                self._pending.update(batch)
+                self.stats['failed_flushes'] += 1
+                self._schedule(self.retry_interval)
+                logger.warning(f"⚠️ Реферальные бонусы не выплачены ({len(batch)} игроков), повтор "
+                               f"через {self.retry_interval:.0f} с")
+                return {}
+
+            self.stats['flushes'] += 1
+            self.stats['credited_users'] += len(credited)
+            self.stats['credited_ryabucks'] += sum(credited.values())
+
+            logger.info(
+                f"👥 Реферальные бонусы: {len(batch)} новых игроков, "
+                f"начислено {sum(credited.values())}💵 для {len(credited)} пригласивших"
+            )
+            return credited
+
+    async def sweep(self) -> int:
+        """Выплата бонусов за приглашения, оставшиеся без выплаты (сбой, перезапуск)"""
+        referred_ids = await get_pending_referrals(self.sweep_age, self.max_batch)
+        missed = [referred_id for referred_id in referred_ids if referred_id not in self._pending]
+        if not missed:
+            return 0
+
+        logger.info(f"👥 Досыпка реферальных бонусов: {len(missed)} приглашений без выплаты")
+        self._pending.update(missed)
+        self.stats['swept'] += len(missed)
+        await self.flush()
+        return len(missed)
+
+    def pending_count(self) -> int:
+        """Количество игроков, ожидающих выплаты"""
+        return len(self._pending)
+
+
+async def referral_sweep_loop(interval: float = 300.0):
+    """Фоновая досыпка невыплаченных реферальных бонусов"""
+    while True:
+        try:
+            await referral_batcher.sweep()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка досыпки реферальных бонусов: {e}")
+        await asyncio.sleep(interval)
+
+
+# Глобальный экземпляр
+referral_batcher = ReferralRewardBatcher()
@@ -16,7 +16,9 @@ from keyboards.academy import (
     get_profession_selection_menu, get_training_class_menu
 )
 from utils.texts import get_text, t
-from config import config
+from utils.callback_codec import CallbackPayload, HIRE_SLOT, HIRE_COOLDOWN, SLOT_HEADER, TRAIN
+from game.economy import pricing
+from utils.db_metrics import query_budget
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,6 +27,7 @@ router = Router()
 
 
 @router.callback_query(F.data == "academy")
+@query_budget(9)
 async def academy_main(callback: CallbackQuery):
     """Главное меню Академии с автоматическим завершением обучений"""
     try:
@@ -77,6 +80,7 @@ async def academy_main(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "labor_exchange")
+@query_budget(8)
 async def labor_exchange(callback: CallbackQuery):
     """Биржа труда с детальной информацией о найме"""
     try:
@@ -96,7 +100,7 @@ async def labor_exchange(callback: CallbackQuery):
 
         # Формируем статус найма
         if can_hire:
-            hire_cost = config.game.get_hire_cost(total_workers)
+            hire_cost = pricing.table.hire_cost(total_workers)
             status = await get_text("hire_status_ready", user_id, cost=hire_cost)
         elif reason == "cooldown":
             hours = remaining // 3600
@@ -127,22 +131,14 @@ async def labor_exchange(callback: CallbackQuery):
         await callback.message.edit_text("⚠️ Ошибка биржи труда. Попробуйте позже.")
 
 
-@router.callback_query(F.data.startswith("hire_slot_"))
-async def hire_slot(callback: CallbackQuery):
+@router.callback_query(HIRE_SLOT.filter())
+@query_budget(15)
+async def hire_slot(callback: CallbackQuery, payload: CallbackPayload):
     """Обработка найма рабочего с детальной обратной связью"""
     try:
         user_id = callback.from_user.id
-        slot_data = callback.data.split("_")
 
-        # Извлекаем информацию о слоте
-        if len(slot_data) >= 3:
-            slot_type = slot_data[2]  # free, business, quantum
-            slot_index = slot_data[3] if len(slot_data) > 3 else "0"
-        else:
-            slot_type = "free"
-            slot_index = "0"
-
-        logger.info(f"Попытка найма пользователем {user_id}, слот {slot_type}_{slot_index}")
+        logger.info(f"Попытка найма пользователем {user_id}, слот {payload.tier}_{payload.slot}")
 
         # Выполняем найм
         success, message = await hire_worker(user_id)
@@ -166,6 +162,7 @@ async def hire_slot(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "expert_courses")
+@query_budget(7)
 async def expert_courses(callback: CallbackQuery):
     """Экспертные курсы с проверкой доступности"""
     try:
@@ -201,12 +198,13 @@ async def expert_courses(callback: CallbackQuery):
         await callback.message.edit_text("⚠️ Ошибка экспертных курсов. Попробуйте позже.")
 
 
-@router.callback_query(F.data.startswith("train_"))
-async def train_profession(callback: CallbackQuery):
+@router.callback_query(TRAIN.filter())
+@query_budget(15)
+async def train_profession(callback: CallbackQuery, payload: CallbackPayload):
     """Обработка начала обучения профессии"""
     try:
         user_id = callback.from_user.id
-        profession = callback.data.split("_")[1]
+        profession = payload.profession
 
         logger.info(f"Запуск обучения {profession} для пользователя {user_id}")
 
@@ -231,6 +229,7 @@ async def train_profession(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "training_class")
+@query_budget(7)
 async def training_class(callback: CallbackQuery):
     """Учебный класс с активными обучениями"""
     try:
@@ -325,7 +324,7 @@ async def info_handlers(callback: CallbackQuery):
 
 
 # Обработчики кулдаунов слотов
-@router.callback_query(F.data.startswith("cooldown_"))
+@router.callback_query(HIRE_COOLDOWN.filter())
 async def cooldown_handlers(callback: CallbackQuery):
     """Обработка кликов по слотам на кулдауне"""
     try:
@@ -356,12 +355,11 @@ async def premium_handlers(callback: CallbackQuery):
 
 
 # Обработчики заголовков слотов (для информации)
-@router.callback_query(F.data.startswith("slot_header_"))
-async def slot_header_handlers(callback: CallbackQuery):
+@router.callback_query(SLOT_HEADER.filter())
+async def slot_header_handlers(callback: CallbackQuery, payload: CallbackPayload):
     """Информация о конкретных слотах"""
     try:
-        slot_num = callback.data.split("_")[-1]
-        message = f"📋 Информация о слоте #{slot_num}"
+        message = f"📋 Информация о слоте #{payload.slot}"
         await callback.answer(message, show_alert=True)
     except Exception as e:
         logger.error(f"Ошибка slot_header_handlers: {e}")
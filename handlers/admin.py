@@ -3,11 +3,14 @@
 Полная поддержка Supabase архитектуры
 """
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, BufferedInputFile
+from aiogram.filters import Command, CommandObject
 from database.models import get_user, get_island_stats
 from utils.message_helper import send_formatted
 from config import config
+from game.economy import pricing
+from utils.loop_watchdog import loop_watchdog
+from utils.profiler import profiler
 import logging
 
 logger = logging.getLogger(__name__)
@@ -67,6 +70,9 @@ async def admin_command(message: Message):
 
 📋 Доступные команды:
 • /stats - Статистика бота
+• /reload_prices [db] - Перезагрузка цен (файл или БД)
+• /slow [reset] - Места, блокирующие event loop
+• /profile [доля|off|dump|reset] - Профилирование обработчиков
 • /broadcast - Рассылка (в разработке)
 • /maintenance - Режим обслуживания (в разработке)
 
@@ -74,6 +80,104 @@ async def admin_command(message: Message):
     """, parse_mode="Markdown")
 
 
+@router.message(Command("reload_prices"))
+async def reload_prices_command(message: Message, command: CommandObject):
+    """
+    Горячая перезагрузка таблицы цен: /reload_prices - из файла, /reload_prices db - из БД
+    (версия публикуется в БД, остальные воркеры перечитают цены в течение PRICES_DB_POLL)
+    """
+    if not is_admin(message.from_user.id):
+        return
+
+    try:
+        if (command.args or "").strip().lower() == "db":
+            table = await pricing.reload_from_db(publish=True)
+        else:
+            table = pricing.reload_from_file()
+
+        await message.answer(
+            f"✅ Цены перезагружены\n"
+            f"📦 Версия: {table.version}\n"
+            f"🔗 Источник: {table.source}"
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка перезагрузки цен: {e}")
+        await message.answer(f"❌ Ошибка перезагрузки цен: {e}")
+
+
+@router.message(Command("slow"))
+async def slow_command(message: Message, command: CommandObject):
+    """Топ мест, блокировавших event loop: /slow - отчет, /slow reset - сброс"""
+    if not is_admin(message.from_user.id):
+        return
+
+    if (command.args or "").strip().lower() == "reset":
+        loop_watchdog.reset()
+        await message.answer("✅ Статистика блокировок сброшена")
+        return
+
+    top = loop_watchdog.top(5)
+    if not top:
+        await message.answer(f"✅ Блокировок event loop дольше {loop_watchdog.threshold * 1000:.0f} мс не было")
+        return
+
+    lines = [f"🐢 Блокировки event loop (порог {loop_watchdog.threshold * 1000:.0f} мс)", ""]
+    for spot in top:
+        lines.append(f"📍 {spot['location']}")
+        lines.append(f"   x{spot['count']}, всего {spot['total_ms']:.0f} мс, макс {spot['max_ms']:.0f} мс")
+        if spot['last_update']:
+            lines.append(f"   {spot['last_update']}")
+
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command("profile"))
+async def profile_command(message: Message, command: CommandObject):
+    """
+    Выборочное профилирование: /profile - отчет, /profile 0.05 - профилировать 5% апдейтов,
+    /profile off - выключить, /profile dump - collapsed stacks файлом, /profile reset - сброс
+    """
+    if not is_admin(message.from_user.id):
+        return
+
+    args = (command.args or "").strip().lower()
+
+    if args == "dump":
+        collapsed = profiler.collapsed()
+        if not collapsed:
+            await message.answer("📭 Замеров пока нет")
+            return
+        await message.answer_document(
+            BufferedInputFile(collapsed.encode(), filename="ryabot.collapsed"),
+            caption=f"🔥 {profiler.sampled} апдейтов. Открыть: flamegraph.pl или speedscope.app"
+        )
+        return
+
+    if args == "reset":
+        profiler.reset()
+        await message.answer("✅ Замеры профилирования сброшены")
+        return
+
+    if args:
+        try:
+            rate = 0.0 if args == "off" else float(args)
+        except ValueError:
+            await message.answer("❌ Использование: /profile [0.05|off|dump|reset]")
+            return
+        profiler.sample_rate = min(max(rate, 0.0), 1.0)
+        await message.answer(f"🔬 Доля профилируемых апдейтов: {profiler.sample_rate:.2%}")
+        return
+
+    lines = [f"🔬 Профилирование: {profiler.sample_rate:.2%} апдейтов, замерено {profiler.sampled}", ""]
+    for step in profiler.top(10):
+        lines.append(f"• {step['step']}")
+        lines.append(f"   x{step['count']}, своё {step['avg_self_wall_ms']:.2f} мс "
+                     f"(cpu {step['avg_self_cpu_ms']:.2f}), всего {step['avg_wall_ms']:.2f} мс")
+
+    await message.answer("\n".join(lines))
+
+
 @router.message(Command("version"))
 async def version_command(message: Message):
     """Версия бота"""
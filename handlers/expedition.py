@@ -0,0 +1,82 @@
+"""
+Обработчик экспедиций Ryabot Island
+Экран выбора зоны и отправка экспедиции (исход считает game.expedition)
+"""
+from datetime import datetime
+from aiogram import Router, F
+from aiogram.types import CallbackQuery
+from utils.message_helper import send_formatted
+from utils.callback_codec import CallbackPayload, START_EXPEDITION
+from database.models import get_active_expeditions
+from game.expedition import ZONES, MAX_ACTIVE_EXPEDITIONS, expedition_price, start_expedition
+from keyboards.expedition import get_expeditions_menu
+from utils.db_metrics import query_budget
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+
+def _time_left(ends_at: str) -> str:
+    """Сколько осталось до возвращения экспедиции"""
+    try:
+        seconds = (datetime.fromisoformat(ends_at).replace(tzinfo=None) - datetime.now()).total_seconds()
+    except (TypeError, ValueError):
+        return "скоро"
+    if seconds <= 0:
+        return "возвращается"
+    hours, minutes = divmod(int(seconds) // 60, 60)
+    return f"{hours}ч {minutes}м" if hours else f"{minutes}м"
+
+
+@router.callback_query(F.data == "expeditions")
+@query_budget(3)
+async def expeditions_menu(callback: CallbackQuery):
+    """Экран экспедиций: активные экспедиции и зоны для отправки"""
+    try:
+        await callback.answer()
+
+        active = await get_active_expeditions(callback.from_user.id)
+        prices = {zone_id: expedition_price(zone_id) for zone_id in ZONES}
+
+        lines = ["🗺️ **Экспедиции**", ""]
+        if active:
+            for expedition in active:
+                zone = ZONES.get(expedition.get('zone_id'), {'name': '❓ Неизвестная зона'})
+                lines.append(f"⏳ {zone['name']} - {_time_left(expedition.get('ends_at'))}")
+        else:
+            lines.append("Выберите зону - чем дальше, тем богаче находки и выше риск:")
+            lines.append("")
+            for zone_id, zone in ZONES.items():
+                lines.append(
+                    f"{zone['name']}: {zone['duration_hours']:g}ч, успех {zone['success_chance']:.0%}, "
+                    f"снаряжение {prices[zone_id]} 💵"
+                )
+
+        await send_formatted(
+            callback,
+            "\n".join(lines),
+            reply_markup=get_expeditions_menu(ZONES, prices, len(active) < MAX_ACTIVE_EXPEDITIONS),
+            edit=True
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в expeditions_menu для пользователя {callback.from_user.id}: {e}")
+        await callback.message.edit_text("⚠️ Ошибка экрана экспедиций. Попробуйте позже.")
+
+
+@router.callback_query(START_EXPEDITION.filter())
+@query_budget(7)
+async def send_expedition(callback: CallbackQuery, payload: CallbackPayload):
+    """Отправка экспедиции в выбранную зону"""
+    try:
+        success, message = await start_expedition(callback.from_user.id, payload.zone)
+        await callback.answer(message, show_alert=True)
+
+        if success:
+            await expeditions_menu(callback)
+
+    except Exception as e:
+        logger.error(f"Ошибка send_expedition для пользователя {callback.from_user.id}: {e}")
+        await callback.answer("⚠️ Произошла ошибка при отправке экспедиции. Попробуйте позже.", show_alert=True)
@@ -1,14 +1,61 @@
-
-from aiogram import Router
+"""
+Обработчик фермы
+"""
+from aiogram import Router, F
+from aiogram.types import Message
 from utils.message_helper import send_formatted
-from database.models import get_user, create_user, update_user_resources, get_island_stats
+from database.models import get_user, get_farm_buildings
+from game.buildings import production_engine
+from utils.texts import t
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = Router()
 
-# Добавьте обработчики здесь
+# Подписи ресурсов для экрана фермы
+RESOURCE_LABELS = {
+    'eggs': '🥚 Яйца',
+    'energy': '⚡ Энергия',
+    'milk': '🥛 Молоко',
+    'grain': '🌾 Зерно',
+    'vegetables': '🍅 Овощи',
+}
 
-logger.info("✅ [Farm] handler загружен (Supabase версия)")
 
+@router.message(F.text == "🏠 Ферма")
+async def farm_handler(message: Message):
+    """Экран фермы с накопленным производством всех построек"""
+    try:
+        user_id = message.from_user.id
+        user = await get_user(user_id)
+
+        if not user:
+            await message.answer("⚠️ Сначала зарегистрируйтесь, нажав /start")
+            return
+
+        buildings = await get_farm_buildings(user_id)
+        if not buildings:
+            await send_formatted(message, t("farm_empty", user.language))
+            return
+
+        # Один векторный проход по всем постройкам игрока
+        totals = production_engine.compute_rows(buildings).totals()
+        production = "\n".join(
+            f"• {RESOURCE_LABELS.get(resource, resource)}: {int(amount)}"
+            for resource, amount in totals.items()
+        ) or "• Пока ничего"
+
+        farm_text = t(
+            "farm_welcome", user.language,
+            buildings=len(buildings),
+            production=production
+        )
+        await send_formatted(message, farm_text)
+
+    except Exception as e:
+        logger.error(f"Ошибка фермы для пользователя {message.from_user.id}: {e}")
+        await message.answer("⚠️ Ошибка загрузки фермы. Попробуйте позже.", parse_mode=None)
+
+
+logger.info("✅ [Farm] handler загружен (Supabase версия)")
@@ -1,12 +1,52 @@
-from aiogram import Router
+"""
+Обработчик раздела "Друзья" (реферальная система)
+"""
+from aiogram import Router, F
+from aiogram.types import Message
 from utils.message_helper import send_formatted
-from database.models import get_user, create_user, update_user_resources, get_island_stats
+from database.models import get_user, get_referral_summary
+from game.referrals import build_referral_link
+from utils.texts import t
+from config import config
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = Router()
 
-# Добавьте обработчики здесь
+
+@router.message(F.text == "👥 Друзья")
+async def referral_menu(message: Message):
+    """Реферальная ссылка и статистика приглашений"""
+    try:
+        user_id = message.from_user.id
+        user = await get_user(user_id)
+
+        if not user:
+            await message.answer("⚠️ Сначала зарегистрируйтесь, нажав /start")
+            return
+
+        bot_info = await message.bot.me()
+        summary = await get_referral_summary(user_id)
+
+        rewards = "\n".join(
+            f"• Уровень {level}: {amount}💵"
+            for level, amount in enumerate(config.game.referral_rewards, 1)
+        )
+
+        referral_text = t(
+            "referral_menu", user.language,
+            link=build_referral_link(bot_info.username, user_id),
+            invited=summary['invited'],
+            earned=summary['earned'],
+            rewards=rewards
+        )
+
+        await send_formatted(message, referral_text)
+
+    except Exception as e:
+        logger.error(f"Ошибка раздела друзей для пользователя {message.from_user.id}: {e}")
+        await message.answer("⚠️ Ошибка загрузки раздела. Попробуйте позже.", parse_mode=None)
+
 
 logger.info("✅ [Referral] handler загружен (Supabase версия)")
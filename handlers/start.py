@@ -4,13 +4,16 @@
 """
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from utils.message_helper import send_formatted
 from database.models import (
     get_user, create_user, update_user_language,
-    clear_user_state, complete_tutorial, get_island_stats
+    clear_user_state, complete_tutorial, get_island_stats,
+    register_referral
 )
+from game.referrals import parse_referral_payload, referral_batcher
+from game.rbtc import rbtc_emission
 from keyboards.main_menu import get_start_menu, get_island_menu, get_tutorial_keyboard
 from utils.texts import get_text, t
 from utils.states import MenuState, TutorialState
@@ -22,10 +25,11 @@ router = Router()
 
 
 @router.message(Command("start"))
-async def start_handler(message: Message, state: FSMContext):
+async def start_handler(message: Message, state: FSMContext, command: CommandObject = None):
     """
     Главный обработчик команды /start
     Определяет новый или существующий пользователь
+    Поддерживает реферальные ссылки вида /start ref_<user_id>
     """
     user_id = message.from_user.id
     username = message.from_user.username
@@ -35,6 +39,11 @@ async def start_handler(message: Message, state: FSMContext):
         user = await get_user(user_id)
 
         if not user:
+            # Запоминаем пригласившего до создания профиля (после выбора языка)
+            referrer_id = parse_referral_payload(command.args if command else None)
+            if referrer_id and referrer_id != user_id:
+                await state.update_data(referrer_id=referrer_id)
+
             # Новый пользователь: предложить выбор языка
             await handle_new_user(message, state)
             return
@@ -73,7 +82,7 @@ async def send_main_menu(message: Message, user, state: FSMContext):
         welcome_text = await get_text(
             'welcome_to_game', user.user_id,
             online_players=stats.get('online_players', 12),
-            daily_rbtc=f"{stats.get('daily_rbtc', 15.67):.2f}",
+            daily_rbtc=f"{stats.get('daily_rbtc', 0):.2f}",
             active_expeditions=stats.get('active_expeditions', 8)
         )
 
@@ -85,7 +94,7 @@ async def send_main_menu(message: Message, user, state: FSMContext):
         logger.error(f"Ошибка отправки главного меню для пользователя {user.user_id}: {e}")
         # Fallback без статистики
         welcome_text = t('welcome_to_game', user.language,
-                         online_players=12, daily_rbtc="15.67", active_expeditions=8,
+                         online_players=12, daily_rbtc=f"{rbtc_emission.daily_emitted():.2f}", active_expeditions=8,
                          default="🏝️ Добро пожаловать на Ryabot Island!")
         keyboard = get_start_menu(user.language)
         await send_formatted(message, welcome_text, reply_markup=keyboard)
@@ -105,7 +114,9 @@ async def language_selected(callback: CallbackQuery, state: FSMContext):
 
         # ИСПРАВЛЕНИЕ: правильные данные для создания пользователя
         user = await create_user(user_id, username)
-        if not user:
+        if user:
+            await attach_referral(user_id, state)
+        else:
             logger.error(f"Не удалось создать пользователя {user_id}")
             # Попробуем получить существующего пользователя
             user = await get_user(user_id)
@@ -140,6 +151,22 @@ async def language_selected(callback: CallbackQuery, state: FSMContext):
         )
 
 
+async def attach_referral(user_id: int, state: FSMContext):
+    """Привязывает нового игрока к пригласившему и ставит бонусы в очередь"""
+    try:
+        state_data = await state.get_data()
+        referrer_id = state_data.get("referrer_id")
+        if not referrer_id:
+            return
+
+        if await register_referral(referrer_id, user_id):
+            await referral_batcher.add(user_id)
+            logger.info(f"👥 Пользователь {user_id} приглашен игроком {referrer_id}")
+
+    except Exception as e:
+        logger.error(f"Ошибка привязки реферала для пользователя {user_id}: {e}")
+
+
 @router.message(F.text == "🏝️ Войти на остров")
 async def enter_island(message: Message, state: FSMContext):
     """Обработчик входа на остров"""
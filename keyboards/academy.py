@@ -2,6 +2,7 @@
 Клавиатуры для системы Академии
 """
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from utils.callback_codec import HIRE_SLOT, HIRE_COOLDOWN, SLOT_HEADER, TRAIN
 
 
 def get_academy_menu() -> InlineKeyboardMarkup:
@@ -20,11 +21,10 @@ def get_labor_exchange_menu(can_hire: bool, hired_count: int) -> InlineKeyboardM
     buttons = []
 
     # Заголовки столбцов (слева направо)
-    header_row = [
-        InlineKeyboardButton(text="📋", callback_data="info_header"),  # Заголовок
-        InlineKeyboardButton(text="Слот 1", callback_data="slot_header_1"),
-        InlineKeyboardButton(text="Слот 2", callback_data="slot_header_2"),
-        InlineKeyboardButton(text="Слот 3", callback_data="slot_header_3")
+    header_row = [InlineKeyboardButton(text="📋", callback_data="info_header")]  # Заголовок
+    header_row += [
+        InlineKeyboardButton(text=f"Слот {slot}", callback_data=SLOT_HEADER.pack(slot=slot))
+        for slot in range(1, 4)
     ]
     buttons.append(header_row)
 
@@ -33,28 +33,36 @@ def get_labor_exchange_menu(can_hire: bool, hired_count: int) -> InlineKeyboardM
     for i in range(3):
         if i < hired_count and hired_count <= 3:
             # Слот на кулдауне
-            free_row.append(InlineKeyboardButton(text="⏳", callback_data=f"cooldown_free_{i}"))
+            free_row.append(InlineKeyboardButton(text="⏳", callback_data=HIRE_COOLDOWN.pack(tier="free", slot=i)))
         else:
             # Свободный слот
-            free_row.append(InlineKeyboardButton(text="🙍‍♂️", callback_data=f"hire_slot_free_{i}"))
+            free_row.append(InlineKeyboardButton(text="🙍‍♂️", callback_data=HIRE_SLOT.pack(tier="free", slot=i)))
     buttons.append(free_row)
 
     # Строка 2: Слоты бизнес-лицензии (3 шт)
     business_row = [InlineKeyboardButton(text="📜", callback_data="info_business_slots")]
     for i in range(3, 6):
         if i < hired_count and 3 < hired_count <= 6:
-            business_row.append(InlineKeyboardButton(text="⏳", callback_data=f"cooldown_business_{i}"))
+            business_row.append(InlineKeyboardButton(
+                text="⏳", callback_data=HIRE_COOLDOWN.pack(tier="business", slot=i)
+            ))
         else:
-            business_row.append(InlineKeyboardButton(text="🙍‍♂️", callback_data=f"hire_slot_business_{i}"))
+            business_row.append(InlineKeyboardButton(
+                text="🙍‍♂️", callback_data=HIRE_SLOT.pack(tier="business", slot=i)
+            ))
     buttons.append(business_row)
 
     # Строка 3: Слоты Quantum-Pass (3 шт)
     quantum_row = [InlineKeyboardButton(text="🪪", callback_data="info_quantum_slots")]
     for i in range(6, 9):
         if i < hired_count and hired_count > 6:
-            quantum_row.append(InlineKeyboardButton(text="⏳", callback_data=f"cooldown_quantum_{i}"))
+            quantum_row.append(InlineKeyboardButton(
+                text="⏳", callback_data=HIRE_COOLDOWN.pack(tier="quantum", slot=i)
+            ))
         else:
-            quantum_row.append(InlineKeyboardButton(text="🙍‍♂️", callback_data=f"hire_slot_quantum_{i}"))
+            quantum_row.append(InlineKeyboardButton(
+                text="🙍‍♂️", callback_data=HIRE_SLOT.pack(tier="quantum", slot=i)
+            ))
     buttons.append(quantum_row)
 
     # Кнопка ускорения и назад
@@ -70,21 +78,21 @@ def get_profession_selection_menu() -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         # Ряд 1: Основные профессии
         [
-            InlineKeyboardButton(text="👷 Строитель", callback_data="train_builder"),
-            InlineKeyboardButton(text="👨‍🌾 Фермер", callback_data="train_farmer"),
-            InlineKeyboardButton(text="🧑‍🚒 Лесник", callback_data="train_woodman")
+            InlineKeyboardButton(text="👷 Строитель", callback_data=TRAIN.pack(profession="builder")),
+            InlineKeyboardButton(text="👨‍🌾 Фермер", callback_data=TRAIN.pack(profession="farmer")),
+            InlineKeyboardButton(text="🧑‍🚒 Лесник", callback_data=TRAIN.pack(profession="woodman"))
         ],
         # Ряд 2: Боевые и добывающие
         [
-            InlineKeyboardButton(text="💂 Солдат", callback_data="train_soldier"),
-            InlineKeyboardButton(text="🎣 Рыбак", callback_data="train_fisherman"),
-            InlineKeyboardButton(text="👨‍🔬 Ученый", callback_data="train_scientist")
+            InlineKeyboardButton(text="💂 Солдат", callback_data=TRAIN.pack(profession="soldier")),
+            InlineKeyboardButton(text="🎣 Рыбак", callback_data=TRAIN.pack(profession="fisherman")),
+            InlineKeyboardButton(text="👨‍🔬 Ученый", callback_data=TRAIN.pack(profession="scientist"))
         ],
         # Ряд 3: Обслуживающие профессии
         [
-            InlineKeyboardButton(text="👨‍🍳 Повар", callback_data="train_cook"),
-            InlineKeyboardButton(text="👨‍🏫 Учитель", callback_data="train_teacher"),
-            InlineKeyboardButton(text="🧑‍⚕️ Доктор", callback_data="train_doctor")
+            InlineKeyboardButton(text="👨‍🍳 Повар", callback_data=TRAIN.pack(profession="cook")),
+            InlineKeyboardButton(text="👨‍🏫 Учитель", callback_data=TRAIN.pack(profession="teacher")),
+            InlineKeyboardButton(text="🧑‍⚕️ Доктор", callback_data=TRAIN.pack(profession="doctor"))
         ],
         # Назад
         [InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_academy")]
@@ -0,0 +1,23 @@
+"""
+Клавиатуры экспедиций
+"""
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from utils.callback_codec import START_EXPEDITION
+
+
+def get_expeditions_menu(zones: dict, prices: dict, can_start: bool) -> InlineKeyboardMarkup:
+    """Выбор зоны экспедиции (пока экспедиция в пути - только обновление экрана)"""
+    buttons = []
+    if can_start:
+        buttons += [
+            [InlineKeyboardButton(
+                text=f"{zone['name']} - {prices[zone_id]} 💵",
+                callback_data=START_EXPEDITION.pack(zone=zone_id)
+            )]
+            for zone_id, zone in zones.items()
+        ]
+    else:
+        buttons.append([InlineKeyboardButton(text="🔄 Обновить", callback_data="expeditions")])
+
+    buttons.append([InlineKeyboardButton(text="↩️ Назад", callback_data="town")])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
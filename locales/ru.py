@@ -206,6 +206,32 @@ TEXTS = {
 
 🏗️ Выберите здание для посещения:""",
 
+    # === ФЕРМА ===
+    "farm_welcome": """🏠 **Ваша ферма**
+
+🏗️ **Построек:** {buildings}
+
+🧺 **Готово к сбору:**
+{production}""",
+    "farm_empty": """🏠 **Ваша ферма**
+
+🌱 На ферме пока нет построек.
+
+💡 Постройте курятник или конюшню в Строй-Саме!""",
+
+    # === ДРУЗЬЯ (РЕФЕРАЛЫ) ===
+    "referral_menu": """👥 **Друзья**
+
+🔗 **Ваша ссылка для приглашения:**
+`{link}`
+
+📊 **Статистика:**
+• Приглашено друзей: {invited}
+• Заработано: {earned}💵
+
+🎁 **Бонусы за приглашение:**
+{rewards}""",
+
     # === ОШИБКИ И СИСТЕМНЫЕ СООБЩЕНИЯ ===
     "error_user_not_found": "❌ Пользователь не найден",
     "error_database": "❌ Ошибка базы данных",
@@ -223,34 +249,3 @@ TEXTS = {
     # === РЕСУРСЫ ===
     "user_resources": "⭐ Уровень: {level} | 🔋 {energy}/100 | 💵 {ryabucks} | 💠 {rbtc}",
 }
-
-# Игровые цены
-GAME_PRICES = {
-    'ryaba_price': 250,
-    'rooster_price': 500,
-    'rbtc_rate': 100.0,
-    'hire_cost': 30,
-    'stable_price': 1000,
-    'chick_price': 50,
-    'horse_price': 2000,
-    'cow_price': 1500,
-    'grain_seeds_price': 10,
-    'tomato_seeds_price': 15,
-    'cucumber_seeds_price': 12,
-    'henhouse_price': 500,
-    'cowshed_price': 2500,
-    'shard_rate': 50
-}
-
-# Профессии для академии
-PROFESSIONS = {
-    'builder': {'name': '👷 Строитель', 'cost': 100, 'time_hours': 2},
-    'farmer': {'name': '👨‍🌾 Фермер', 'cost': 100, 'time_hours': 2},
-    'woodman': {'name': '🧑‍🚒 Лесник', 'cost': 120, 'time_hours': 3},
-    'soldier': {'name': '💂 Солдат', 'cost': 150, 'time_hours': 4},
-    'fisherman': {'name': '🎣 Рыбак', 'cost': 110, 'time_hours': 2.5},
-    'scientist': {'name': '👨‍🔬 Ученый', 'cost': 200, 'time_hours': 6},
-    'cook': {'name': '👨‍🍳 Повар', 'cost': 130, 'time_hours': 3},
-    'teacher': {'name': '👨‍🏫 Учитель', 'cost': 180, 'time_hours': 5},
-    'doctor': {'name': '🧑‍⚕️ Доктор', 'cost': 220, 'time_hours': 8}
-}
@@ -6,7 +6,6 @@ import asyncio
 import logging
 import sys
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 import os
 from dotenv import load_dotenv
 
@@ -33,11 +32,17 @@ REQUIRED_ENV_VARS = {
 def check_environment():
     """Проверяет наличие всех необходимых переменных окружения"""
     missing_vars = []
+    backend = os.getenv("DB_BACKEND", "supabase").lower()
 
     for var, description in REQUIRED_ENV_VARS.items():
+        if backend in ("memory", "postgres") and var.startswith("SUPABASE_"):
+            continue
         if not os.getenv(var):
             missing_vars.append(f"{var} ({description})")
 
+    if backend == "postgres" and not os.getenv("DATABASE_URL"):
+        missing_vars.append("DATABASE_URL (DSN PostgreSQL для DB_BACKEND=postgres)")
+
     if missing_vars:
         logger.error("❌ Отсутствуют обязательные переменные окружения:")
         for var in missing_vars:
@@ -48,24 +53,24 @@ def check_environment():
         logger.error("   BOT_TOKEN=your-bot-token")
         sys.exit(1)
 
-async def init_supabase():
-    """Инициализация подключения к Supabase"""
+async def init_supabase(probe: bool = True):
+    """
+    Инициализация подключения к Supabase
+
+    Args:
+        probe: проверить подключение запросом (count по users); при запуске
+               проверка идет в фоне отдельным шагом probe_supabase
+    """
     logger.info("🔌 Инициализация Supabase...")
 
     try:
         from database.supabase_client import supabase_manager
 
-        # Инициализируем клиент
+        # Инициализируем клиент (без сетевых запросов)
         supabase_manager.initialize()
 
-        # Проверяем подключение простым запросом
-        test_result = await supabase_manager.execute_query(
-            table="users",
-            operation="count"
-        )
-
-        logger.info("✅ Supabase подключение работает")
-        logger.info(f"📊 Пользователей в БД: {test_result or 0}")
+        if probe and not await probe_supabase():
+            return False
 
         return True
 
@@ -77,14 +82,58 @@ async def init_supabase():
         logger.error("   3. Статус проекта в Supabase Dashboard")
         return False
 
+async def probe_supabase() -> bool:
+    """Проверка подключения простым запросом"""
+    from database.supabase_client import supabase_manager
+
+    test_result = await supabase_manager.execute_query(
+        table="users",
+        operation="count"
+    )
+    if test_result is None:
+        logger.error("❌ Supabase не ответил на тестовый запрос")
+        return False
+
+    logger.info("✅ Supabase подключение работает")
+    logger.info(f"📊 Пользователей в БД: {test_result or 0}")
+    return True
+
 async def setup_bot():
     """Настройка и создание бота с middleware"""
     bot = Bot(token=os.getenv("BOT_TOKEN"))
-    dp = Dispatcher(storage=MemoryStorage())
+    from utils.sharding import make_fsm_storage
+    dp = Dispatcher(storage=make_fsm_storage())
 
-    # Подключаем middleware для защиты от спама
+    # Учет апдейтов в обработке (для остановки без потерь) - самым внешним
+    from middlewares.lifecycle import InFlightMiddleware
+    dp.update.outer_middleware(InFlightMiddleware())
+
+    # Метрики и учет запросов к БД на апдейт - первыми, чтобы учитывались и остальные middleware
+    from middlewares.metrics import setup_metrics
+    from middlewares.db_accounting import DBAccountingMiddleware
     from middlewares.throttling import ThrottlingMiddleware
-    dp.callback_query.middleware(ThrottlingMiddleware(rate_limit=0.3))
+    throttling = ThrottlingMiddleware(rate_limit=0.3)
+    setup_metrics(dp, throttling)
+
+    # Контроль допуска: при перегрузке онбординг и транзакции раньше навигации
+    from middlewares.admission import admission
+    dp.update.outer_middleware(admission)
+
+    # callback_data разбирается один раз - обработчики получают payload
+    from utils.callback_codec import callback_codec_middleware
+    dp.callback_query.outer_middleware(callback_codec_middleware)
+
+    db_accounting = DBAccountingMiddleware()
+    dp.message.middleware(db_accounting)
+    dp.callback_query.middleware(db_accounting)
+
+    # При недоступности БД - последний экран игрока вместо ошибки
+    from middlewares.degraded_mode import degraded_mode
+    dp.message.middleware(degraded_mode)
+    dp.callback_query.middleware(degraded_mode)
+
+    # Подключаем middleware для защиты от спама
+    dp.callback_query.middleware(throttling)
 
     # В функции setup_bot() добавьте после throttling middleware:
 
@@ -99,41 +148,12 @@ async def setup_bot():
     logger.info("🔧 Подключение модулей...")
 
     try:
-        # Список модулей с проверкой наличия router
-        modules_to_load = [
-            ('handlers.start', 'start'),
-            ('handlers.academy', 'academy'),
-            ('handlers.town', 'town'),
-            ('handlers.farm', 'farm'),
-            ('handlers.work', 'work'),
-            ('handlers.citizen', 'citizen'),
-            ('handlers.storage', 'storage'),
-            ('handlers.rankings', 'rankings'),
-            ('handlers.referral', 'referral'),
-            ('handlers.about', 'about'),
-            ('handlers.admin', 'admin')
-        ]
-
-        loaded_count = 0
-        for module_path, module_name in modules_to_load:
-            try:
-                # Динамический импорт модуля
-                module = __import__(module_path, fromlist=['router'])
-
-                # Проверяем наличие router
-                if hasattr(module, 'router'):
-                    dp.include_router(module.router)
-                    logger.info(f"   ✅ {module_name.capitalize()} модуль")
-                    loaded_count += 1
-                else:
-                    logger.warning(f"   ⚠️ {module_name.capitalize()} модуль - router отсутствует")
-
-            except ImportError as e:
-                logger.warning(f"   ⚠️ {module_name.capitalize()} модуль - ошибка импорта: {e}")
-            except Exception as e:
-                logger.error(f"   ❌ {module_name.capitalize()} модуль - критическая ошибка: {e}")
-
-        logger.info(f"📦 Загружено модулей: {loaded_count}/{len(modules_to_load)}")
+        # Роутеры из utils.lazy_routers.HANDLER_MODULES; LAZY_ROUTERS=1 - импорт модуля на первом его апдейте
+        from utils.lazy_routers import include_handler_routers, log_import_report, HANDLER_MODULES
+
+        loaded_count = include_handler_routers(dp)
+        logger.info(f"📦 Загружено модулей: {loaded_count}/{len(HANDLER_MODULES)}")
+        log_import_report()
 
         if loaded_count == 0:
             raise Exception("Не загружен ни один модуль!")
@@ -142,6 +162,14 @@ async def setup_bot():
         logger.error(f"❌ Критическая ошибка загрузки модулей: {e}")
         raise
 
+    # Нажатия кнопок - по таблице callback_data, без перебора фильтров всех роутеров
+    from utils.callback_routing import setup_callback_routing
+    setup_callback_routing(dp)
+
+    # Профилирование оборачивает уже подключенные middleware - последним
+    from middlewares.profiling import setup_profiling
+    setup_profiling(dp)
+
     return bot, dp
 
 async def get_bot_info(bot):
@@ -172,6 +200,10 @@ async def get_game_statistics():
         logger.warning(f"⚠️ Не удалось получить статистику: {e}")
         return None
 
+# Типы апдейтов, которые получает бот (polling и доигрывание очереди)
+ALLOWED_UPDATES = ["message", "callback_query"]
+
+
 async def main():
     """Основная функция запуска бота"""
 
@@ -186,50 +218,75 @@ async def main():
     check_environment()
     logger.info("✅ Все переменные найдены")
 
-    # 2. Инициализация Supabase
-    logger.info("2️⃣ Подключение к Supabase...")
-    if not await init_supabase():
-        logger.error("❌ Не удалось подключиться к Supabase")
-        sys.exit(1)
+    # 2. Подключение к Supabase, создание бота, getMe и deleteWebhook - параллельно
+    # по зависимостям; проверка БД и игровая статистика - в фоне, не задерживая polling
+    logger.info("2️⃣ Подключение к Supabase и проверка бота...")
+    from utils.startup import StartupGraph, StartupError
+
+    timeout = float(os.getenv("STARTUP_TIMEOUT", "15"))
+    startup = StartupGraph()
+    startup.add("supabase", lambda: init_supabase(probe=False))
+    startup.add("bot", setup_bot)
+    startup.add("bot_info", lambda bot: get_bot_info(bot[0]), deps=("bot",), timeout=timeout)
+    # Очередь апдейтов за время перезапуска не сбрасывается - ее доигрывает utils.backlog
+    from utils.backlog import backlog
+    startup.add("webhook", lambda bot: bot[0].delete_webhook(drop_pending_updates=not backlog.enabled),
+                deps=("bot",), timeout=timeout)
+    startup.add("supabase_probe", lambda ready: probe_supabase(), deps=("supabase",), timeout=timeout,
+                background=True)
+    startup.add("statistics", lambda ready: get_game_statistics(), deps=("supabase",), timeout=timeout,
+                background=True)
 
-    # 3. Создание и настройка бота
-    logger.info("3️⃣ Создание бота...")
     try:
-        bot, dp = await setup_bot()
-    except Exception as e:
-        logger.error(f"❌ Ошибка создания бота: {e}")
+        results = await startup.run()
+    except StartupError as e:
+        logger.error(f"❌ Ошибка запуска: {e}")
         sys.exit(1)
 
-    # 4. Получение информации о боте
-    logger.info("4️⃣ Проверка бота...")
-    try:
-        await get_bot_info(bot)
-    except Exception as e:
-        logger.error(f"❌ Проблемы с ботом: {e}")
+    if not results["supabase"]:
+        logger.error("❌ Не удалось подключиться к Supabase")
+        startup.cancel()
         sys.exit(1)
 
-    # 5. Получение игровой статистики
-    logger.info("5️⃣ Загрузка игровой статистики...")
-    await get_game_statistics()
+    bot, dp = results["bot"]
 
-    # 6. Запуск бота
+    # 3. Запуск бота
     logger.info("=" * 60)
     logger.info("🚀 ЗАПУСК RYABOT ISLAND")
     logger.info("=" * 60)
 
-    try:
-        # Удаляем возможный webhook
-        await bot.delete_webhook(drop_pending_updates=True)
+    # Фоновые задачи: пакетное завершение экспедиций, досыпка реферальных бонусов, сверка эмиссии RBTC,
+    # слежение за файлом цен (если задан PRICES_FILE) и за опубликованной в БД версией цен, сторож event loop
+    from game.expedition import expedition_completion_loop
+    from game.referrals import referral_sweep_loop
+    from game.rbtc import rbtc_emission
+    from game.economy import pricing, PRICES_DB_POLL
+    from utils.loop_watchdog import loop_watchdog
+    from utils.lifecycle import lifecycle, register_default_flushers
+    loop_watchdog.start()
+    # Прием апдейтов останавливает сам aiogram (SIGINT/SIGTERM завершают start_polling)
+    register_default_flushers()
+    expedition_task = asyncio.create_task(expedition_completion_loop())
+    referral_task = asyncio.create_task(referral_sweep_loop())
+    emission_task = asyncio.create_task(rbtc_emission.run())
+    prices_task = asyncio.create_task(pricing.watch_file()) if pricing.prices_file else None
+    prices_db_task = asyncio.create_task(pricing.watch_db()) if PRICES_DB_POLL > 0 else None
+
+    # Апдейты, накопившиеся за время перезапуска: в фоне и с ограниченной скоростью
+    if backlog.enabled:
+        backlog.start(bot, dp, await backlog.fetch(bot, ALLOWED_UPDATES))
+        # Забранные апдейты Telegram уже не повторит: при остановке доигрываются до сброса буферов
+        lifecycle.add_flusher("накопившиеся апдейты", backlog.drain, first=True)
 
-        # Запускаем polling
+    try:
+        # Запускаем polling (webhook удален на шаге запуска)
         logger.info("🔄 Режим: Long Polling")
         logger.info("✨ Остров готов к приключениям!")
         logger.info("🛑 Для остановки используйте Ctrl+C")
 
         await dp.start_polling(
             bot,
-            drop_pending_updates=True,
-            allowed_updates=["message", "callback_query"]
+            allowed_updates=ALLOWED_UPDATES
         )
 
     except KeyboardInterrupt:
@@ -244,6 +301,19 @@ async def main():
         logger.info("🧹 ЗАВЕРШЕНИЕ РАБОТЫ")
         logger.info("=" * 60)
 
+        startup.cancel()
+        loop_watchdog.stop()
+        expedition_task.cancel()
+        referral_task.cancel()
+        emission_task.cancel()
+        if prices_task:
+            prices_task.cancel()
+        if prices_db_task:
+            prices_db_task.cancel()
+
+        # Дождаться апдейтов в обработке и сбросить буферы (отправки, рефералы, RBTC)
+        await lifecycle.shutdown()
+
         # Закрываем сессию бота
         try:
             await bot.session.close()
@@ -251,7 +321,13 @@ async def main():
         except Exception as e:
             logger.error(f"❌ Ошибка при закрытии бота: {e}")
 
-        logger.info("✅ Supabase соединения освобождены")
+        # Пул БД (DB_BACKEND=postgres) - последним: сброс буферов выше еще пишет в БД
+        try:
+            from database.models import close_connection_pool
+            await close_connection_pool()
+            logger.info("✅ Supabase соединения освобождены")
+        except Exception as e:
+            logger.error(f"❌ Ошибка при закрытии подключения к БД: {e}")
         logger.info("👋 Ryabot Island остановлен. До встречи!")
 
 def run():
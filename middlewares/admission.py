@@ -0,0 +1,218 @@
+"""
+Контроль допуска апдейтов Ryabot Island (load shedding по приоритетам)
+При перегрузке апдейты обрабатывались строго по очереди: поток нажатий
+"🏠 Ферма" задерживал найм, обучение и /start новых игроков. Middleware
+ограничивает число апдейтов в обработке, а лишние ставит в очереди по классам:
+
+    onboarding     - /start, вход на остров, язык, туториал
+    transactional  - найм, обучение, энергия, команды
+    navigation     - переходы по разделам
+    informational  - подсказки (info_*, заголовки и кулдауны слотов)
+
+Освободившийся слот получает самый важный класс. Навигация и подсказки,
+прождавшие дольше цели (ADMISSION_TARGET_MS), не обрабатываются: навигация
+получает сохраненный экран (middlewares.degraded_mode) или просьбу повторить,
+подсказка - пустой ответ на нажатие. Онбординг и транзакции не сбрасываются.
+
+Переменные окружения:
+    ADMISSION_CONCURRENCY - апдейтов в обработке одновременно (0 - без ограничения)
+    ADMISSION_TARGET_MS   - допустимое ожидание навигации и подсказок в очереди
+    ADMISSION_MAX_QUEUE   - очередь класса, сверх которой навигация и подсказки сбрасываются сразу
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from middlewares.degraded_mode import screen_key, serve_cached_screen
+from utils.callback_codec import callback_codec
+
+logger = logging.getLogger(__name__)
+
+ONBOARDING = 0
+TRANSACTIONAL = 1
+NAVIGATION = 2
+INFORMATIONAL = 3
+
+CLASS_NAMES = ("onboarding", "transactional", "navigation", "informational")
+
+# Классы, которые можно сбрасывать при перегрузке
+_SHEDDABLE = (NAVIGATION, INFORMATIONAL)
+
+OVERLOAD_BANNER = "⏳ Много игроков онлайн - показан сохраненный экран"
+OVERLOAD_TEXT = "⏳ Много игроков онлайн. Нажмите еще раз через пару секунд"
+
+_ONBOARDING_TEXTS = frozenset({"🏝️ Войти на остров"})
+_ONBOARDING_PREFIXES = ("tutorial_", "lang_")
+_TRANSACTIONAL_CALLBACKS = frozenset({"watch_ad", "claim_stable_energy", "skip_hire_cooldown", "boost_training"})
+_TRANSACTIONAL_PREFIXES = ("hire_slot_", "train_")
+_INFORMATIONAL_PREFIXES = ("info_", "slot_header_", "cooldown_")
+# Действия кнопок в компактном формате (utils.callback_codec)
+_TRANSACTIONAL_ACTIONS = frozenset({"hire_slot", "train", "start_expedition"})
+_INFORMATIONAL_ACTIONS = frozenset({"slot_header", "cooldown"})
+
+
+def classify(update: Update) -> int:
+    """Класс апдейта по тексту сообщения или данным кнопки"""
+    return classify_event(update.message if update.message is not None else update.callback_query)
+
+
+def classify_event(event: Optional[TelegramObject]) -> int:
+    """Класс сообщения или нажатия кнопки (для middleware уровня message / callback_query)"""
+    if isinstance(event, Message):
+        text = event.text or ""
+        if text.startswith("/start") or text in _ONBOARDING_TEXTS:
+            return ONBOARDING
+        if text.startswith("/"):
+            return TRANSACTIONAL
+        return NAVIGATION
+
+    if isinstance(event, CallbackQuery):
+        data = event.data or ""
+        action = callback_codec.action_name(data)
+        if action is not None:
+            if action in _TRANSACTIONAL_ACTIONS:
+                return TRANSACTIONAL
+            return INFORMATIONAL if action in _INFORMATIONAL_ACTIONS else NAVIGATION
+        if data.startswith(_ONBOARDING_PREFIXES):
+            return ONBOARDING
+        if data in _TRANSACTIONAL_CALLBACKS or data.startswith(_TRANSACTIONAL_PREFIXES):
+            return TRANSACTIONAL
+        if data.startswith(_INFORMATIONAL_PREFIXES):
+            return INFORMATIONAL
+        return NAVIGATION
+
+    # Служебные апдейты (my_chat_member и т.п.) - дешевые, не задерживаем
+    return TRANSACTIONAL
+
+
+class AdmissionMiddleware(BaseMiddleware):
+    """Внешний middleware dp.update: лимит апдейтов в обработке и приоритетные очереди"""
+
+    def __init__(self, max_concurrency: int = 200, target_ms: float = 1000.0, max_queue: int = 1000):
+        """
+        Args:
+            max_concurrency: апдейтов в обработке одновременно (0 - без ограничения)
+            target_ms: сколько навигация и подсказки могут ждать в очереди
+            max_queue: длина очереди класса, после которой сбрасываемые классы не встают в очередь
+        """
+        self.max_concurrency = max_concurrency
+        self.target_ms = target_ms
+        self.max_queue = max_queue
+
+        self.active = 0
+        self._queues: Tuple[Deque[Tuple[float, asyncio.Future]], ...] = tuple(deque() for _ in CLASS_NAMES)
+
+        self.stats: Dict[str, Dict[str, int]] = {
+            name: {'admitted': 0, 'queued': 0, 'shed': 0} for name in CLASS_NAMES
+        }
+        self.max_wait_ms = {name: 0.0 for name in CLASS_NAMES}
+
+    async def __call__(
+            self,
+            handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        if self.max_concurrency <= 0:
+            return await handler(event, data)
+
+        update_class = classify(event)
+        stats = self.stats[CLASS_NAMES[update_class]]
+
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+        else:
+            if update_class in _SHEDDABLE and len(self._queues[update_class]) >= self.max_queue:
+                return await self._shed(event, update_class)
+            stats['queued'] += 1
+            if not await self._wait(update_class):
+                return await self._shed(event, update_class)
+
+        stats['admitted'] += 1
+        try:
+            return await handler(event, data)
+        finally:
+            self.active -= 1
+            self._grant()
+
+    async def _wait(self, update_class: int) -> bool:
+        """Ожидание слота; False - апдейт сброшен по времени ожидания"""
+        future = asyncio.get_running_loop().create_future()
+        self._queues[update_class].append((time.monotonic(), future))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.result():
+                # Слот уже выдан - возвращаем
+                self.active -= 1
+                self._grant()
+            raise
+
+    def _grant(self):
+        """Свободные слоты - самому важному классу; просроченная навигация и подсказки сбрасываются"""
+        now = time.monotonic()
+        for update_class, queue in enumerate(self._queues):
+            while queue and self.active < self.max_concurrency:
+                enqueued_at, future = queue.popleft()
+                if future.done():
+                    continue
+                waited_ms = (now - enqueued_at) * 1000
+                name = CLASS_NAMES[update_class]
+                self.max_wait_ms[name] = max(self.max_wait_ms[name], waited_ms)
+                if update_class in _SHEDDABLE and waited_ms > self.target_ms:
+                    future.set_result(False)
+                    continue
+                self.active += 1
+                future.set_result(True)
+            if self.active >= self.max_concurrency:
+                return
+
+    async def _shed(self, event: Update, update_class: int):
+        """Ответ без обработки: сохраненный экран, просьба повторить или пустой ответ на нажатие"""
+        self.stats[CLASS_NAMES[update_class]]['shed'] += 1
+        inner = event.event
+        try:
+            if update_class == NAVIGATION:
+                key = screen_key(inner)
+                if key is not None and await serve_cached_screen(inner, key, OVERLOAD_BANNER):
+                    return None
+                if isinstance(inner, CallbackQuery):
+                    await inner.answer(OVERLOAD_TEXT)
+                elif isinstance(inner, Message):
+                    await inner.answer(OVERLOAD_TEXT)
+            elif isinstance(inner, CallbackQuery):
+                # Убираем "часики" на кнопке
+                await inner.answer()
+        except Exception as e:
+            logger.debug(f"Ответ на сброшенный апдейт не отправлен: {e}")
+        return None
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues)
+
+    def snapshot(self) -> dict:
+        return {
+            'active': self.active,
+            'max_concurrency': self.max_concurrency,
+            'queued': {name: len(queue) for name, queue in zip(CLASS_NAMES, self._queues)},
+            'classes': {name: dict(stats) for name, stats in self.stats.items()},
+            'max_wait_ms': {name: round(value, 1) for name, value in self.max_wait_ms.items()}
+        }
+
+
+# Глобальный экземпляр
+admission = AdmissionMiddleware(
+    max_concurrency=int(os.getenv("ADMISSION_CONCURRENCY", "200")),
+    target_ms=float(os.getenv("ADMISSION_TARGET_MS", "1000")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "1000"))
+)
+
+
+logger.info("✅ Admission middleware загружен")
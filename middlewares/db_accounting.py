@@ -0,0 +1,40 @@
+"""
+Middleware учета запросов к БД для Ryabot Island
+Открывает счетчик запросов на время обработки апдейта и по завершении
+записывает сводку по обработчику и проверяет его @query_budget
+"""
+import logging
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from utils.db_metrics import db_metrics, begin_update, end_update
+
+logger = logging.getLogger(__name__)
+
+
+class DBAccountingMiddleware(BaseMiddleware):
+    """
+    Подключается первым внутренним middleware (dp.message / dp.callback_query),
+    чтобы в счет апдейта попали и запросы остальных middleware (энергия)
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        stats, token = begin_update()
+        try:
+            return await handler(event, data)
+        finally:
+            end_update(token)
+
+            handler_object = data.get("handler")
+            callback = getattr(handler_object, "callback", None)
+            name = f"{callback.__module__}.{callback.__qualname__}" if callback else type(event).__name__
+
+            db_metrics.finish_update(name, stats, getattr(callback, "__query_budget__", None))
+
+
+logger.info("✅ DB accounting middleware загружен")
@@ -0,0 +1,175 @@
+"""
+Деградированный режим Ryabot Island при недоступности БД
+Когда запросы к БД падают с DatabaseUnavailable (таймаут или разомкнутый
+предохранитель database.circuit_breaker), обработчик не может построить экран.
+Вместо тишины или "пользователь не найден" игрок получает последний экран,
+который бот показывал ему на это же действие, с пометкой, что данные могут
+быть устаревшими. Экраны запоминаются middleware сессии бота при отправке.
+
+Только для навигации и подсказок: экран действия, меняющего состояние (найм,
+обучение, /start, выбор языка), сообщил бы об успехе того, что не выполнялось.
+На такие действия при недоступности БД игрок получает UNAVAILABLE_TEXT.
+
+Переменные окружения:
+    DEGRADED_SCREENS - сколько экранов (игрок, действие) хранить в памяти
+"""
+import os
+import logging
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.methods import EditMessageText, SendMessage
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from database.circuit_breaker import DatabaseUnavailable
+
+logger = logging.getLogger(__name__)
+
+DEGRADED_BANNER = "⚠️ Нет связи с базой данных - показаны последние сохраненные данные"
+UNAVAILABLE_TEXT = "⚠️ Сервис временно недоступен. Попробуйте через минуту"
+
+# (игрок, действие) текущего апдейта - под этим ключом запоминается отправленный экран
+_current_screen: ContextVar[Optional[Tuple[int, str]]] = ContextVar("degraded_screen", default=None)
+
+
+class ScreenCache:
+    """Последние экраны игроков по действию (LRU)"""
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._screens: "OrderedDict[Tuple[int, str], Tuple[str, Any, Any]]" = OrderedDict()
+
+    def put(self, key: Tuple[int, str], text: str, reply_markup: Any, parse_mode: Any):
+        self._screens[key] = (text, reply_markup, parse_mode)
+        self._screens.move_to_end(key)
+        while len(self._screens) > self.max_entries:
+            self._screens.popitem(last=False)
+
+    def get(self, key: Tuple[int, str]) -> Optional[Tuple[str, Any, Any]]:
+        screen = self._screens.get(key)
+        if screen is not None:
+            self._screens.move_to_end(key)
+        return screen
+
+    def __len__(self) -> int:
+        return len(self._screens)
+
+
+async def capture_screens(make_request, bot, method):
+    """Middleware сессии бота: запоминает экран, отправленный в ответ на действие"""
+    response = await make_request(bot, method)
+    key = _current_screen.get()
+    if key is not None and isinstance(method, (SendMessage, EditMessageText)) and method.text:
+        screen_cache.put(key, method.text, method.reply_markup, method.parse_mode)
+    return response
+
+
+class DegradedModeMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware (dp.message / dp.callback_query): отвечает сохраненным
+    экраном, если обработка упала из-за недоступности БД
+    """
+
+    def __init__(self):
+        self.stats = {
+            'served_cached': 0,
+            'served_unavailable': 0
+        }
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        key = screen_key(event)
+        if key is None:
+            return await handler(event, data)
+
+        cacheable = is_cacheable(event)
+        bot = data.get("bot")
+        if bot is not None and cacheable:
+            _ensure_capture(bot)
+
+        token = _current_screen.set(key if cacheable else None)
+        try:
+            return await handler(event, data)
+        except DatabaseUnavailable as e:
+            logger.debug(f"Деградированный режим для {key[0]} ({key[1]}): {e}")
+            if cacheable:
+                await self._serve_degraded(event, key)
+            else:
+                await self._serve_unavailable(event)
+            return None
+        finally:
+            _current_screen.reset(token)
+
+    async def _serve_degraded(self, event: TelegramObject, key: Tuple[int, str]):
+        if await serve_cached_screen(event, key, DEGRADED_BANNER):
+            self.stats['served_cached'] += 1
+            return
+        await self._serve_unavailable(event)
+
+    async def _serve_unavailable(self, event: TelegramObject):
+        self.stats['served_unavailable'] += 1
+        try:
+            if isinstance(event, CallbackQuery):
+                await event.answer(UNAVAILABLE_TEXT, show_alert=True)
+            else:
+                await event.answer(UNAVAILABLE_TEXT)
+        except Exception as e:
+            logger.debug(f"Ответ деградированного режима не отправлен: {e}")
+
+
+async def serve_cached_screen(event: TelegramObject, key: Tuple[int, str], banner: str) -> bool:
+    """Ответ сохраненным экраном с пометкой; False - экрана для действия нет"""
+    screen = screen_cache.get(key)
+    if screen is None:
+        return False
+
+    text, reply_markup, parse_mode = screen
+    try:
+        if isinstance(event, CallbackQuery):
+            await event.answer(banner)
+            if event.message:
+                await event.message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode)
+        else:
+            await event.answer(f"{banner}\n\n{text}", reply_markup=reply_markup, parse_mode=parse_mode)
+    except Exception as e:
+        # "message is not modified" и прочее - игрок уже видит этот экран
+        logger.debug(f"Сохраненный экран не отправлен: {e}")
+    return True
+
+
+def is_cacheable(event: TelegramObject) -> bool:
+    """Экран действия можно сохранить и показать повторно (навигация и подсказки)"""
+    # middlewares.admission импортирует этот модуль - импорт на месте
+    from middlewares.admission import classify_event, NAVIGATION, INFORMATIONAL
+    return classify_event(event) in (NAVIGATION, INFORMATIONAL)
+
+
+def screen_key(event: TelegramObject) -> Optional[Tuple[int, str]]:
+    """(игрок, действие) для сообщения или нажатия кнопки"""
+    if isinstance(event, Message) and event.from_user and event.text:
+        return event.from_user.id, event.text
+    if isinstance(event, CallbackQuery) and event.data:
+        return event.from_user.id, event.data
+    return None
+
+
+def _ensure_capture(bot):
+    """Middleware сессии подключается к текущей сессии бота (ее могут заменить после запуска)"""
+    session = bot.session
+    if not getattr(session, "_screens_captured", False):
+        session.middleware(capture_screens)
+        session._screens_captured = True
+
+
+# Глобальные экземпляры
+screen_cache = ScreenCache(max_entries=int(os.getenv("DEGRADED_SCREENS", "20000")))
+degraded_mode = DegradedModeMiddleware()
+
+
+logger.info("✅ Degraded mode middleware загружен")
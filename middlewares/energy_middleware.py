@@ -6,7 +6,9 @@ import logging
 from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery
-from database.models import get_user, update_user_resources
+from database.models import get_user, charge_energy
+from database.circuit_breaker import DatabaseUnavailable
+from utils.callback_codec import callback_codec
 
 logger = logging.getLogger(__name__)
 
@@ -82,7 +84,8 @@ class EnergyMiddleware(BaseMiddleware):
             action_type = event.text
         elif isinstance(event, CallbackQuery):
             user_id = event.from_user.id
-            action_type = event.data
+            # Компактные кнопки ("~1x1") оцениваются по имени действия
+            action_type = callback_codec.action_name(event.data or "") or event.data
 
         if not user_id or not action_type:
             return await handler(event, data)
@@ -140,7 +143,7 @@ class EnergyMiddleware(BaseMiddleware):
                 return False
 
             # Списываем энергию
-            success = await update_user_resources(user_id, energy=-cost)
+            success = await charge_energy(user_id, cost)
             if success:
                 logger.info(f"💡 Энергия списана: -{cost} у пользователя {user_id} (осталось: {user.energy - cost})")
                 return True
@@ -148,6 +151,9 @@ class EnergyMiddleware(BaseMiddleware):
                 logger.error(f"❌ Не удалось списать энергию у пользователя {user_id}")
                 return True  # При ошибке пропускаем
 
+        except DatabaseUnavailable:
+            # Обработчик все равно не сможет работать - ответит DegradedModeMiddleware
+            raise
         except Exception as e:
             logger.error(f"Ошибка списания энергии: {e}")
             return True  # При ошибке пропускаем
@@ -0,0 +1,31 @@
+"""
+Middleware учета апдейтов в обработке для Ryabot Island
+Подключается первым внешним middleware dp.update: по счетчику
+utils.lifecycle при остановке ждет, пока апдейты доработают
+"""
+import logging
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from utils.lifecycle import lifecycle
+
+logger = logging.getLogger(__name__)
+
+
+class InFlightMiddleware(BaseMiddleware):
+    """Счетчик апдейтов в обработке"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        lifecycle.update_started()
+        try:
+            return await handler(event, data)
+        finally:
+            lifecycle.update_finished()
+
+
+logger.info("✅ Lifecycle middleware загружен")
@@ -0,0 +1,68 @@
+"""
+Middleware метрик для Ryabot Island
+Внешний middleware апдейтов считает пропускную способность и полное время
+апдейта, внутренний - время каждого обработчика с меткой роутера
+"""
+import time
+import logging
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+from utils.metrics import updates_total, update_duration, update_errors, handler_duration, register_throttling
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware dp.update: апдейты по типу и полное время обработки"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        update_type = event.event_type
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            update_errors.inc(update_type)
+            raise
+        finally:
+            updates_total.inc(update_type)
+            update_duration.observe(time.perf_counter() - started, update_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware (message / callback_query): время обработчика по роутеру"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            callback = getattr(data.get("handler"), "callback", None)
+            if callback is not None:
+                router = callback.__module__.rsplit(".", 1)[-1]
+                handler_duration.observe(time.perf_counter() - started, router, callback.__name__)
+
+
+def setup_metrics(dp: Dispatcher, throttling=None):
+    """Подключает middleware метрик (до остальных внутренних middleware) и счетчики throttling"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+
+    handler_metrics = HandlerMetricsMiddleware()
+    dp.message.middleware(handler_metrics)
+    dp.callback_query.middleware(handler_metrics)
+
+    if throttling is not None:
+        register_throttling(throttling)
+
+
+logger.info("✅ Metrics middleware загружен")
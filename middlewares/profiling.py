@@ -0,0 +1,107 @@
+"""
+Middleware выборочного профилирования для Ryabot Island
+setup_profiling вызывается после подключения всех middleware: внешний
+middleware dp.update решает, профилировать ли апдейт, а каждый уже
+подключенный middleware и обработчик оборачивается в замер шага
+(utils.profiler). Для непрофилируемых апдейтов обертка стоит одного
+чтения ContextVar
+"""
+import logging
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+from utils.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """Внешний middleware dp.update: выборка апдейтов для профилирования"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: Update,
+            data: Dict[str, Any]
+    ) -> Any:
+        token = profiler.begin_update(event.event_type)
+        try:
+            return await handler(event, data)
+        finally:
+            profiler.end_update(token)
+
+
+class ProfiledStep(BaseMiddleware):
+    """Обертка над подключенным middleware: замер его времени как шага цепочки"""
+
+    def __init__(self, middleware, name: str = None):
+        self.middleware = middleware
+        self.name = name or type(middleware).__name__
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if not profiler.active():
+            return await self.middleware(handler, event, data)
+
+        profiler.enter(self.name)
+        try:
+            return await self.middleware(handler, event, data)
+        finally:
+            profiler.exit()
+
+
+class HandlerProfilingMiddleware(BaseMiddleware):
+    """Последний внутренний middleware: замер самого обработчика"""
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if not profiler.active():
+            return await handler(event, data)
+
+        callback = getattr(data.get("handler"), "callback", None)
+        profiler.enter(f"{callback.__module__}.{callback.__qualname__}" if callback else type(event).__name__)
+        try:
+            return await handler(event, data)
+        finally:
+            profiler.exit()
+
+
+def _wrap(manager):
+    """Заменяет middleware менеджера на обертки, сохраняя порядок"""
+    registered = list(manager)
+    for middleware in registered:
+        manager.unregister(middleware)
+    for middleware in registered:
+        manager.register(middleware if isinstance(middleware, ProfiledStep) else ProfiledStep(middleware))
+
+
+def setup_profiling(dp: Dispatcher):
+    """Подключает профилирование (после всех остальных middleware диспетчера)"""
+    _wrap(dp.update.outer_middleware)
+
+    # Выборка - самым внешним, чтобы в замер попали все middleware апдейта
+    outer = list(dp.update.outer_middleware)
+    for middleware in outer:
+        dp.update.outer_middleware.unregister(middleware)
+    dp.update.outer_middleware(ProfilingMiddleware())
+    for middleware in outer:
+        dp.update.outer_middleware(middleware)
+
+    handler_profiling = HandlerProfilingMiddleware()
+    for observer in (dp.message, dp.callback_query):
+        _wrap(observer.middleware)
+        observer.middleware(handler_profiling)
+
+    if profiler.enabled:
+        logger.info(f"🔬 Профилирование включено (доля апдейтов {profiler.sample_rate:.2%})")
+
+
+logger.info("✅ Profiling middleware загружен")
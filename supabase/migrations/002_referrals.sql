@@ -0,0 +1,87 @@
+-- Реферальная система Ryabot Island
+
+-- Граф приглашений: одно ребро на приглашенного игрока
+CREATE TABLE IF NOT EXISTS referrals (
+    referred_id BIGINT PRIMARY KEY REFERENCES users(user_id) ON DELETE CASCADE,
+    referrer_id BIGINT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    rewarded_at TIMESTAMP WITH TIME ZONE,
+    CHECK (referrer_id <> referred_id)
+);
+
+-- Журнал начислений (по одной строке на уровень цепочки)
+CREATE TABLE IF NOT EXISTS referral_rewards (
+    id SERIAL PRIMARY KEY,
+    beneficiary_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    source_id BIGINT REFERENCES users(user_id) ON DELETE CASCADE,
+    depth INTEGER NOT NULL,
+    ryabucks INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (beneficiary_id, source_id)
+);
+
+-- Индексы: обход вверх по цепочке идет по PK, вниз и статистика - по referrer_id
+CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals(referrer_id);
+CREATE INDEX IF NOT EXISTS idx_referrals_pending ON referrals(created_at) WHERE rewarded_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_referral_rewards_beneficiary ON referral_rewards(beneficiary_id);
+
+-- Пакетная выплата бонусов за пачку новых игроков одним запросом.
+-- p_rewards[N] - награда предку уровня N (1 - прямой пригласивший).
+-- Повторный вызов для тех же игроков ничего не начисляет (rewarded_at).
+CREATE OR REPLACE FUNCTION pay_referral_rewards(p_referred_ids BIGINT[], p_rewards INTEGER[])
+RETURNS TABLE(user_id BIGINT, ryabucks INTEGER)
+LANGUAGE sql
+AS $$
+    WITH RECURSIVE claimed AS (
+        UPDATE referrals r
+        SET rewarded_at = NOW()
+        WHERE r.referred_id = ANY(p_referred_ids)
+          AND r.rewarded_at IS NULL
+        RETURNING r.referred_id, r.referrer_id
+    ),
+    chain AS (
+        SELECT c.referred_id AS source_id, c.referrer_id AS beneficiary_id, 1 AS depth
+        FROM claimed c
+        UNION ALL
+        SELECT ch.source_id, r.referrer_id, ch.depth + 1
+        FROM chain ch
+        JOIN referrals r ON r.referred_id = ch.beneficiary_id
+        WHERE ch.depth < COALESCE(array_length(p_rewards, 1), 0)
+    ),
+    ledger AS (
+        INSERT INTO referral_rewards (beneficiary_id, source_id, depth, ryabucks)
+        SELECT ch.beneficiary_id, ch.source_id, ch.depth, p_rewards[ch.depth]
+        FROM chain ch
+        ON CONFLICT (beneficiary_id, source_id) DO NOTHING
+        RETURNING beneficiary_id, ryabucks
+    ),
+    credits AS (
+        SELECT l.beneficiary_id, SUM(l.ryabucks)::INTEGER AS amount
+        FROM ledger l
+        GROUP BY l.beneficiary_id
+    ),
+    credited AS (
+        UPDATE users u
+        SET ryabucks = u.ryabucks + c.amount
+        FROM credits c
+        WHERE u.user_id = c.beneficiary_id
+        RETURNING u.user_id, c.amount
+    )
+    SELECT credited.user_id, credited.amount FROM credited;
+$$;
+
+-- Сводка для экрана "Друзья"
+CREATE OR REPLACE FUNCTION get_referral_summary(p_user_id BIGINT)
+RETURNS TABLE(invited INTEGER, earned INTEGER)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        (SELECT COUNT(*)::INTEGER FROM referrals WHERE referrer_id = p_user_id),
+        (SELECT COALESCE(SUM(ryabucks), 0)::INTEGER FROM referral_rewards WHERE beneficiary_id = p_user_id);
+$$;
+
+ALTER TABLE referrals ENABLE ROW LEVEL SECURITY;
+ALTER TABLE referral_rewards ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can manage referrals" ON referrals FOR ALL USING (true);
+CREATE POLICY "Users can view referral rewards" ON referral_rewards FOR SELECT USING (true);
@@ -0,0 +1,50 @@
+-- Детерминированные экспедиции: храним только seed и параметры
+
+ALTER TABLE expeditions ADD COLUMN IF NOT EXISTS seed BIGINT;
+ALTER TABLE expeditions ADD COLUMN IF NOT EXISTS params JSONB;
+ALTER TABLE expeditions ADD COLUMN IF NOT EXISTS ends_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE expeditions ADD COLUMN IF NOT EXISTS outcome TEXT;
+ALTER TABLE expeditions ADD COLUMN IF NOT EXISTS ryabucks_found INTEGER DEFAULT 0;
+
+-- Выборка закончившихся экспедиций для пакетного завершения
+CREATE INDEX IF NOT EXISTS idx_expeditions_active_ends_at ON expeditions(ends_at) WHERE status = 'active';
+
+-- Запись результатов пачки экспедиций и начисление наград одним вызовом.
+-- p_results: [{"id", "user_id", "outcome", "rbtc", "ryabucks"}, ...]
+-- Уже завершенные экспедиции повторно не начисляются.
+CREATE OR REPLACE FUNCTION complete_expeditions(p_results JSONB)
+RETURNS INTEGER
+LANGUAGE sql
+AS $$
+    WITH results AS (
+        SELECT *
+        FROM jsonb_to_recordset(p_results)
+            AS r(id INTEGER, user_id BIGINT, outcome TEXT, rbtc NUMERIC, ryabucks INTEGER)
+    ),
+    finished AS (
+        UPDATE expeditions e
+        SET status = 'completed',
+            outcome = r.outcome,
+            rbtc_found = r.rbtc,
+            ryabucks_found = r.ryabucks,
+            completed_at = NOW()
+        FROM results r
+        WHERE e.id = r.id
+          AND e.status = 'active'
+        RETURNING e.user_id, r.rbtc, r.ryabucks
+    ),
+    totals AS (
+        SELECT f.user_id, SUM(f.rbtc) AS rbtc, SUM(f.ryabucks)::INTEGER AS ryabucks
+        FROM finished f
+        GROUP BY f.user_id
+    ),
+    credited AS (
+        UPDATE users u
+        SET rbtc = u.rbtc + t.rbtc,
+            ryabucks = u.ryabucks + t.ryabucks
+        FROM totals t
+        WHERE u.user_id = t.user_id
+        RETURNING u.user_id
+    )
+    SELECT COUNT(*)::INTEGER FROM finished;
+$$;
@@ -0,0 +1,66 @@
+-- Глобальный дневной бюджет эмиссии RBTC
+
+-- Одна строка на день: бюджет, выданные процессам резервы и фактическая эмиссия
+CREATE TABLE IF NOT EXISTS rbtc_emission (
+    date DATE PRIMARY KEY DEFAULT CURRENT_DATE,
+    budget NUMERIC(12,2) NOT NULL,
+    reserved NUMERIC(12,2) DEFAULT 0,
+    emitted NUMERIC(12,2) DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Резерв части дневного бюджета процессом бота (одна блокировка строки на резерв,
+-- а не на каждое событие добычи). Возвращает выделенную сумму (0 - бюджет исчерпан).
+CREATE OR REPLACE FUNCTION reserve_rbtc_budget(p_date DATE, p_amount NUMERIC, p_budget NUMERIC)
+RETURNS NUMERIC
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_row rbtc_emission%ROWTYPE;
+    v_granted NUMERIC;
+BEGIN
+    INSERT INTO rbtc_emission (date, budget)
+    VALUES (p_date, p_budget)
+    ON CONFLICT (date) DO NOTHING;
+
+    SELECT * INTO v_row FROM rbtc_emission WHERE date = p_date FOR UPDATE;
+
+    v_granted := LEAST(p_amount, GREATEST(v_row.budget - v_row.reserved, 0));
+
+    UPDATE rbtc_emission
+    SET reserved = reserved + v_granted,
+        updated_at = NOW()
+    WHERE date = p_date;
+
+    RETURN v_granted;
+END;
+$$;
+
+-- Периодическая сверка: фактически выданное процессом и возврат неиспользованного резерва.
+-- Возвращает общую эмиссию за день.
+CREATE OR REPLACE FUNCTION record_rbtc_emission(p_date DATE, p_emitted NUMERIC, p_released NUMERIC)
+RETURNS NUMERIC
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_total NUMERIC;
+BEGIN
+    UPDATE rbtc_emission
+    SET emitted = emitted + p_emitted,
+        reserved = GREATEST(reserved - p_released, 0),
+        updated_at = NOW()
+    WHERE date = p_date
+    RETURNING emitted INTO v_total;
+
+    INSERT INTO island_stats (date, daily_rbtc, updated_at)
+    VALUES (p_date, COALESCE(v_total, 0), NOW())
+    ON CONFLICT (date) DO UPDATE
+    SET daily_rbtc = EXCLUDED.daily_rbtc,
+        updated_at = NOW();
+
+    RETURN COALESCE(v_total, 0);
+END;
+$$;
+
+ALTER TABLE rbtc_emission ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "RBTC emission is public" ON rbtc_emission FOR SELECT USING (true);
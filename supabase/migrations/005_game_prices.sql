@@ -0,0 +1,12 @@
+-- Переопределения игровых цен (горячая перезагрузка командой /reload_prices db)
+
+-- Ключ верхнего уровня таблицы цен: prices, training, hire, training_base_slots.
+-- Значение накладывается поверх значений из переменных окружения, например:
+--   ('prices',   '{"ryaba_price": 300}')
+--   ('hire',     '{"base_cost": 40, "daily_limit": 5}')
+--   ('training', '{"doctor": {"cost": 250}}')
+CREATE TABLE IF NOT EXISTS game_prices (
+    key TEXT PRIMARY KEY,
+    value JSONB NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
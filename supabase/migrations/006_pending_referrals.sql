@@ -0,0 +1,15 @@
+-- Невыплаченные реферальные бонусы (досыпка game.referrals.ReferralRewardBatcher.sweep)
+
+-- Приглашенные без rewarded_at старше p_older_than_seconds: пачка пропала при сбое
+-- RPC pay_referral_rewards или при остановке процесса. Идет по idx_referrals_pending.
+CREATE OR REPLACE FUNCTION get_pending_referrals(p_older_than_seconds INTEGER, p_limit INTEGER)
+RETURNS TABLE(referred_id BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT r.referred_id
+    FROM referrals r
+    WHERE r.rewarded_at IS NULL
+      AND r.created_at < NOW() - make_interval(secs => p_older_than_seconds)
+    ORDER BY r.created_at
+    LIMIT p_limit;
+$$;
@@ -0,0 +1,41 @@
+-- complete_expeditions возвращает id сохраненных экспедиций вместо их количества:
+-- RBTC, выданный из бюджета эмиссии под несохраненные результаты, возвращается в резерв
+
+DROP FUNCTION IF EXISTS complete_expeditions(JSONB);
+
+CREATE FUNCTION complete_expeditions(p_results JSONB)
+RETURNS TABLE(expedition_id INTEGER)
+LANGUAGE sql
+AS $$
+    WITH results AS (
+        SELECT *
+        FROM jsonb_to_recordset(p_results)
+            AS r(id INTEGER, user_id BIGINT, outcome TEXT, rbtc NUMERIC, ryabucks INTEGER)
+    ),
+    finished AS (
+        UPDATE expeditions e
+        SET status = 'completed',
+            outcome = r.outcome,
+            rbtc_found = r.rbtc,
+            ryabucks_found = r.ryabucks,
+            completed_at = NOW()
+        FROM results r
+        WHERE e.id = r.id
+          AND e.status = 'active'
+        RETURNING e.id, e.user_id, r.rbtc, r.ryabucks
+    ),
+    totals AS (
+        SELECT f.user_id, SUM(f.rbtc) AS rbtc, SUM(f.ryabucks)::INTEGER AS ryabucks
+        FROM finished f
+        GROUP BY f.user_id
+    ),
+    credited AS (
+        UPDATE users u
+        SET rbtc = u.rbtc + t.rbtc,
+            ryabucks = u.ryabucks + t.ryabucks
+        FROM totals t
+        WHERE u.user_id = t.user_id
+        RETURNING u.user_id
+    )
+    SELECT f.id FROM finished f;
+$$;
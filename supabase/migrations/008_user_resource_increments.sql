@@ -0,0 +1,39 @@
+-- Ресурсы игрока меняются приращением (col = col + delta), а не значением,
+-- посчитанным ботом по закэшированному профилю: начисления других процессов
+-- (complete_expeditions, pay_referral_rewards) не затираются.
+-- Списание, уводящее ресурс в минус, не выполняется (функция не вернет строк).
+
+CREATE OR REPLACE FUNCTION add_user_resources(p_user_id BIGINT, p_deltas JSONB)
+RETURNS SETOF users
+LANGUAGE sql
+AS $$
+    WITH d AS (
+        SELECT
+            COALESCE((p_deltas->>'energy')::INTEGER, 0) AS energy,
+            COALESCE((p_deltas->>'ryabucks')::INTEGER, 0) AS ryabucks,
+            COALESCE((p_deltas->>'rbtc')::NUMERIC, 0) AS rbtc,
+            COALESCE((p_deltas->>'golden_shards')::INTEGER, 0) AS golden_shards,
+            COALESCE((p_deltas->>'quantum_keys')::INTEGER, 0) AS quantum_keys,
+            COALESCE((p_deltas->>'experience')::INTEGER, 0) AS experience,
+            COALESCE((p_deltas->>'level')::INTEGER, 0) AS level,
+            COALESCE((p_deltas->>'land_plots')::INTEGER, 0) AS land_plots
+    )
+    UPDATE users u
+    SET energy = LEAST(u.energy + d.energy, 100),
+        ryabucks = u.ryabucks + d.ryabucks,
+        rbtc = u.rbtc + d.rbtc,
+        golden_shards = u.golden_shards + d.golden_shards,
+        quantum_keys = u.quantum_keys + d.quantum_keys,
+        experience = u.experience + d.experience,
+        level = u.level + d.level,
+        land_plots = u.land_plots + d.land_plots,
+        last_active = NOW()
+    FROM d
+    WHERE u.user_id = p_user_id
+      AND (d.energy >= 0 OR u.energy + d.energy >= 0)
+      AND (d.ryabucks >= 0 OR u.ryabucks + d.ryabucks >= 0)
+      AND (d.rbtc >= 0 OR u.rbtc + d.rbtc >= 0)
+      AND (d.golden_shards >= 0 OR u.golden_shards + d.golden_shards >= 0)
+      AND (d.quantum_keys >= 0 OR u.quantum_keys + d.quantum_keys >= 0)
+    RETURNING u.*;
+$$;
@@ -0,0 +1,19 @@
+-- Версия опубликованных цен для нескольких воркеров
+-- /reload_prices db увеличивает версию (publish_game_prices), каждый воркер
+-- раз в PRICES_DB_POLL секунд сравнивает ее со своей и перечитывает game_prices
+
+CREATE TABLE IF NOT EXISTS game_prices_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION publish_game_prices()
+RETURNS BIGINT
+LANGUAGE sql
+AS $$
+    INSERT INTO game_prices_version (id, version) VALUES (1, 1)
+    ON CONFLICT (id) DO UPDATE
+        SET version = game_prices_version.version + 1, updated_at = NOW()
+    RETURNING version;
+$$;
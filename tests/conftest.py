@@ -0,0 +1,25 @@
+"""
+Общие фикстуры тестов Ryabot Island
+Тесты работают на локальном бэкенде БД (DB_BACKEND=memory), без сети
+"""
+import os
+
+# Бэкенд и токен должны быть заданы до первого импорта database.* / main
+os.environ.setdefault("DB_BACKEND", "memory")
+os.environ.setdefault("BOT_TOKEN", "123456:ABCdefGHIjklMNOpqrSTUvwxYZ0123456789")
+
+import pytest
+
+from database.local_backend import LocalBackend
+from database.supabase_client import supabase_manager
+from database.user_cache import user_cache
+
+
+@pytest.fixture
+def db() -> LocalBackend:
+    """Чистый локальный бэкенд и пустой кэш профилей"""
+    backend = LocalBackend()
+    supabase_manager.use_backend(backend)
+    user_cache.clear()
+    yield backend
+    user_cache.clear()
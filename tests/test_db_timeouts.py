@@ -0,0 +1,38 @@
+"""Таймауты запросов: чтение бросается, запись дожидается ответа БД"""
+import asyncio
+
+import pytest
+
+from database.circuit_breaker import DatabaseUnavailable, db_breaker
+from database.supabase_client import supabase_manager
+
+
+@pytest.fixture
+def slow_db(db, monkeypatch):
+    """Каждый запрос идет 20 мс, таймауты - доли миллисекунды"""
+    db.latency_ms = 20
+    monkeypatch.setattr(supabase_manager, "timeout_scale", 0.0001)
+    yield db
+    db_breaker.record_success()
+
+
+def test_slow_read_times_out(slow_db):
+    with pytest.raises(DatabaseUnavailable):
+        asyncio.run(supabase_manager.execute_query(table="users", operation="select"))
+
+
+def test_slow_read_rpc_times_out(slow_db):
+    with pytest.raises(DatabaseUnavailable):
+        asyncio.run(supabase_manager.execute_rpc("get_workers_count", {"p_user_id": 1}))
+
+
+def test_slow_writes_are_not_abandoned(slow_db):
+    async def scenario():
+        await supabase_manager.execute_query(table="users", operation="insert", data={"user_id": 1})
+        return await supabase_manager.execute_rpc(
+            "add_user_resources", {"p_user_id": 1, "p_deltas": {"ryabucks": 5}}
+        )
+
+    rows = asyncio.run(scenario())
+    assert rows[0]['ryabucks'] == 1005
+    assert slow_db.tables['users'][1]['ryabucks'] == 1005
@@ -0,0 +1,67 @@
+"""Списание энергии EnergyMiddleware"""
+import asyncio
+from datetime import datetime
+
+from aiogram.types import CallbackQuery, Chat, Message, User
+
+from database.models import create_user, get_user
+from middlewares.energy_middleware import EnergyMiddleware
+from utils.callback_codec import START_EXPEDITION
+
+
+def _message(user_id: int, text: str) -> Message:
+    return Message(
+        message_id=1,
+        date=datetime.now(),
+        chat=Chat(id=user_id, type="private"),
+        from_user=User(id=user_id, is_bot=False, first_name="Test"),
+        text=text
+    )
+
+
+async def _press(user_id: int, text: str) -> list:
+    calls = []
+
+    async def handler(event, data):
+        calls.append(event.text)
+
+    await EnergyMiddleware()(handler, _message(user_id, text), {})
+    return calls
+
+
+def test_navigation_charges_cost(db):
+    async def scenario():
+        await create_user(1, "player")
+        calls = await _press(1, "🏠 Ферма")
+        user = await get_user(1)
+        return calls, user.energy
+
+    calls, energy = asyncio.run(scenario())
+    assert calls == ["🏠 Ферма"]
+    assert energy == 99
+
+
+def test_repeated_actions_accumulate(db):
+    async def scenario():
+        await create_user(2, "player")
+        for _ in range(3):
+            await _press(2, "🏢 Город")
+        return (await get_user(2)).energy
+
+    assert asyncio.run(scenario()) == 97
+
+
+def test_compact_button_charges_action_cost(db):
+    callback = CallbackQuery(
+        id="1",
+        from_user=User(id=3, is_bot=False, first_name="Test"),
+        chat_instance="1",
+        data=START_EXPEDITION.pack(zone=1)
+    )
+
+    async def scenario():
+        await create_user(3, "player")
+        await EnergyMiddleware()(lambda event, data: asyncio.sleep(0), callback, {})
+        return (await get_user(3)).energy
+
+    assert asyncio.run(scenario()) == 98
@@ -0,0 +1,57 @@
+"""Отправка экспедиций и разрешение по версии формулы"""
+import asyncio
+
+from database.models import create_user
+from game import expedition
+from game.expedition import ENGINE_VERSION, build_results, expedition_price, resolve, start_expedition
+
+
+def _row(expedition_id: int, seed: int, version=None) -> dict:
+    params = {'zone_id': 2} if version is None else {'version': version, 'zone_id': 2}
+    return {'id': expedition_id, 'user_id': 1, 'zone_id': 2, 'seed': seed, 'params': params}
+
+
+def test_results_use_recorded_engine_version(monkeypatch):
+    # Формула версии 2 отличается: экспедиции версии 1 должны считаться старой
+    monkeypatch.setitem(expedition._ENGINES, 2, lambda seeds, zones: expedition._resolve_v1(seeds + 1, zones))
+    rows = [_row(1, 42, version=1), _row(2, 42, version=2), _row(3, 42)]
+
+    results = {result['id']: result for result in build_results(rows)}
+
+    assert results[1]['ryabucks'] == resolve(42, 2, version=1)['ryabucks']
+    assert results[3]['ryabucks'] == results[1]['ryabucks']
+    assert results[2]['ryabucks'] == resolve(42, 2, version=2)['ryabucks']
+
+
+def test_unknown_version_stays_active():
+    results = build_results([_row(1, 7, version=1), _row(2, 7, version=99)])
+    assert [result['id'] for result in results] == [1]
+
+
+def test_start_charges_gear_and_records_version(db):
+    async def scenario():
+        await create_user(1, "player")
+        started = await start_expedition(1, 1)
+        again = await start_expedition(1, 2)
+        return started, again
+
+    (ok, _), (again_ok, _) = asyncio.run(scenario())
+    rows = list(db.tables['expeditions'].values())
+
+    assert ok is True
+    assert again_ok is False
+    assert len(rows) == 1
+    assert rows[0]['params']['version'] == ENGINE_VERSION
+    assert db.tables['users'][1]['ryabucks'] == 1000 - expedition_price(1)
+
+
+def test_start_without_money_creates_nothing(db):
+    async def scenario():
+        await create_user(2, "player")
+        db.tables['users'][2]['ryabucks'] = expedition_price(3) - 1
+        return await start_expedition(2, 3)
+
+    ok, _ = asyncio.run(scenario())
+    assert ok is False
+    assert not db.tables['expeditions']
+    assert db.tables['users'][2]['ryabucks'] == expedition_price(3) - 1
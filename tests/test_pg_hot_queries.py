@@ -0,0 +1,76 @@
+"""Горячие запросы database.models попадают в заранее подготовленные выражения PgBackend"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from database import models
+from database.pg_backend import PgBackend, _HOT_QUERIES, _HOT_RPCS
+from database.supabase_client import supabase_manager
+from database.user_cache import user_cache
+
+USER_ID = 7
+
+
+class _RecordingConnection:
+    """Соединение/пул asyncpg без сервера: запоминает текст SQL, строк не возвращает"""
+
+    def __init__(self):
+        self.sql = []
+
+    async def fetch(self, sql, *params):
+        self.sql.append(sql)
+        return []
+
+    async def fetchrow(self, sql, *params):
+        self.sql.append(sql)
+        return None
+
+    async def fetchval(self, sql, *params):
+        self.sql.append(sql)
+        return 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+
+def _backend() -> PgBackend:
+    backend = PgBackend("postgresql://test")
+    backend._columns = {table: {"user_id": "bigint"} for table, *_ in _HOT_QUERIES}
+    backend._rpc_params = {name: {param: "bigint" for param in params} for name, params in _HOT_RPCS}
+    return backend
+
+
+async def _hot_paths():
+    """Запросы на каждом нажатии: профиль (один и пачкой), энергия, экраны академии"""
+    await models.get_user(USER_ID)
+    user_cache.clear()
+    await asyncio.gather(models.get_user(USER_ID), models.get_user(USER_ID + 1))
+    await models.charge_energy(USER_ID, 1)
+    await models.get_hired_workers_count(USER_ID)
+    await models.get_training_slots_info(USER_ID)
+    await models.get_active_trainings(USER_ID)
+    await models.get_specialists_count(USER_ID)
+    await models.can_hire_worker(USER_ID)
+
+
+def test_hot_queries_are_prepared():
+    async def scenario():
+        backend = _backend()
+        prepared = _RecordingConnection()
+        await backend._prepare_hot(prepared)
+
+        backend.pool = _RecordingConnection()
+        previous = supabase_manager.backend
+        supabase_manager.use_backend(backend)
+        user_cache.clear()
+        try:
+            await _hot_paths()
+        finally:
+            supabase_manager.use_backend(previous)
+            user_cache.clear()
+        return set(prepared.sql), backend.pool.sql
+
+    prepared, issued = asyncio.run(scenario())
+    assert len(prepared) == len(_HOT_QUERIES) + len(_HOT_RPCS)
+    missing = [sql for sql in issued if sql not in prepared]
+    assert not missing, f"не подготовлены: {missing}"
@@ -0,0 +1,41 @@
+"""Перезагрузка цен из БД доходит до всех воркеров"""
+import asyncio
+
+from game.economy import PricingEngine
+
+
+async def _poll_once(engine: PricingEngine):
+    """Одна проверка watch_db (первая выполняется сразу при запуске)"""
+    task = asyncio.create_task(engine.watch_db(interval=3600))
+    for _ in range(10):
+        await asyncio.sleep(0)
+    task.cancel()
+
+
+def test_reload_reaches_other_workers(db):
+    async def scenario():
+        handling, other = PricingEngine(), PricingEngine()
+        await _poll_once(other)
+        before = other.table.version
+
+        db.upsert_row('game_prices', {'key': 'prices', 'value': {'ryaba_price': 333}})
+        await handling.reload_from_db(publish=True)
+        await _poll_once(other)
+        return handling.table, other.table, before
+
+    handling, other, before = asyncio.run(scenario())
+    assert handling.price('ryaba_price') == 333
+    assert other.price('ryaba_price') == 333
+    assert other.version > before
+
+
+def test_unchanged_version_does_not_reload(db):
+    async def scenario():
+        engine = PricingEngine()
+        await engine.reload_from_db(publish=True)
+        version = engine.table.version
+        await _poll_once(engine)
+        return version, engine.table.version
+
+    version, after = asyncio.run(scenario())
+    assert after == version
@@ -0,0 +1,45 @@
+"""Дневная эмиссия RBTC: возвраты и общая сумма за сутки"""
+import asyncio
+
+from game.rbtc import RBTCEmissionEngine, _today
+
+
+def test_refund_after_reconcile_reduces_db_emission(db):
+    async def scenario():
+        engine = RBTCEmissionEngine(daily_budget=10.0, lease_size=2.0)
+        await engine.allocate(1.5)
+        await engine.reconcile()
+        engine.refund(1.5)
+        await engine.reconcile()
+        return engine.daily_emitted(), db.tables['rbtc_emission'][_today()]['emitted']
+
+    daily, stored = asyncio.run(scenario())
+    assert daily == 0.0
+    assert stored == 0.0
+
+
+def test_refund_is_capped_by_allocated(db):
+    async def scenario():
+        engine = RBTCEmissionEngine(daily_budget=10.0, lease_size=2.0)
+        await engine.allocate(0.5)
+        engine.refund(3.0)
+        await engine.reconcile(release_lease=True)
+        return engine.daily_emitted(), db.tables['rbtc_emission'][_today()]
+
+    daily, row = asyncio.run(scenario())
+    assert daily == 0.0
+    assert row['emitted'] == 0.0
+    assert row['reserved'] == 0.0
+
+
+def test_daily_emitted_includes_other_processes(db):
+    async def scenario():
+        first = RBTCEmissionEngine(daily_budget=10.0, lease_size=2.0)
+        second = RBTCEmissionEngine(daily_budget=10.0, lease_size=2.0)
+        await first.allocate(1.25)
+        await first.reconcile()
+        # Процесс без своей добычи узнает общую сумму на сверке
+        await second.reconcile()
+        return second.daily_emitted()
+
+    assert asyncio.run(scenario()) == 1.25
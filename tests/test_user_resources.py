@@ -0,0 +1,44 @@
+"""Изменение ресурсов игрока приращениями"""
+import asyncio
+
+from database.models import create_user, get_user, update_user_resources
+from database.user_cache import user_cache
+
+
+def test_credit_from_other_process_survives_write(db):
+    async def scenario():
+        await create_user(1, "player")
+        await get_user(1)  # профиль в кэше
+        # Начисление RPC другого процесса - кэш этого процесса о нем не знает
+        db.tables['users'][1]['ryabucks'] += 300
+        ok = await update_user_resources(1, ryabucks=-100)
+        return ok, db.tables['users'][1]['ryabucks'], (await get_user(1)).ryabucks
+
+    ok, stored, cached = asyncio.run(scenario())
+    assert ok is True
+    assert stored == 1200
+    assert cached == 1200
+
+
+def test_overspend_is_rejected_by_db(db):
+    async def scenario():
+        await create_user(2, "player")
+        await get_user(2)
+        # Списание другого процесса: кэш все еще показывает 1000
+        db.tables['users'][2]['ryabucks'] = 50
+        ok = await update_user_resources(2, ryabucks=-100)
+        return ok, db.tables['users'][2]['ryabucks']
+
+    ok, stored = asyncio.run(scenario())
+    assert ok is False
+    assert stored == 50
+
+
+def test_energy_is_capped(db):
+    async def scenario():
+        await create_user(3, "player")
+        await update_user_resources(3, energy=50)
+        user_cache.clear()
+        return (await get_user(3)).energy
+
+    assert asyncio.run(scenario()) == 100
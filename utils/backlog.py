@@ -0,0 +1,235 @@
+"""
+Доигрывание накопившихся апдейтов после перезапуска Ryabot Island
+Раньше при запуске очередь Telegram сбрасывалась (drop_pending_updates=True):
+все действия игроков за время деплоя терялись. Теперь очередь забирается через
+getUpdates, прореживается и обрабатывается в фоне с ограниченной скоростью
+параллельно с живым трафиком - без всплеска нагрузки на БД после деплоя.
+
+Прореживание (классы из middlewares.admission):
+    - подсказки (info_*, заголовки и кулдауны слотов) не доигрываются - ответ на них уже не нужен
+    - повторные одинаковые нажатия игрока (двойные тапы) - одно действие
+    - из навигации игрока остается только последнее нажатие
+    - сообщения старше BACKLOG_MAX_AGE не доигрываются
+Игроки с онбордингом и транзакциями в очереди доигрываются первыми, но апдейты
+одного игрока всегда идут по порядку update_id.
+
+Забранные апдейты уже подтверждены Telegram и повторно не придут, поэтому при
+остановке процесса оставшиеся доигрываются без ограничения скорости (drain,
+первый шаг сброса utils.lifecycle) и теряются только по дедлайну остановки.
+
+Переменные окружения:
+    BACKLOG_REPLAY   - 0 - старое поведение (очередь сбрасывается)
+    BACKLOG_RATE     - апдейтов в секунду при доигрывании
+    BACKLOG_MAX      - максимум апдейтов, забираемых из очереди
+    BACKLOG_MAX_AGE  - максимальный возраст сообщения (секунды)
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from middlewares.admission import classify, NAVIGATION, INFORMATIONAL
+
+logger = logging.getLogger(__name__)
+
+
+def _user_id(update: Update) -> int:
+    event = update.message or update.callback_query
+    user = getattr(event, "from_user", None)
+    return user.id if user else 0
+
+
+def _action(update: Update) -> str:
+    if update.message is not None:
+        return update.message.text or ""
+    if update.callback_query is not None:
+        return update.callback_query.data or ""
+    return ""
+
+
+class BacklogReplayer:
+    """Забор, прореживание и фоновое доигрывание очереди апдейтов"""
+
+    def __init__(self, enabled: bool = True, rate: float = 20.0, max_updates: int = 5000,
+                 max_age: float = 600.0):
+        """
+        Args:
+            enabled: False - очередь при запуске сбрасывается, как раньше
+            rate: апдейтов в секунду при доигрывании
+            max_updates: максимум апдейтов, забираемых из очереди (остальные получит polling)
+            max_age: сообщения старше (секунды) не доигрываются
+        """
+        self.enabled = enabled
+        self.rate = rate
+        self.max_updates = max_updates
+        self.max_age = max_age
+
+        self._stopped = False
+        self._draining = False
+        self._task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            'fetched': 0,
+            'replayed': 0,
+            'informational': 0,
+            'duplicates': 0,
+            'superseded': 0,
+            'stale': 0,
+            'errors': 0,
+            'not_replayed': 0
+        }
+
+    # ---------- Очередь Telegram ----------
+
+    async def fetch(self, bot: Bot, allowed_updates: Optional[List[str]] = None) -> List[Update]:
+        """
+        Забирает накопившиеся апдейты (webhook должен быть удален без сброса очереди)
+        и подтверждает их: polling получит только новые
+        """
+        updates: List[Update] = []
+        offset = None
+        # Сколько забранных подтверждено: запрос с offset подтверждает все апдейты до него
+        confirmed = 0
+        try:
+            while len(updates) < self.max_updates:
+                batch = await bot.get_updates(offset=offset, limit=100, timeout=0, allowed_updates=allowed_updates)
+                confirmed = len(updates)
+                if not batch:
+                    break
+                updates.extend(batch)
+                offset = batch[-1].update_id + 1
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения накопившихся апдейтов: {e}")
+
+        if confirmed < len(updates):
+            # Подтверждаем последнюю пачку; что осталось сверх лимита - получит polling
+            try:
+                await bot.get_updates(offset=offset, limit=1, timeout=0, allowed_updates=allowed_updates)
+                confirmed = len(updates)
+            except Exception as e:
+                # Неподтвержденные апдейты получит polling - доигрывать их нельзя, иначе обработаются дважды
+                logger.error(f"❌ Не подтверждены накопившиеся апдейты ({len(updates) - confirmed}): {e}")
+                updates = updates[:confirmed]
+
+        self.stats['fetched'] += len(updates)
+        return updates
+
+    # ---------- Прореживание ----------
+
+    def plan(self, updates: List[Update], now: Optional[float] = None) -> List[Update]:
+        """Апдейты для доигрывания в порядке обработки (now - unix время)"""
+        now = now or time.time()
+        latest_navigation: Dict[int, int] = {}
+        seen: set = set()
+        candidates: List[Tuple[int, int, Update]] = []
+
+        for update in sorted(updates, key=lambda item: item.update_id):
+            update_class = classify(update)
+            if update_class == INFORMATIONAL:
+                self.stats['informational'] += 1
+                continue
+
+            message = update.message
+            if message is not None and now - message.date.timestamp() > self.max_age:
+                self.stats['stale'] += 1
+                continue
+
+            user_id = _user_id(update)
+            if update_class == NAVIGATION:
+                latest_navigation[user_id] = update.update_id
+            else:
+                key = (user_id, _action(update))
+                if key in seen:
+                    self.stats['duplicates'] += 1
+                    continue
+                seen.add(key)
+            candidates.append((update_class, update.update_id, update))
+
+        planned = []
+        # Приоритет игрока - самый важный класс в его очереди: цепочка игрока не переставляется
+        user_rank: Dict[int, int] = {}
+        for update_class, update_id, update in candidates:
+            user_id = _user_id(update)
+            if update_class == NAVIGATION and latest_navigation.get(user_id) != update_id:
+                self.stats['superseded'] += 1
+                continue
+            planned.append((user_id, update_id, update))
+            user_rank[user_id] = min(user_rank.get(user_id, update_class), update_class)
+
+        planned.sort(key=lambda item: (user_rank[item[0]], item[1]))
+        return [update for _, _, update in planned]
+
+    # ---------- Доигрывание ----------
+
+    def start(self, bot: Bot, dp: Dispatcher, updates: List[Update]) -> Optional[asyncio.Task]:
+        """Фоновое доигрывание уже забранных апдейтов"""
+        planned = self.plan(updates)
+        logger.info(f"📬 Накопилось апдейтов: {len(updates)}, к доигрыванию: {len(planned)} "
+                    f"(подсказки: {self.stats['informational']}, повторы: {self.stats['duplicates']}, "
+                    f"устаревшая навигация: {self.stats['superseded']}, старые: {self.stats['stale']})")
+        if not planned:
+            return None
+        self._task = asyncio.create_task(self._replay(bot, dp, planned))
+        return self._task
+
+    async def _replay(self, bot: Bot, dp: Dispatcher, updates: List[Update]):
+        started = time.perf_counter()
+        interval = 1 / self.rate if self.rate > 0 else 0.0
+        # Последний апдейт игрока в обработке: следующий ждет его (порядок действий игрока)
+        tails: Dict[int, asyncio.Task] = {}
+        tasks = []
+
+        for index, update in enumerate(updates):
+            if self._stopped:
+                self.stats['not_replayed'] += len(updates) - index
+                break
+            user_id = _user_id(update)
+            task = asyncio.create_task(self._feed(bot, dp, update, tails.get(user_id)))
+            tails[user_id] = task
+            tasks.append(task)
+            if interval and not self._draining:
+                await asyncio.sleep(interval)
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"✅ Доиграно апдейтов: {self.stats['replayed']} за {time.perf_counter() - started:.1f} с "
+                    f"(ошибок: {self.stats['errors']}, не доиграно: {self.stats['not_replayed']})")
+
+    async def _feed(self, bot: Bot, dp: Dispatcher, update: Update, previous: Optional[asyncio.Task]):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            await dp.feed_update(bot, update)
+            self.stats['replayed'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"❌ Ошибка доигрывания апдейта {update.update_id}: {e}")
+
+    async def drain(self):
+        """Остановка процесса: оставшиеся апдейты доигрываются без паузы между ними"""
+        if self._task is None or self._task.done():
+            return
+        self._draining = True
+        logger.info("📬 Остановка: доигрываем оставшуюся очередь без ограничения скорости")
+        try:
+            await asyncio.shield(self._task)
+        except asyncio.CancelledError:
+            # Дедлайн остановки: начатые дорабатывают, новые не выдаются
+            self.stop()
+            raise
+
+    def stop(self):
+        """Прекращает выдачу новых апдейтов (начатые дорабатывают через utils.lifecycle)"""
+        self._stopped = True
+
+
+# Глобальный экземпляр
+backlog = BacklogReplayer(
+    enabled=os.getenv("BACKLOG_REPLAY", "1") == "1",
+    rate=float(os.getenv("BACKLOG_RATE", "20")),
+    max_updates=int(os.getenv("BACKLOG_MAX", "5000")),
+    max_age=float(os.getenv("BACKLOG_MAX_AGE", "600"))
+)
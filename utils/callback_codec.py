@@ -0,0 +1,298 @@
+"""
+Компактный формат callback_data для Ryabot Island
+Кнопки с параметрами раньше несли строки вида "hire_slot_business_4", а
+обработчики разбирали их сами (callback.data.split("_")). Теперь такие
+кнопки кодируются в несколько байт:
+
+    ~ <версия> <код действия> <поля>        "~1h14" = hire_slot(tier=business, slot=4)
+
+Версия и код действия - один символ base62, каждое поле - фиксированное число
+символов base62 (значение Choice - номер в списке, Int - смещение от нижней
+границы). Данные разбираются один раз во внешнем middleware dp.callback_query,
+обработчик получает аргумент payload (CallbackPayload) с типизированными полями.
+
+Правила изменения схемы:
+    - новые значения Choice добавляются только в конец списка
+    - новое поле, другой порядок полей или ширина поля - увеличить VERSION;
+      кнопки старых сообщений получат ответ "кнопка устарела"
+    - код действия не переиспользуется
+
+Кнопки старого формата (уже отправленные сообщения) разбираются по legacy-префиксу.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, F
+from aiogram.types import CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+BASE = len(ALPHABET)
+_DIGITS = {char: index for index, char in enumerate(ALPHABET)}
+
+MARKER = "~"
+VERSION = 1
+MAX_BYTES = 64   # ограничение Telegram на callback_data
+
+STALE_TEXT = "⌛ Кнопка устарела - откройте меню заново"
+
+
+class InvalidCallbackData(ValueError):
+    """callback_data в компактном формате, но не разбирается (другая версия, мусор)"""
+
+
+def _to_base(number: int, width: int) -> str:
+    chars = []
+    for _ in range(width):
+        number, digit = divmod(number, BASE)
+        chars.append(ALPHABET[digit])
+    if number:
+        raise ValueError("значение не помещается в поле")
+    return "".join(reversed(chars))
+
+
+def _from_base(text: str) -> int:
+    number = 0
+    for char in text:
+        digit = _DIGITS.get(char)
+        if digit is None:
+            raise InvalidCallbackData(f"недопустимый символ {char!r}")
+        number = number * BASE + digit
+    return number
+
+
+def _width(size: int) -> int:
+    width = 1
+    while BASE ** width < size:
+        width += 1
+    return width
+
+
+class Choice:
+    """Поле-перечисление: значение кодируется номером в списке"""
+
+    def __init__(self, *values: Any):
+        self.values = values
+        self._index = {value: index for index, value in enumerate(values)}
+        self._by_text = {str(value): value for value in values}
+        self.width = _width(len(values))
+
+    def encode(self, value: Any) -> int:
+        if value not in self._index:
+            raise ValueError(f"недопустимое значение {value!r}")
+        return self._index[value]
+
+    def decode(self, number: int) -> Any:
+        if number >= len(self.values):
+            raise InvalidCallbackData(f"номер значения {number} вне списка")
+        return self.values[number]
+
+    def parse(self, text: str) -> Any:
+        """Значение из кнопки старого формата"""
+        if text not in self._by_text:
+            raise InvalidCallbackData(f"недопустимое значение {text!r}")
+        return self._by_text[text]
+
+
+class Int:
+    """Целое поле в границах [low, high]"""
+
+    def __init__(self, low: int, high: int):
+        self.low = low
+        self.high = high
+        self.width = _width(high - low + 1)
+
+    def encode(self, value: int) -> int:
+        if not isinstance(value, int) or not self.low <= value <= self.high:
+            raise ValueError(f"значение {value!r} вне [{self.low}, {self.high}]")
+        return value - self.low
+
+    def decode(self, number: int) -> int:
+        return self._checked(number + self.low)
+
+    def parse(self, text: str) -> int:
+        """Значение из кнопки старого формата"""
+        try:
+            value = int(text)
+        except ValueError:
+            raise InvalidCallbackData(f"не число: {text!r}")
+        return self._checked(value)
+
+    def _checked(self, value: int) -> int:
+        if not self.low <= value <= self.high:
+            raise InvalidCallbackData(f"значение {value} вне [{self.low}, {self.high}]")
+        return value
+
+
+@dataclass(frozen=True)
+class CallbackPayload:
+    """Разобранные данные кнопки: payload.action, payload.<поле>"""
+    action: str
+    values: Dict[str, Any]
+    legacy: bool = False
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.__dict__["values"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class CallbackAction:
+    """Действие кнопки со схемой полей"""
+
+    def __init__(self, name: str, code: str, fields: Dict[str, Any], legacy: Optional[str] = None):
+        self.name = name
+        self.code = code
+        self.fields = fields
+        self.legacy = legacy
+        self.prefix = MARKER + ALPHABET[VERSION] + code
+        self.size = len(self.prefix) + sum(field.width for field in fields.values())
+        if self.size > MAX_BYTES:
+            raise ValueError(f"callback_data действия {name} длиннее {MAX_BYTES} байт")
+
+    def pack(self, **values: Any) -> str:
+        """callback_data для кнопки"""
+        if values.keys() != self.fields.keys():
+            raise ValueError(f"{self.name}: поля {sorted(self.fields)}, получены {sorted(values)}")
+        return self.prefix + "".join(
+            _to_base(field.encode(values[name]), field.width) for name, field in self.fields.items()
+        )
+
+    def unpack(self, body: str) -> CallbackPayload:
+        """Поля из части callback_data после префикса"""
+        if len(body) != self.size - len(self.prefix):
+            raise InvalidCallbackData(f"{self.name}: длина {len(body)}")
+        values, position = {}, 0
+        for name, field in self.fields.items():
+            values[name] = field.decode(_from_base(body[position:position + field.width]))
+            position += field.width
+        return CallbackPayload(self.name, values)
+
+    def unpack_legacy(self, rest: str) -> CallbackPayload:
+        """Поля из кнопки старого формата ("business_4" после "hire_slot_")"""
+        parts = rest.split("_")
+        if len(parts) != len(self.fields):
+            raise InvalidCallbackData(f"{self.name}: старый формат {rest!r}")
+        values = {name: field.parse(part) for (name, field), part in zip(self.fields.items(), parts)}
+        return CallbackPayload(self.name, values, legacy=True)
+
+    def filter(self):
+        """Фильтр обработчика (префиксы индексируются utils.callback_routing)"""
+        if self.legacy:
+            return F.data.startswith((self.prefix, self.legacy))
+        return F.data.startswith(self.prefix)
+
+
+class CallbackCodec:
+    """Реестр действий и разбор callback_data"""
+
+    def __init__(self):
+        self._by_code: Dict[str, CallbackAction] = {}
+        self._by_name: Dict[str, CallbackAction] = {}
+        self._legacy: List[Tuple[str, CallbackAction]] = []
+        self._legacy_prefixes: Tuple[str, ...] = ()
+
+        self.stats = {
+            'decoded': 0,
+            'legacy': 0,
+            'invalid': 0
+        }
+
+    def action(self, name: str, code: str, legacy: Optional[str] = None, **fields: Any) -> CallbackAction:
+        """Регистрирует действие (код - один символ base62, уникальный навсегда)"""
+        if len(code) != 1 or code not in _DIGITS:
+            raise ValueError(f"код действия {code!r} должен быть одним символом base62")
+        if code in self._by_code or name in self._by_name:
+            raise ValueError(f"действие {name} ({code}) уже зарегистрировано")
+
+        action = CallbackAction(name, code, fields, legacy)
+        self._by_code[code] = action
+        self._by_name[name] = action
+        if legacy:
+            self._legacy.append((legacy, action))
+            self._legacy_prefixes = tuple(prefix for prefix, _ in self._legacy)
+        return action
+
+    def action_name(self, data: str) -> Optional[str]:
+        """Имя действия без разбора полей (None - не компактный формат или неизвестный код)"""
+        if len(data) < 3 or data[0] != MARKER or data[1] != ALPHABET[VERSION]:
+            return None
+        action = self._by_code.get(data[2])
+        return action.name if action else None
+
+    def decode(self, data: Optional[str]) -> Optional[CallbackPayload]:
+        """
+        Разбор callback_data
+
+        Returns:
+            CallbackPayload или None - обычная кнопка без полей ("academy")
+        Raises:
+            InvalidCallbackData - кнопка другой версии схемы или поврежденные данные
+        """
+        if not data:
+            return None
+
+        if data[0] == MARKER:
+            if len(data) < 3 or data[1] != ALPHABET[VERSION]:
+                raise InvalidCallbackData(f"версия схемы {data[1:2]!r}, текущая {ALPHABET[VERSION]!r}")
+            action = self._by_code.get(data[2])
+            if action is None:
+                raise InvalidCallbackData(f"неизвестное действие {data[2]!r}")
+            payload = action.unpack(data[3:])
+            self.stats['decoded'] += 1
+            return payload
+
+        if self._legacy_prefixes and data.startswith(self._legacy_prefixes):
+            for prefix, action in self._legacy:
+                if data.startswith(prefix):
+                    payload = action.unpack_legacy(data[len(prefix):])
+                    self.stats['legacy'] += 1
+                    return payload
+        return None
+
+
+class CallbackCodecMiddleware(BaseMiddleware):
+    """Внешний middleware dp.callback_query: разбирает callback_data в data["payload"]"""
+
+    def __init__(self, codec: CallbackCodec):
+        self.codec = codec
+
+    async def __call__(
+            self,
+            handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+            event: CallbackQuery,
+            data: Dict[str, Any]
+    ) -> Any:
+        try:
+            payload = self.codec.decode(event.data)
+        except InvalidCallbackData as e:
+            self.codec.stats['invalid'] += 1
+            logger.debug(f"Устаревшая кнопка {event.data!r} от {event.from_user.id}: {e}")
+            try:
+                await event.answer(STALE_TEXT, show_alert=True)
+            except Exception as answer_error:
+                logger.debug(f"Ответ на устаревшую кнопку не отправлен: {answer_error}")
+            return None
+
+        if payload is not None:
+            data["payload"] = payload
+        return await handler(event, data)
+
+
+# Глобальный реестр
+callback_codec = CallbackCodec()
+
+# Схема кнопок. Списки значений - только дописывать в конец (номер значения - часть формата)
+SLOT_TIERS = ("free", "business", "quantum")
+PROFESSIONS = ("builder", "farmer", "woodman", "soldier", "fisherman", "scientist", "cook", "teacher", "doctor")
+
+HIRE_SLOT = callback_codec.action("hire_slot", "h", legacy="hire_slot_", tier=Choice(*SLOT_TIERS), slot=Int(0, 61))
+HIRE_COOLDOWN = callback_codec.action("cooldown", "c", legacy="cooldown_", tier=Choice(*SLOT_TIERS), slot=Int(0, 61))
+SLOT_HEADER = callback_codec.action("slot_header", "s", legacy="slot_header_", slot=Int(1, 62))
+TRAIN = callback_codec.action("train", "t", legacy="train_", profession=Choice(*PROFESSIONS))
+START_EXPEDITION = callback_codec.action("start_expedition", "x", zone=Int(1, 61))
+
+callback_codec_middleware = CallbackCodecMiddleware(callback_codec)
@@ -0,0 +1,228 @@
+"""
+Таблица маршрутизации callback_data для Ryabot Island
+aiogram проверяет фильтры всех обработчиков всех роутеров по порядку, пока
+один не подойдет: стоимость нажатия кнопки растет с числом кнопок. Таблица
+один раз разбирает фильтры F.data == "x", F.data.in_([...]) и
+F.data.startswith("p") и индексирует обработчики: точные значения - в словаре,
+префиксы - в префиксном дереве. На нажатие проверяются только кандидаты из
+индекса (и обработчики без разобранного фильтра) в исходном порядке aiogram,
+так что выбранный обработчик и его middleware те же, что без таблицы.
+
+Подключается внешним middleware dp.callback_query (CALLBACK_ROUTING=0 - выключить).
+Сравнение с линейной проверкой: python -m benchmarks.routing_bench
+"""
+import os
+import operator
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware, Router
+from aiogram.dispatcher.event.bases import UNHANDLED, SkipHandler
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.dispatcher.event.telegram import TelegramEventObserver
+from aiogram.types import CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    """Обработчик (или непрозрачный роутер) на своем месте в порядке обхода aiogram"""
+    router: Router
+    observer: TelegramEventObserver
+    handler: Optional[HandlerObject] = None   # None - роутер, который нельзя пропустить
+
+
+@dataclass
+class _TrieNode:
+    children: Dict[str, "_TrieNode"] = field(default_factory=dict)
+    entries: List[int] = field(default_factory=list)
+
+
+def _data_keys(handler: HandlerObject) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    Точные значения и префиксы callback_data из фильтров обработчика
+    None - фильтр не разобран (обработчик проверяется на каждое нажатие)
+    """
+    for event_filter in handler.filters or ():
+        magic = getattr(event_filter, "magic", None)
+        operations = getattr(magic, "_operations", None)
+        if not operations or getattr(operations[0], "name", None) != "data":
+            continue
+
+        rest = operations[1:]
+        kinds = [type(op).__name__ for op in rest]
+        if kinds == ["ComparatorOperation"] and rest[0].comparator is operator.eq \
+                and isinstance(rest[0].right, str):
+            return [rest[0].right], []
+        if kinds == ["FunctionOperation"] and getattr(rest[0].function, "__name__", "") == "in_op" \
+                and len(rest[0].args) == 1:
+            values = rest[0].args[0]
+            if all(isinstance(value, str) for value in values):
+                return list(values), []
+        if kinds == ["GetAttributeOperation", "CallOperation"] and rest[0].name == "startswith" \
+                and not rest[1].kwargs and len(rest[1].args) == 1:
+            prefixes = rest[1].args[0]
+            prefixes = (prefixes,) if isinstance(prefixes, str) else prefixes
+            if all(isinstance(prefix, str) for prefix in prefixes):
+                return [], list(prefixes)
+    return None
+
+
+def _transparent(observer: TelegramEventObserver) -> bool:
+    """Роутер можно пропустить: нет своих root-фильтров и внешних middleware (кроме сквозных)"""
+    if observer._handler.filters:
+        return False
+    return all(getattr(middleware, "passthrough", False) for middleware in observer.outer_middleware)
+
+
+class CallbackRoutingTable:
+    """Индекс обработчиков callback_query по callback_data"""
+
+    def __init__(self):
+        self._entries: List[_Entry] = []
+        self._exact: Dict[str, List[int]] = {}
+        self._trie = _TrieNode()
+        self._always: List[int] = []
+        self._built_for: Optional[Router] = None
+
+        self.stats = {
+            'routed': 0,
+            'fallback': 0,
+            'descended': 0,
+            'candidates_checked': 0,
+            'builds': 0
+        }
+
+    # ---------- Построение ----------
+
+    def invalidate(self):
+        """Роутеры изменились (ленивая загрузка модуля) - таблица перестроится на следующем нажатии"""
+        self._built_for = None
+
+    def build(self, root: Router):
+        self._entries, self._exact, self._trie, self._always = [], {}, _TrieNode(), []
+        self._walk(root, True)
+        self._built_for = root
+        self.stats['builds'] += 1
+
+    def _walk(self, router: Router, is_root: bool):
+        observer = router.observers["callback_query"]
+        if not is_root and not _transparent(observer):
+            # Фильтры и внешние middleware роутера должны выполниться - внутри него обычный обход aiogram
+            self._always.append(self._add(_Entry(router, observer)))
+            return
+
+        for handler in observer.handlers:
+            index = self._add(_Entry(router, observer, handler))
+            keys = _data_keys(handler)
+            if keys is None:
+                self._always.append(index)
+                continue
+            exact, prefixes = keys
+            for value in exact:
+                self._exact.setdefault(value, []).append(index)
+            for prefix in prefixes:
+                node = self._trie
+                for char in prefix:
+                    node = node.children.setdefault(char, _TrieNode())
+                node.entries.append(index)
+
+        for sub_router in router.sub_routers:
+            self._walk(sub_router, False)
+
+    def _add(self, entry: _Entry) -> int:
+        self._entries.append(entry)
+        return len(self._entries) - 1
+
+    # ---------- Поиск ----------
+
+    def candidates(self, data: str) -> List[int]:
+        """Номера записей, которые могут обработать callback_data, в порядке aiogram"""
+        found = list(self._always)
+        found.extend(self._exact.get(data, ()))
+        node = self._trie
+        found.extend(node.entries)
+        for char in data:
+            node = node.children.get(char)
+            if node is None:
+                break
+            found.extend(node.entries)
+        found.sort()
+        return found
+
+    async def route(self, root: Router, event: CallbackQuery, data: Dict[str, Any],
+                    fallback: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]]) -> Any:
+        """Вызов обработчика нажатия как в TelegramEventObserver.trigger, но только по кандидатам"""
+        if self._built_for is not root:
+            self.build(root)
+
+        if root.observers["callback_query"]._handler.filters:
+            self.stats['fallback'] += 1
+            return await fallback(event, data)
+
+        for index in self.candidates(event.data or ""):
+            entry = self._entries[index]
+            if entry.handler is None:
+                # Роутер, который нельзя пропустить: обычный обход aiogram только внутри него
+                # (полный обход повторил бы уже выполненные и пропущенные через SkipHandler обработчики)
+                self.stats['descended'] += 1
+                response = await entry.router.propagate_event("callback_query", event, **data)
+                if response is not UNHANDLED:
+                    return response
+                continue
+
+            self.stats['candidates_checked'] += 1
+            kwargs = {**data, "event_router": entry.router, "handler": entry.handler}
+            result, check_data = await entry.handler.check(event, **kwargs)
+            if not result:
+                continue
+            kwargs.update(check_data)
+            try:
+                wrapped = entry.observer.outer_middleware.wrap_middlewares(
+                    entry.observer._resolve_middlewares(),
+                    entry.handler.call,
+                )
+                self.stats['routed'] += 1
+                return await wrapped(event, kwargs)
+            except SkipHandler:
+                continue
+
+        return UNHANDLED
+
+    def snapshot(self) -> dict:
+        return {
+            'handlers': sum(1 for entry in self._entries if entry.handler is not None),
+            'exact_keys': len(self._exact),
+            'unindexed': len(self._always),
+            **self.stats
+        }
+
+
+class CallbackRoutingMiddleware(BaseMiddleware):
+    """Внешний middleware dp.callback_query: маршрутизация по таблице вместо перебора роутеров"""
+
+    def __init__(self, table: CallbackRoutingTable, root: Router):
+        self.table = table
+        self.root = root
+
+    async def __call__(
+            self,
+            handler: Callable[[CallbackQuery, Dict[str, Any]], Awaitable[Any]],
+            event: CallbackQuery,
+            data: Dict[str, Any]
+    ) -> Any:
+        return await self.table.route(self.root, event, data, handler)
+
+
+# Глобальная таблица
+callback_routing = CallbackRoutingTable()
+
+
+def setup_callback_routing(dp) -> bool:
+    """Подключает таблицу маршрутизации нажатий (CALLBACK_ROUTING=0 - обычный обход aiogram)"""
+    if os.getenv("CALLBACK_ROUTING", "1") != "1":
+        return False
+    dp.callback_query.outer_middleware(CallbackRoutingMiddleware(callback_routing, dp))
+    return True
@@ -0,0 +1,196 @@
+"""
+Учет запросов к БД для Ryabot Island
+Каждый вызов SupabaseManager.execute_query/execute_rpc записывается в общий
+реестр (таблица/операция, гистограмма задержки) и в счетчик текущего апдейта
+(ContextVar, который открывает DBAccountingMiddleware). Обработчик может
+объявить бюджет запросов через @query_budget - превышение логируется, а в
+строгом режиме (DB_BUDGET_STRICT=1, тесты и бенчмарки) - падает
+"""
+import os
+import bisect
+import logging
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Tuple, Callable
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержки (мс); последняя корзина - все, что больше
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Обработчик сделал больше запросов к БД, чем объявлено в @query_budget"""
+
+
+@dataclass
+class UpdateDBStats:
+    """Запросы к БД в рамках одного апдейта"""
+    calls: int = 0
+    duration_ms: float = 0.0
+    by_operation: Counter = field(default_factory=Counter)
+
+    def add(self, table: str, operation: str, duration_ms: float):
+        self.calls += 1
+        self.duration_ms += duration_ms
+        self.by_operation[f"{table}.{operation}"] += 1
+
+
+class LatencyHistogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    __slots__ = ("counts", "total", "sum_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, value_ms)] += 1
+        self.total += 1
+        self.sum_ms += value_ms
+
+    def to_dict(self) -> dict:
+        return {
+            'buckets': dict(zip([*map(str, LATENCY_BUCKETS_MS), "+Inf"], self.counts)),
+            'count': self.total,
+            'avg_ms': round(self.sum_ms / self.total, 3) if self.total else 0.0
+        }
+
+
+_current_update: ContextVar[Optional[UpdateDBStats]] = ContextVar("db_update_stats", default=None)
+
+
+class DBMetrics:
+    """Общий реестр запросов к БД (только счетчики, без блокировок - все в одном event loop)"""
+
+    def __init__(self, strict: bool = False):
+        self.strict = strict
+        self.reset()
+
+    def reset(self):
+        self.calls: Counter = Counter()                                   # "table.operation" -> вызовы
+        self.coalesced: Counter = Counter()                               # склеенные singleflight вызовы
+        self.latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)  # операция -> гистограмма
+        self.handlers: Dict[str, dict] = {}                               # обработчик -> сводка
+        self.budget_violations: Counter = Counter()
+        self.updates = 0
+        self.update_calls = 0
+
+    # ---------- Запись ----------
+
+    def record(self, table: str, operation: str, duration_ms: float):
+        """Вызывается SupabaseManager на каждый запрос"""
+        key = f"{table}.{operation}"
+        self.calls[key] += 1
+        self.latency[operation].observe(duration_ms)
+
+        current = _current_update.get()
+        if current is not None:
+            current.add(table, operation, duration_ms)
+
+    def record_coalesced(self, table: str, operation: str, count: int = 1):
+        """Вызов получил результат одновременного такого же или пакетного запроса (в БД не ходил)"""
+        self.coalesced[f"{table}.{operation}"] += count
+
+    def attribute(self, table: str, operation: str, duration_ms: float):
+        """Чтение через общий запрос (database.batch_loader) - только в счетчик текущего апдейта"""
+        current = _current_update.get()
+        if current is not None:
+            current.add(table, operation, duration_ms)
+
+    def finish_update(self, handler_name: str, stats: UpdateDBStats, budget: Optional[int] = None):
+        """Итог апдейта: сводка по обработчику и проверка бюджета"""
+        self.updates += 1
+        self.update_calls += stats.calls
+
+        summary = self.handlers.get(handler_name)
+        if summary is None:
+            summary = self.handlers[handler_name] = {'updates': 0, 'calls': 0, 'max_calls': 0, 'db_ms': 0.0}
+        summary['updates'] += 1
+        summary['calls'] += stats.calls
+        summary['max_calls'] = max(summary['max_calls'], stats.calls)
+        summary['db_ms'] += stats.duration_ms
+
+        if budget is not None and stats.calls > budget:
+            self.budget_violations[handler_name] += 1
+            details = ", ".join(f"{key}x{count}" for key, count in stats.by_operation.most_common())
+            message = f"{handler_name}: {stats.calls} запросов к БД при бюджете {budget} ({details})"
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(f"🗄️ Превышен бюджет запросов {message}")
+
+    # ---------- Чтение ----------
+
+    def snapshot(self) -> dict:
+        """Сводка для /metrics/db"""
+        return {
+            'updates': self.updates,
+            'calls_per_update': round(self.update_calls / self.updates, 2) if self.updates else 0.0,
+            'calls': dict(self.calls.most_common()),
+            'coalesced': dict(self.coalesced.most_common()),
+            'latency_ms': {operation: histogram.to_dict() for operation, histogram in self.latency.items()},
+            'handlers': {
+                name: {
+                    **summary,
+                    'avg_calls': round(summary['calls'] / summary['updates'], 2),
+                    'db_ms': round(summary['db_ms'], 3)
+                }
+                for name, summary in sorted(self.handlers.items(), key=lambda item: -item[1]['calls'])
+            },
+            'budget_violations': dict(self.budget_violations)
+        }
+
+
+# Глобальный экземпляр
+db_metrics = DBMetrics(strict=os.getenv("DB_BUDGET_STRICT", "0") == "1")
+
+
+def begin_update() -> Tuple[UpdateDBStats, object]:
+    """Открывает счетчик запросов для текущего апдейта (возвращает токен для end_update)"""
+    stats = UpdateDBStats()
+    return stats, _current_update.set(stats)
+
+
+def end_update(token: object):
+    """Закрывает счетчик текущего апдейта"""
+    _current_update.reset(token)
+
+
+def current_update_stats() -> Optional[UpdateDBStats]:
+    """Счетчик запросов текущего апдейта (None вне апдейта)"""
+    return _current_update.get()
+
+
+def query_budget(max_calls: int) -> Callable:
+    """
+    Объявляет бюджет запросов к БД для обработчика (вместе с middleware энергии)
+
+    Использование:
+        @router.callback_query(F.data == "academy")
+        @query_budget(4)
+        async def academy_menu(callback): ...
+    """
+    def decorator(handler: Callable) -> Callable:
+        handler.__query_budget__ = max_calls
+        return handler
+    return decorator
+
+
+@contextmanager
+def track_queries(max_calls: Optional[int] = None, name: str = "block"):
+    """
+    Счетчик запросов вне апдейта (фоновые задачи, тесты)
+
+        with track_queries(max_calls=2) as stats:
+            await get_user(user_id)
+    """
+    stats, token = begin_update()
+    try:
+        yield stats
+    finally:
+        end_update(token)
+    db_metrics.finish_update(name, stats, max_calls)
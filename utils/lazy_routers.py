@@ -0,0 +1,309 @@
+"""
+Ленивая загрузка роутеров Ryabot Island
+Модули handlers тянут database.models, utils.texts, клавиатуры и игровые
+движки - холодный старт webhook-воркера тратит на это сотни миллисекунд.
+
+В ленивом режиме (LAZY_ROUTERS=1) манифест строится разбором исходников
+handlers/*.py через ast, без импорта: из декораторов @router.message /
+@router.callback_query берутся команды, тексты и callback_data. Вместо
+модуля в диспетчер подключается пустой LazyRouter на его месте в порядке
+приоритета; модуль импортируется при первом апдейте, который подходит под
+манифест, и его роутер включается внутрь заглушки. Фильтры кнопок в компактном
+формате (HIRE_SLOT.filter() и т.п. из utils.callback_codec) дают префиксы
+действия. Декоратор, который не удалось разобрать, делает модуль "жадным" для
+своего типа апдейтов.
+
+В обоих режимах время импорта каждого модуля попадает в import_report()
+"""
+import os
+import ast
+import time
+import logging
+import importlib
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Any, Awaitable, List, Optional, Set, Tuple
+from aiogram import BaseMiddleware, Router
+from aiogram.types import TelegramObject, Message, CallbackQuery
+
+from utils import callback_codec
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Модули с роутерами в порядке приоритета
+HANDLER_MODULES: Tuple[str, ...] = (
+    'handlers.start',
+    'handlers.academy',
+    'handlers.expedition',
+    'handlers.town',
+    'handlers.farm',
+    'handlers.work',
+    'handlers.citizen',
+    'handlers.storage',
+    'handlers.rankings',
+    'handlers.referral',
+    'handlers.about',
+    'handlers.admin',
+)
+
+# Время импорта модулей: модуль -> (мс, режим)
+_import_times: Dict[str, Tuple[float, str]] = {}
+
+
+@dataclass
+class RouterManifest:
+    """Что обрабатывает модуль (по декораторам в исходнике)"""
+    module: str
+    commands: Set[str] = field(default_factory=set)
+    texts: Set[str] = field(default_factory=set)
+    callbacks: Set[str] = field(default_factory=set)
+    callback_prefixes: Tuple[str, ...] = ()
+    any_message: bool = False
+    any_callback: bool = False
+
+    def matches(self, event: TelegramObject) -> bool:
+        if isinstance(event, Message):
+            if self.any_message:
+                return True
+            text = event.text or ""
+            if text in self.texts:
+                return True
+            if text.startswith("/") and self.commands:
+                command = text[1:].split(maxsplit=1)[0].split("@", 1)[0] if len(text) > 1 else ""
+                return command in self.commands
+            return False
+
+        if isinstance(event, CallbackQuery):
+            if self.any_callback:
+                return True
+            data = event.data or ""
+            return data in self.callbacks or data.startswith(self.callback_prefixes)
+
+        return False
+
+
+def _literal_strings(node: ast.AST) -> Optional[List[str]]:
+    """Строка или список/кортеж строк; None - не литерал"""
+    try:
+        value = ast.literal_eval(node)
+    except ValueError:
+        return None
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, (list, tuple, set)) and all(isinstance(item, str) for item in value):
+        return list(value)
+    return None
+
+
+def _magic_attr(node: ast.AST) -> Optional[str]:
+    """F.text / F.data -> 'text' / 'data'"""
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "F":
+        return node.attr
+    return None
+
+
+def _parse_filter(manifest: RouterManifest, kind: str, node: ast.AST) -> bool:
+    """Добавляет фильтр в манифест; False - фильтр не распознан"""
+    # Command("start")
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "Command":
+        commands = [name for arg in node.args for name in (_literal_strings(arg) or [])]
+        manifest.commands.update(commands)
+        return bool(commands) and kind == "message"
+
+    # F.text == "..." / F.data == "..."
+    if isinstance(node, ast.Compare) and len(node.ops) == 1 and isinstance(node.ops[0], ast.Eq):
+        attr, values = _magic_attr(node.left), _literal_strings(node.comparators[0])
+        if values is None:
+            return False
+        if attr == "text" and kind == "message":
+            manifest.texts.update(values)
+            return True
+        if attr == "data" and kind == "callback_query":
+            manifest.callbacks.update(values)
+            return True
+        return False
+
+    # HIRE_SLOT.filter() - действие utils.callback_codec (имя как в модуле кодека)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "filter" \
+            and isinstance(node.func.value, ast.Name) and not node.args and not node.keywords:
+        action = getattr(callback_codec, node.func.value.id, None)
+        if not isinstance(action, callback_codec.CallbackAction) or kind != "callback_query":
+            return False
+        manifest.callback_prefixes += tuple(prefix for prefix in (action.prefix, action.legacy) if prefix)
+        return True
+
+    # F.text.in_([...]) / F.data.in_([...]) / F.data.startswith("...")
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and len(node.args) == 1:
+        attr, method = _magic_attr(node.func.value), node.func.attr
+        values = _literal_strings(node.args[0])
+        if values is None:
+            return False
+        if method == "in_" and attr == "text" and kind == "message":
+            manifest.texts.update(values)
+            return True
+        if method == "in_" and attr == "data" and kind == "callback_query":
+            manifest.callbacks.update(values)
+            return True
+        if method == "startswith" and attr == "data" and kind == "callback_query":
+            manifest.callback_prefixes += tuple(values)
+            return True
+
+    return False
+
+
+def build_manifest(module: str) -> RouterManifest:
+    """Манифест модуля по его исходнику (без импорта)"""
+    manifest = RouterManifest(module)
+    path = os.path.join(_PROJECT_ROOT, *module.split(".")) + ".py"
+
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator in node.decorator_list:
+            if not (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute)):
+                continue
+            kind = decorator.func.attr
+            target = decorator.func.value
+            if kind not in ("message", "callback_query") or not (isinstance(target, ast.Name) and target.id == "router"):
+                continue
+
+            parsed = len(decorator.args) == 1 and not decorator.keywords and \
+                _parse_filter(manifest, kind, decorator.args[0])
+            if not parsed:
+                # Неизвестный фильтр (состояние FSM, свой фильтр...) - загружаемся на любой апдейт этого типа
+                if kind == "message":
+                    manifest.any_message = True
+                else:
+                    manifest.any_callback = True
+                logger.debug(f"Ленивый роутер {module}: фильтр {node.name} не распознан")
+
+    return manifest
+
+
+def _import_module(module: str, mode: str):
+    started = time.perf_counter()
+    imported = importlib.import_module(module)
+    _import_times[module] = ((time.perf_counter() - started) * 1000, mode)
+    return imported
+
+
+class _LazyLoadMiddleware(BaseMiddleware):
+    """Внешний middleware заглушки: загрузка модуля на первом подходящем апдейте"""
+
+    def __init__(self, lazy_router: "LazyRouter"):
+        self.lazy_router = lazy_router
+
+    @property
+    def passthrough(self) -> bool:
+        """После загрузки модуля middleware ничего не делает (utils.callback_routing его пропускает)"""
+        return self.lazy_router.loaded
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if not self.lazy_router.loaded and self.lazy_router.manifest.matches(event):
+            self.lazy_router.load()
+        return await handler(event, data)
+
+
+class LazyRouter(Router):
+    """Заглушка роутера модуля handlers на его месте в порядке приоритета"""
+
+    def __init__(self, manifest: RouterManifest):
+        super().__init__(name=f"lazy:{manifest.module}")
+        self.manifest = manifest
+        self.loaded = False
+
+        loader = _LazyLoadMiddleware(self)
+        self.message.outer_middleware(loader)
+        self.callback_query.outer_middleware(loader)
+
+    def load(self) -> bool:
+        """Импорт модуля и подключение его роутера внутрь заглушки"""
+        if self.loaded:
+            return True
+        self.loaded = True
+
+        try:
+            module = _import_module(self.manifest.module, "lazy")
+        except Exception as e:
+            logger.error(f"❌ Ленивая загрузка {self.manifest.module}: {e}")
+            return False
+
+        router = getattr(module, "router", None)
+        if router is None:
+            logger.warning(f"⚠️ {self.manifest.module} - router отсутствует")
+            return False
+
+        self.include_router(router)
+        from utils.callback_routing import callback_routing
+        callback_routing.invalidate()
+        logger.info(f"📦 Загружен {self.manifest.module} ({_import_times[self.manifest.module][0]:.0f} мс)")
+        return True
+
+
+def include_handler_routers(dp, modules: Tuple[str, ...] = HANDLER_MODULES, lazy: bool = None) -> int:
+    """
+    Подключает роутеры handlers к диспетчеру
+
+    Args:
+        lazy: ленивый режим; по умолчанию из LAZY_ROUTERS
+
+    Returns:
+        количество подключенных роутеров (заглушек в ленивом режиме)
+    """
+    if lazy is None:
+        lazy = os.getenv("LAZY_ROUTERS", "0") == "1"
+
+    included = 0
+    for module_path in modules:
+        name = module_path.rsplit(".", 1)[-1].capitalize()
+        try:
+            if lazy:
+                manifest = build_manifest(module_path)
+                if not (manifest.commands or manifest.texts or manifest.callbacks or manifest.callback_prefixes
+                        or manifest.any_message or manifest.any_callback):
+                    logger.info(f"   💤 {name} модуль - обработчиков нет, не загружается")
+                    continue
+                dp.include_router(LazyRouter(manifest))
+                logger.info(f"   💤 {name} модуль (ленивый)")
+            else:
+                module = _import_module(module_path, "eager")
+                if not hasattr(module, "router"):
+                    logger.warning(f"   ⚠️ {name} модуль - router отсутствует")
+                    continue
+                dp.include_router(module.router)
+                logger.info(f"   ✅ {name} модуль")
+            included += 1
+
+        except ImportError as e:
+            logger.warning(f"   ⚠️ {name} модуль - ошибка импорта: {e}")
+        except Exception as e:
+            logger.error(f"   ❌ {name} модуль - критическая ошибка: {e}")
+
+    return included
+
+
+def import_report() -> List[dict]:
+    """Время импорта модулей handlers (первый импорт оплачивает и общие зависимости)"""
+    return [
+        {'module': module, 'ms': round(ms, 1), 'mode': mode}
+        for module, (ms, mode) in sorted(_import_times.items(), key=lambda item: -item[1][0])
+    ]
+
+
+def log_import_report():
+    report = import_report()
+    if not report:
+        return
+    total = sum(item['ms'] for item in report)
+    logger.info(f"⏱️ Импорт модулей handlers: {total:.0f} мс")
+    for item in report[:5]:
+        logger.info(f"   {item['ms']:7.1f} мс  {item['module']}")
@@ -0,0 +1,154 @@
+"""
+Жизненный цикл процесса Ryabot Island
+Остановка без потерь для rolling restart под нагрузкой:
+1. прием новых апдейтов прекращается (polling останавливается, webhook
+   отвечает 503 - Telegram повторит доставку на другой экземпляр); в webhook
+   это происходит уже по сигналу (stop_intake), до того как uvicorn начнет
+   дожидаться открытых запросов
+2. апдейты в обработке дорабатывают до дедлайна (SHUTDOWN_DRAIN_TIMEOUT)
+3. по порядку сбрасываются буферы: доигрывание уже забранной очереди,
+   начатые отправки, пакет реферальных бонусов, резерв эмиссии RBTC
+4. после этого можно закрывать сессию бота и выходить
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Callable, Awaitable, List, Optional, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """Учет апдейтов в обработке и упорядоченная остановка"""
+
+    def __init__(self, drain_timeout: float = 25.0):
+        """
+        Args:
+            drain_timeout: общий дедлайн остановки (секунды): ожидание апдейтов и сброс буферов
+        """
+        self.drain_timeout = drain_timeout
+        self.accepting = True
+        self.in_flight = 0
+
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._stop_intake: List[Callable[[], Any]] = []
+        self._intake_tasks: List[asyncio.Future] = []
+        self._flushers: List[Tuple[str, Callable[[], Awaitable[Any]]]] = []
+        self._shutdown_done = False
+
+        self.stats = {
+            'updates': 0,
+            'rejected': 0,
+            'dropped_on_shutdown': 0
+        }
+
+    # ---------- Регистрация ----------
+
+    def on_stop_intake(self, callback: Callable[[], Any]):
+        """Действие для прекращения приема апдейтов (например dp.stop_polling)"""
+        self._stop_intake.append(callback)
+
+    def add_flusher(self, name: str, flush: Callable[[], Awaitable[Any]], first: bool = False):
+        """
+        Сброс буфера при остановке; выполняются по порядку регистрации
+
+        Args:
+            first: выполнить раньше уже зарегистрированных (работа, которая сама наполняет буферы)
+        """
+        if first:
+            self._flushers.insert(0, (name, flush))
+        else:
+            self._flushers.append((name, flush))
+
+    # ---------- Апдейты ----------
+
+    def update_started(self):
+        self.in_flight += 1
+        self.stats['updates'] += 1
+        self._idle.clear()
+
+    def update_finished(self):
+        self.in_flight -= 1
+        if self.in_flight <= 0:
+            self.in_flight = 0
+            self._idle.set()
+
+    # ---------- Остановка ----------
+
+    def stop_intake(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """
+        Прекращение приема апдейтов (повторный вызов ничего не делает)
+        Можно вызывать из обработчика сигнала: действия остановки ставятся в event loop
+        """
+        if not self.accepting:
+            return
+        self.accepting = False
+        logger.info("🛑 Прием апдейтов остановлен")
+
+        loop = loop or asyncio.get_running_loop()
+        loop.call_soon_threadsafe(self._run_stop_intake)
+
+    def _run_stop_intake(self):
+        for callback in self._stop_intake:
+            try:
+                result = callback()
+                if asyncio.iscoroutine(result):
+                    self._intake_tasks.append(asyncio.ensure_future(result))
+            except Exception as e:
+                logger.warning(f"⚠️ Остановка приема апдейтов: {e}")
+
+    async def shutdown(self):
+        """Прекращение приема, ожидание апдейтов, сброс буферов (повторный вызов ничего не делает)"""
+        if self._shutdown_done:
+            return
+        self._shutdown_done = True
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        started = time.perf_counter()
+
+        self.stop_intake(loop)
+        # Действия остановки приема выполняются следующей итерацией цикла
+        await asyncio.sleep(0)
+        for result in await asyncio.gather(*self._intake_tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.warning(f"⚠️ Остановка приема апдейтов: {result}")
+
+        if self.in_flight:
+            logger.info(f"⏳ Ожидание {self.in_flight} апдейтов в обработке...")
+            try:
+                await asyncio.wait_for(self._idle.wait(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                self.stats['dropped_on_shutdown'] = self.in_flight
+                logger.error(f"❌ Дедлайн остановки: {self.in_flight} апдейтов не завершились")
+
+        for name, flush in self._flushers:
+            remaining = max(0.1, deadline - loop.time())
+            try:
+                await asyncio.wait_for(flush(), remaining)
+                logger.info(f"✅ Сброшено: {name}")
+            except asyncio.TimeoutError:
+                logger.error(f"❌ Сброс {name}: дедлайн остановки")
+            except Exception as e:
+                logger.error(f"❌ Сброс {name}: {e}")
+
+        logger.info(f"🧹 Остановка за {(time.perf_counter() - started) * 1000:.0f} мс "
+                    f"(апдейтов: {self.stats['updates']}, отклонено: {self.stats['rejected']}, "
+                    f"не дождались: {self.stats['dropped_on_shutdown']})")
+
+
+# Глобальный экземпляр
+lifecycle = Lifecycle(drain_timeout=float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "25")))
+
+
+def register_default_flushers():
+    """Буферы игры в порядке сброса: начатые отправки, реферальные бонусы, резерв RBTC"""
+    from game.referrals import referral_batcher
+    from game.rbtc import rbtc_emission
+    from utils.message_helper import drain_sends
+
+    lifecycle.add_flusher("отправки сообщений", lambda: drain_sends(lifecycle.drain_timeout))
+    lifecycle.add_flusher("реферальные бонусы", referral_batcher.flush)
+    lifecycle.add_flusher("резерв эмиссии RBTC", rbtc_emission.close)
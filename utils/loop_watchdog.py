@@ -0,0 +1,199 @@
+"""
+Сторож event loop для Ryabot Island
+Синхронные вызовы Supabase SDK внутри корутин блокируют весь бот. Сторож
+состоит из двух частей:
+- heartbeat-корутина в loop отмечается каждые interval секунд и измеряет
+  задержку event loop (метрики ryabot_event_loop_lag_*)
+- поток-наблюдатель: если heartbeat не отметился дольше threshold, снимает
+  стек потока event loop и находит в нем апдейт (тип, callback_data, текст)
+
+Итог - топ мест в коде, блокирующих loop, с примером апдейта
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from dataclasses import dataclass, field
+from typing import Optional, Dict, List
+from aiogram.types import Update, Message, CallbackQuery
+from utils.metrics import loop_lag, loop_lag_max, metrics
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+stalls_total = metrics.counter("ryabot_event_loop_stalls_total", "Блокировки event loop дольше порога")
+
+
+@dataclass
+class SlowSpot:
+    """Место в коде, на котором event loop стоял дольше порога"""
+    location: str
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    last_update: str = ""
+    last_stack: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            'location': self.location,
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 1),
+            'max_ms': round(self.max * 1000, 1),
+            'last_update': self.last_update,
+            'last_stack': self.last_stack
+        }
+
+
+def describe_update(obj) -> Optional[str]:
+    """Короткое описание апдейта для отчета"""
+    if isinstance(obj, Update):
+        obj = obj.event
+    if isinstance(obj, CallbackQuery):
+        return f"callback_query data={obj.data!r} user={obj.from_user.id}"
+    if isinstance(obj, Message):
+        text = (obj.text or "")[:40]
+        return f"message text={text!r} user={obj.from_user.id if obj.from_user else None}"
+    return None
+
+
+def _is_project_frame(filename: str) -> bool:
+    return filename.startswith(_PROJECT_ROOT) and "site-packages" not in filename and filename != __file__
+
+
+class LoopWatchdog:
+    """Heartbeat в event loop + поток, снимающий стек при блокировке"""
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.05, top_size: int = 50):
+        """
+        Args:
+            threshold: блокировка дольше этого (секунды) считается медленной
+            interval: период heartbeat (секунды)
+            top_size: сколько мест хранить в топе
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.top_size = top_size
+
+        self.spots: Dict[str, SlowSpot] = {}
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._pending: Optional[tuple] = None  # (место, описание апдейта, стек) текущей блокировки
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------- Запуск ----------
+
+    def start(self):
+        """Запуск из работающего event loop"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+
+        # Без порога только измеряем задержку, стеки не снимаем
+        if self.threshold > 0:
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+            logger.info(f"🐶 Сторож event loop запущен (порог {self.threshold * 1000:.0f} мс)")
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # ---------- Heartbeat (в event loop) ----------
+
+    async def _heartbeat(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+
+            lag = max(0.0, now - started - self.interval)
+            loop_lag.set(lag)
+            if lag > loop_lag_max.get():
+                loop_lag_max.set(lag)
+
+            if self._pending is not None:
+                self._finish_stall(lag)
+
+    def _finish_stall(self, duration: float):
+        location, update, stack = self._pending
+        self._pending = None
+
+        spot = self.spots.get(location)
+        if spot is None:
+            if len(self.spots) >= self.top_size:
+                # Вытесняем наименее значимое место
+                del self.spots[min(self.spots.values(), key=lambda item: item.total).location]
+            spot = self.spots[location] = SlowSpot(location)
+
+        spot.count += 1
+        spot.total += duration
+        spot.max = max(spot.max, duration)
+        spot.last_update = update
+        spot.last_stack = stack
+        stalls_total.inc()
+
+        logger.warning(f"🐢 Event loop заблокирован на {duration * 1000:.0f} мс: {location} ({update or 'вне апдейта'})")
+
+    # ---------- Наблюдатель (отдельный поток) ----------
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            if self._pending is not None:
+                continue
+            if time.monotonic() - self._last_beat < self.threshold:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._pending = self._capture(frame)
+
+    @staticmethod
+    def _capture(frame) -> tuple:
+        """Стек потока event loop: место блокировки и апдейт, который обрабатывается"""
+        stack = traceback.extract_stack(frame)
+        update = None
+
+        current = frame
+        while current is not None and update is None:
+            for name in ("event", "update"):
+                value = current.f_locals.get(name)
+                description = describe_update(value) if value is not None else None
+                if description:
+                    update = description
+                    break
+            current = current.f_back
+
+        project = [entry for entry in stack if _is_project_frame(entry.filename)]
+        blocking = project[-1] if project else stack[-1]
+        location = f"{os.path.relpath(blocking.filename, _PROJECT_ROOT)}:{blocking.lineno} {blocking.name}"
+
+        lines = [f"{os.path.relpath(entry.filename, _PROJECT_ROOT) if _is_project_frame(entry.filename) else entry.filename}"
+                 f":{entry.lineno} {entry.name}" for entry in stack[-12:]]
+        return location, update or "", lines
+
+    # ---------- Отчет ----------
+
+    def top(self, limit: int = 10) -> List[dict]:
+        """Места, дольше всего блокировавшие loop"""
+        return [spot.to_dict() for spot in sorted(self.spots.values(), key=lambda item: -item.total)[:limit]]
+
+    def reset(self):
+        self.spots.clear()
+
+
+# Глобальный экземпляр (LOOP_WATCHDOG_THRESHOLD_MS=0 - только замер задержки, без стеков)
+loop_watchdog = LoopWatchdog(threshold=float(os.getenv("LOOP_WATCHDOG_THRESHOLD_MS", "100")) / 1000)
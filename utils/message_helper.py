@@ -39,6 +39,30 @@ async def send_formatted(
     Returns:
         Message: отправленное сообщение или None при ошибке
     """
+    _message_stats['in_flight'] += 1
+    try:
+        result = await _send_formatted(
+            obj, text, reply_markup, edit, parse_mode,
+            disable_web_page_preview, protect_content, reply_to_message_id
+        )
+    finally:
+        _message_stats['in_flight'] -= 1
+
+    _message_stats['sent' if result is not None else 'errors'] += 1
+    return result
+
+
+async def _send_formatted(
+        obj: Union[Message, CallbackQuery],
+        text: str,
+        reply_markup: Optional[Union[InlineKeyboardMarkup, ReplyKeyboardMarkup]] = None,
+        edit: bool = False,
+        parse_mode: str = "Markdown",
+        disable_web_page_preview: bool = True,
+        protect_content: bool = False,
+        reply_to_message_id: Optional[int] = None
+) -> Optional[Message]:
+    """Отправка без учета статистики (см. send_formatted)"""
     try:
         # Валидация текста
         if not text or not text.strip():
@@ -92,6 +116,7 @@ async def send_formatted(
 
     except TelegramRetryAfter as e:
         # Обработка rate limit
+        _message_stats['rate_limits'] += 1
         logger.warning(f"Rate limit: ждем {e.retry_after} секунд")
         await asyncio.sleep(e.retry_after)
 
@@ -393,7 +418,8 @@ async def edit_message(obj, text, **kwargs):
 _message_stats = {
     'sent': 0,
     'errors': 0,
-    'rate_limits': 0
+    'rate_limits': 0,
+    'in_flight': 0
 }
 
 
@@ -402,10 +428,20 @@ def get_message_stats() -> dict:
     return _message_stats.copy()
 
 
+async def drain_sends(timeout: float = 5.0) -> int:
+    """Ожидание завершения начатых отправок (при остановке); возвращает, сколько не успело"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while _message_stats['in_flight'] > 0 and loop.time() < deadline:
+        await asyncio.sleep(0.05)
+    return _message_stats['in_flight']
+
+
 def reset_message_stats():
     """Сбросить статистику"""
-    global _message_stats
-    _message_stats = {'sent': 0, 'errors': 0, 'rate_limits': 0}
+    # Очищаем на месте: in_flight отражает текущие отправки и не сбрасывается
+    for key in ('sent', 'errors', 'rate_limits'):
+        _message_stats[key] = 0
 
 
 logger.info("✅ Message helper загружен (Supabase версия)")
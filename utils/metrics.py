@@ -0,0 +1,374 @@
+"""
+Метрики Ryabot Island в формате Prometheus (text exposition 0.0.4)
+Счетчики - обычные словари по кортежу меток без блокировок: все изменения
+идут из одного event loop, поэтому инкремент стоит как запись в dict и
+метрики можно держать включенными в продакшене
+"""
+import bisect
+import logging
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Корзины задержек (секунды)
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Монотонный счетчик"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, value: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def get(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Значение, которое может уменьшаться"""
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def dec(self, *labels, value: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - value
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}  # метки -> [счетчики корзин..., +Inf, sum]
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series[:-1]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Метрика, значение которой читается при сборе (статистика, которая уже где-то считается)"""
+
+    def __init__(self, name: str, documentation: str, kind: str,
+                 read: Callable[[], object], labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self._read = read
+
+    def samples(self) -> List[str]:
+        value = self._read()
+        if isinstance(value, dict):
+            items = value.items()
+        else:
+            items = [((), value)]
+        return [f"{self.name}{_format_labels(self.labelnames, labels if isinstance(labels, tuple) else (labels,))} "
+                f"{_format_value(sample)}" for labels, sample in items]
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None and type(existing) is type(metric) and not isinstance(metric, CallbackMetric):
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, read: Callable[[], object],
+                 kind: str = "gauge", labelnames: Tuple[str, ...] = ()) -> CallbackMetric:
+        """Регистрирует (или заменяет) метрику, читаемую при сборе"""
+        return self._register(CallbackMetric(name, documentation, kind, read, labelnames))
+
+    def render(self) -> str:
+        """Текст для GET /metrics"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрики {metric.name}: {e}")
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+# Глобальный реестр
+metrics = MetricsRegistry()
+
+# Общие метрики бота
+updates_total = metrics.counter("ryabot_updates_total", "Обработанные апдейты", ("type",))
+update_duration = metrics.histogram("ryabot_update_duration_seconds", "Полное время обработки апдейта", ("type",))
+update_errors = metrics.counter("ryabot_update_errors_total", "Апдейты, завершившиеся исключением", ("type",))
+handler_duration = metrics.histogram(
+    "ryabot_handler_duration_seconds", "Время обработчика (вместе с внутренними middleware)", ("router", "handler")
+)
+loop_lag = metrics.gauge("ryabot_event_loop_lag_seconds", "Последняя измеренная задержка event loop (utils.loop_watchdog)")
+loop_lag_max = metrics.gauge("ryabot_event_loop_lag_max_seconds", "Максимальная задержка event loop с запуска")
+
+
+class _DBLatencyMetric(_Metric):
+    """Гистограммы задержек из utils.db_metrics (мс -> секунды)"""
+    kind = "histogram"
+
+    def samples(self) -> List[str]:
+        from utils.db_metrics import db_metrics, LATENCY_BUCKETS_MS
+
+        lines = []
+        for operation, histogram in list(db_metrics.latency.items()):
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS_MS, float("inf")), histogram.counts):
+                cumulative += count
+                le = _format_labels(self.labelnames, (operation,), f'le="{_format_value(float(bound) / 1000)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, (operation,))
+            lines.append(f"{self.name}_sum{plain} {_format_value(histogram.sum_ms / 1000)}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+metrics._register(_DBLatencyMetric("ryabot_db_query_duration_seconds", "Задержка запросов к БД", ("operation",)))
+
+
+def _db_calls() -> dict:
+    from utils.db_metrics import db_metrics
+    return {tuple(key.split(".", 1)): count for key, count in list(db_metrics.calls.items())}
+
+
+metrics.callback("ryabot_db_calls_total", "Запросы к БД", _db_calls, kind="counter", labelnames=("table", "operation"))
+
+
+def _db_coalesced() -> dict:
+    from utils.db_metrics import db_metrics
+    return {tuple(key.split(".", 1)): count for key, count in list(db_metrics.coalesced.items())}
+
+
+metrics.callback("ryabot_db_coalesced_total", "Чтения, склеенные с одновременным таким же запросом (singleflight)",
+                 _db_coalesced, kind="counter", labelnames=("table", "operation"))
+
+
+def _user_cache_stat(key: str) -> Callable[[], float]:
+    def read() -> float:
+        from database.user_cache import user_cache
+        return user_cache.snapshot()[key]
+    return read
+
+
+metrics.callback("ryabot_user_cache_hits_total", "Чтения профиля из кэша процесса", _user_cache_stat('hits'), kind="counter")
+metrics.callback("ryabot_user_cache_misses_total", "Чтения профиля мимо кэша", _user_cache_stat('misses'), kind="counter")
+metrics.callback("ryabot_user_cache_evictions_total", "Вытеснения из кэша профилей по бюджету памяти",
+                 _user_cache_stat('evictions'), kind="counter")
+metrics.callback("ryabot_user_cache_entries", "Профили в кэше процесса", _user_cache_stat('entries'))
+metrics.callback("ryabot_user_cache_bytes", "Оценка памяти кэша профилей", _user_cache_stat('bytes'))
+
+
+def _breaker_stat(key: str) -> Callable[[], float]:
+    def read() -> float:
+        from database.circuit_breaker import db_breaker
+        return db_breaker.stats[key]
+    return read
+
+
+def _breaker_open() -> float:
+    from database.circuit_breaker import db_breaker
+    return 1 if db_breaker.is_open else 0
+
+
+metrics.callback("ryabot_db_breaker_open", "Предохранитель БД разомкнут (1) или замкнут (0)", _breaker_open)
+metrics.callback("ryabot_db_breaker_rejected_total", "Запросы, отклоненные разомкнутым предохранителем",
+                 _breaker_stat('rejected'), kind="counter")
+metrics.callback("ryabot_db_breaker_failures_total", "Сбои БД (таймауты, соединение)", _breaker_stat('failures'),
+                 kind="counter")
+metrics.callback("ryabot_db_breaker_opened_total", "Размыкания предохранителя БД", _breaker_stat('opened'),
+                 kind="counter")
+
+
+def _limiter_stat(key: str) -> Callable[[], float]:
+    def read() -> float:
+        from database.concurrency import db_limiter
+        return db_limiter.snapshot()[key]
+    return read
+
+
+metrics.callback("ryabot_db_concurrency_limit", "Текущий адаптивный лимит параллельных запросов к БД",
+                 _limiter_stat('limit'))
+metrics.callback("ryabot_db_in_flight", "Запросы к БД в полете", _limiter_stat('in_flight'))
+metrics.callback("ryabot_db_queue_length", "Запросы к БД в очереди лимитера", _limiter_stat('queue'))
+
+
+def _limiter_timeouts() -> dict:
+    from database.concurrency import db_limiter
+    return {(name,): count for name, count in db_limiter.timeouts_by_priority.items()}
+
+
+metrics.callback("ryabot_db_queue_timeouts_total", "Запросы, не дождавшиеся слота к БД", _limiter_timeouts,
+                 kind="counter", labelnames=("priority",))
+
+
+def _admission_stat(key: str) -> Callable[[], dict]:
+    def read() -> dict:
+        from middlewares.admission import admission
+        return {(name,): stats[key] for name, stats in admission.stats.items()}
+    return read
+
+
+def _admission_queue() -> dict:
+    from middlewares.admission import admission
+    return {(name,): length for name, length in admission.snapshot()['queued'].items()}
+
+
+def _admission_active() -> float:
+    from middlewares.admission import admission
+    return admission.active
+
+
+metrics.callback("ryabot_admission_active", "Апдейты в обработке (контроль допуска)", _admission_active)
+metrics.callback("ryabot_admission_queue", "Апдейты в очереди допуска", _admission_queue, labelnames=("class",))
+metrics.callback("ryabot_admission_shed_total", "Апдейты, сброшенные при перегрузке", _admission_stat('shed'),
+                 kind="counter", labelnames=("class",))
+metrics.callback("ryabot_admission_queued_total", "Апдейты, ожидавшие в очереди допуска", _admission_stat('queued'),
+                 kind="counter", labelnames=("class",))
+
+
+def _degraded_stat(key: str) -> Callable[[], float]:
+    def read() -> float:
+        from middlewares.degraded_mode import degraded_mode
+        return degraded_mode.stats[key]
+    return read
+
+
+metrics.callback("ryabot_degraded_cached_total", "Ответы сохраненным экраном при недоступности БД",
+                 _degraded_stat('served_cached'), kind="counter")
+metrics.callback("ryabot_degraded_unavailable_total", "Ответы без сохраненного экрана при недоступности БД",
+                 _degraded_stat('served_unavailable'), kind="counter")
+
+
+def _routing_stat(key: str) -> Callable[[], float]:
+    def read() -> float:
+        from utils.callback_routing import callback_routing
+        return callback_routing.stats[key]
+    return read
+
+
+metrics.callback("ryabot_callback_routed_total", "Нажатия, направленные по таблице callback_data",
+                 _routing_stat('routed'), kind="counter")
+metrics.callback("ryabot_callback_routing_fallback_total", "Нажатия, ушедшие в обычный обход роутеров",
+                 _routing_stat('fallback'), kind="counter")
+metrics.callback("ryabot_callback_candidates_total", "Обработчики, проверенные таблицей callback_data",
+                 _routing_stat('candidates_checked'), kind="counter")
+
+
+def _codec_stat(key: str) -> Callable[[], float]:
+    def read() -> float:
+        from utils.callback_codec import callback_codec
+        return callback_codec.stats[key]
+    return read
+
+
+metrics.callback("ryabot_callback_decoded_total", "Кнопки в компактном формате callback_data",
+                 _codec_stat('decoded'), kind="counter")
+metrics.callback("ryabot_callback_legacy_total", "Кнопки старого формата callback_data", _codec_stat('legacy'),
+                 kind="counter")
+metrics.callback("ryabot_callback_invalid_total", "Устаревшие или поврежденные callback_data",
+                 _codec_stat('invalid'), kind="counter")
+
+
+def _message_stat(key: str) -> Callable[[], float]:
+    def read() -> float:
+        from utils.message_helper import get_message_stats
+        return get_message_stats().get(key, 0)
+    return read
+
+
+metrics.callback("ryabot_messages_sent_total", "Отправленные сообщения", _message_stat('sent'), kind="counter")
+metrics.callback("ryabot_message_errors_total", "Ошибки отправки сообщений", _message_stat('errors'), kind="counter")
+metrics.callback("ryabot_message_rate_limits_total", "Ответы Telegram RetryAfter", _message_stat('rate_limits'), kind="counter")
+metrics.callback("ryabot_outbound_in_flight", "Исходящие запросы к Bot API в ожидании ответа", _message_stat('in_flight'))
+
+
+def register_throttling(throttling, prefix: str = "ryabot") -> None:
+    """Экспорт счетчиков ThrottlingMiddleware"""
+    metrics.callback(f"{prefix}_throttled_requests_total", "Отклоненные по rate limit действия",
+                     lambda: throttling.stats['throttled_requests'], kind="counter")
+    metrics.callback(f"{prefix}_blocked_requests_total", "Действия временно заблокированных пользователей",
+                     lambda: throttling.stats['blocked_requests'], kind="counter")
+    metrics.callback(f"{prefix}_blocked_users", "Пользователи под временной блокировкой",
+                     lambda: len(throttling.blocked_users))
+
+
+logger.info("✅ Metrics registry загружен")
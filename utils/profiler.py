@@ -0,0 +1,153 @@
+"""
+Выборочный профайлер цепочки обработки апдейтов Ryabot Island
+Для доли апдейтов (PROFILE_SAMPLE_RATE, по умолчанию 0 - выключен) замеряет
+wall и CPU время каждого middleware и обработчика. Собственное время шага
+(без вложенных) копится по пути в цепочке, что дает collapsed stacks для
+flamegraph.pl / speedscope:
+
+    callback_query;UpdateMetricsMiddleware;ThrottlingMiddleware;handlers.academy.academy_main 1834
+
+CPU время снимается через time.thread_time(): пока шаг ждет await, в том же
+потоке могут выполняться другие апдейты, поэтому CPU у шагов с I/O - оценка
+сверху; wall время точное
+"""
+import os
+import time
+import random
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class StepStats:
+    """Суммарное время шага цепочки: wall/cpu - вместе с вложенными, self_* - без них"""
+    count: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    self_wall: float = 0.0
+    self_cpu: float = 0.0
+    max_wall: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'avg_wall_ms': round(self.wall / self.count * 1000, 3) if self.count else 0.0,
+            'avg_cpu_ms': round(self.cpu / self.count * 1000, 3) if self.count else 0.0,
+            'avg_self_wall_ms': round(self.self_wall / self.count * 1000, 3) if self.count else 0.0,
+            'avg_self_cpu_ms': round(self.self_cpu / self.count * 1000, 3) if self.count else 0.0,
+            'max_wall_ms': round(self.max_wall * 1000, 3)
+        }
+
+
+class _Sample:
+    """Стек открытых шагов одного профилируемого апдейта"""
+
+    __slots__ = ("names", "frames")
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.frames: List[list] = []  # [начало wall, начало cpu, wall вложенных, cpu вложенных]
+
+
+_current_sample: ContextVar[Optional[_Sample]] = ContextVar("profile_sample", default=None)
+
+
+class Profiler:
+    """Агрегатор замеров (без блокировок - все в одном event loop)"""
+
+    def __init__(self, sample_rate: float = 0.0):
+        self.sample_rate = sample_rate
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def reset(self):
+        self.steps: Dict[str, StepStats] = {}
+        self.stacks: Counter = Counter()  # путь "a;b;c" -> собственное wall время, мкс
+        self.sampled = 0
+
+    # ---------- Апдейт ----------
+
+    def begin_update(self, name: str) -> Optional[object]:
+        """Решает, профилировать ли апдейт; возвращает токен для end_update или None"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        sample = _Sample()
+        token = _current_sample.set(sample)
+        self.enter(name)
+        return token
+
+    def end_update(self, token: Optional[object]):
+        if token is None:
+            return
+        self.exit()
+        _current_sample.reset(token)
+        self.sampled += 1
+
+    # ---------- Шаги ----------
+
+    @staticmethod
+    def active() -> bool:
+        """Текущий апдейт профилируется"""
+        return _current_sample.get() is not None
+
+    def enter(self, name: str):
+        sample = _current_sample.get()
+        if sample is None:
+            return
+        sample.names.append(name)
+        sample.frames.append([time.perf_counter(), time.thread_time(), 0.0, 0.0])
+
+    def exit(self):
+        sample = _current_sample.get()
+        if sample is None or not sample.frames:
+            return
+
+        started_wall, started_cpu, child_wall, child_cpu = sample.frames.pop()
+        wall = time.perf_counter() - started_wall
+        cpu = time.thread_time() - started_cpu
+
+        path = ";".join(sample.names)
+        name = sample.names.pop()
+
+        stats = self.steps.get(name)
+        if stats is None:
+            stats = self.steps[name] = StepStats()
+        stats.count += 1
+        stats.wall += wall
+        stats.cpu += cpu
+        stats.self_wall += max(0.0, wall - child_wall)
+        stats.self_cpu += max(0.0, cpu - child_cpu)
+        stats.max_wall = max(stats.max_wall, wall)
+
+        self.stacks[path] += max(0, int((wall - child_wall) * 1_000_000))
+
+        if sample.frames:
+            parent = sample.frames[-1]
+            parent[2] += wall
+            parent[3] += cpu
+
+    # ---------- Отчеты ----------
+
+    def collapsed(self) -> str:
+        """Collapsed stacks (мкс собственного wall времени) для flamegraph"""
+        return "".join(f"{path} {value}\n" for path, value in sorted(self.stacks.items()) if value > 0)
+
+    def top(self, limit: int = 10) -> List[dict]:
+        """Шаги с наибольшим собственным wall временем"""
+        ordered = sorted(self.steps.items(), key=lambda item: -item[1].self_wall)[:limit]
+        return [{'step': name, **stats.to_dict()} for name, stats in ordered]
+
+    def snapshot(self) -> dict:
+        return {'sample_rate': self.sample_rate, 'sampled_updates': self.sampled, 'steps': self.top(len(self.steps))}
+
+
+# Глобальный экземпляр
+profiler = Profiler(sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")))
@@ -0,0 +1,88 @@
+"""
+Шардирование апдейтов между воркерами Ryabot Island
+Фронт (webhook_front.py) отправляет апдейт воркеру по user_id: все апдейты
+игрока обрабатывает один процесс, поэтому порядок действий игрока и кэши
+процесса (throttling, энергия, FSM в памяти) остаются корректными.
+
+Переменные окружения:
+    WEBHOOK_WORKERS   - количество воркеров (по умолчанию 1 - без шардирования)
+    WORKER_INDEX      - номер воркера (задает фронт при запуске)
+    WORKER_BASE_PORT  - порт воркера 0, воркер i слушает WORKER_BASE_PORT + i
+    REDIS_URL         - общее FSM хранилище воркеров (aiogram RedisStorage)
+"""
+import os
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Типы апдейтов, у которых пользователь лежит в поле "from" / "user"
+_USER_FIELDS = (
+    ("message", "from"),
+    ("callback_query", "from"),
+    ("edited_message", "from"),
+    ("inline_query", "from"),
+    ("chosen_inline_result", "from"),
+    ("shipping_query", "from"),
+    ("pre_checkout_query", "from"),
+    ("my_chat_member", "from"),
+    ("chat_member", "from"),
+    ("chat_join_request", "from"),
+    ("poll_answer", "user"),
+)
+
+
+def shard_key(update: dict) -> int:
+    """user_id апдейта (сырой JSON Telegram); 0 - апдейт без пользователя"""
+    for update_type, field in _USER_FIELDS:
+        event = update.get(update_type)
+        if event is None:
+            continue
+        user = event.get(field)
+        if user and "id" in user:
+            return int(user["id"])
+        chat = event.get("chat")
+        if chat and "id" in chat:
+            return abs(int(chat["id"]))
+        return 0
+    return 0
+
+
+def shard_for(update: dict, workers: int) -> int:
+    """Номер воркера для апдейта (стабилен между перезапусками)"""
+    return shard_key(update) % workers if workers > 1 else 0
+
+
+def worker_count() -> int:
+    return max(1, int(os.getenv("WEBHOOK_WORKERS", "1")))
+
+
+def worker_index() -> Optional[int]:
+    """Номер текущего воркера; None - процесс запущен без фронта"""
+    value = os.getenv("WORKER_INDEX")
+    return int(value) if value not in (None, "") else None
+
+
+def worker_port(index: int) -> int:
+    return int(os.getenv("WORKER_BASE_PORT", "8100")) + index
+
+
+def is_primary_worker() -> bool:
+    """Воркер, на котором идут общие фоновые задачи (одиночный процесс или воркер 0)"""
+    return worker_index() in (None, 0)
+
+
+def make_fsm_storage():
+    """FSM хранилище: RedisStorage при REDIS_URL (общее для воркеров), иначе в памяти"""
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+            storage = RedisStorage.from_url(redis_url)
+            logger.info("✅ FSM хранилище: Redis")
+            return storage
+        except ImportError:
+            logger.warning("⚠️ REDIS_URL задан, но пакет redis не установлен - FSM в памяти")
+
+    from aiogram.fsm.storage.memory import MemoryStorage
+    return MemoryStorage()
@@ -0,0 +1,75 @@
+"""
+Singleflight для Ryabot Island
+Одновременные одинаковые запросы на чтение склеиваются: первый вызов идет в
+бэкенд, остальные ждут его результат. Быстрые нажатия игрока и пара
+middleware + обработчик, которые читают профиль почти одновременно, дают
+один запрос к БД вместо нескольких
+"""
+import copy
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Склейка одновременных вызовов с одинаковым ключом (без блокировок - один event loop)"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._by_group: Dict[str, Set[Hashable]] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], group: str = "") -> Tuple[Any, bool]:
+        """
+        Выполняет fn или присоединяется к уже идущему вызову с тем же ключом
+
+        Returns:
+            (результат, склеен ли вызов). Присоединившиеся получают копию
+            результата, чтобы изменения у одного вызывающего не задели других
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            try:
+                return copy.deepcopy(await asyncio.shield(future)), True
+            except asyncio.CancelledError:
+                # Отменили ведущий вызов, а не нас - выполняем запрос сами
+                task = asyncio.current_task()
+                if not future.cancelled() or (task is not None and task.cancelling()):
+                    raise
+                return await fn(), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self._by_group.setdefault(group, set()).add(key)
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # помечаем как полученное, если присоединившихся не было
+            raise
+        finally:
+            self._release(key, future, group)
+
+    def _release(self, key: Hashable, future: asyncio.Future, group: str):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+            keys = self._by_group.get(group)
+            if keys is not None:
+                keys.discard(key)
+
+    def forget_group(self, group: str):
+        """
+        Новые вызовы группы не присоединяются к уже идущим (после записи в
+        таблицу: чтение, начатое до записи, могло вернуть старые данные)
+        """
+        for key in self._by_group.pop(group, ()):
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,143 @@
+"""
+Граф шагов запуска Ryabot Island
+Шаги старта объявляются с зависимостями и выполняются параллельно: каждый
+ждет только свои зависимости, поэтому сетевые проверки (getMe,
+deleteWebhook, подключение к БД) идут одновременно и время до первого
+апдейта - примерно один round-trip. У каждого шага свой таймаут.
+
+- required: ошибка или таймаут шага прерывает запуск (StartupError)
+- background: шаг не задерживает запуск, результат только логируется
+
+Использование:
+    graph = StartupGraph()
+    graph.add("bot", setup_bot)
+    graph.add("bot_info", lambda bot: get_bot_info(bot[0]), deps=("bot",), timeout=10)
+    results = await graph.run()
+"""
+import time
+import asyncio
+import inspect
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StartupError(RuntimeError):
+    """Обязательный шаг запуска завершился ошибкой или по таймауту"""
+
+
+@dataclass
+class StartupStep:
+    """Шаг запуска: func получает результаты зависимостей позиционно, в порядке deps"""
+    name: str
+    func: Callable
+    deps: Tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    required: bool = True
+    background: bool = False
+
+
+class StartupGraph:
+    """Параллельное выполнение шагов запуска по зависимостям"""
+
+    def __init__(self):
+        self.steps: Dict[str, StartupStep] = {}
+        self.durations: Dict[str, float] = {}
+        self.background: List[asyncio.Task] = []
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add(self, name: str, func: Callable, deps: Tuple[str, ...] = (), timeout: Optional[float] = None,
+            required: bool = True, background: bool = False) -> "StartupGraph":
+        """
+        Добавление шага
+
+        Args:
+            func: функция или корутина; получает результаты deps
+            timeout: таймаут шага в секундах (без учета ожидания зависимостей)
+            required: ошибка шага прерывает запуск
+            background: не ждать шаг в run() (не может быть обязательным)
+        """
+        if name in self.steps:
+            raise ValueError(f"Шаг запуска {name} уже добавлен")
+        for dep in deps:
+            if dep not in self.steps:
+                raise ValueError(f"Шаг {name}: неизвестная зависимость {dep}")
+            if self.steps[dep].background and not background:
+                raise ValueError(f"Шаг {name} не может зависеть от фонового шага {dep}")
+
+        self.steps[name] = StartupStep(name, func, tuple(deps), timeout, required and not background, background)
+        return self
+
+    async def _run_step(self, step: StartupStep) -> Any:
+        try:
+            args = [await self._tasks[dep] for dep in step.deps]
+        except Exception:
+            # Упавшая зависимость уже залогирована
+            raise StartupError(f"{step.name}: не выполнены зависимости")
+
+        started = time.perf_counter()
+        try:
+            result = step.func(*args)
+            if inspect.isawaitable(result):
+                result = await asyncio.wait_for(result, step.timeout)
+            return result
+
+        except asyncio.TimeoutError:
+            message = f"{step.name}: таймаут" + (f" {step.timeout:g} с" if step.timeout else "")
+            if step.required:
+                logger.error(f"❌ Запуск: {message}")
+                raise StartupError(message)
+            logger.warning(f"⚠️ Запуск: {message}")
+            return None
+
+        except StartupError:
+            raise
+
+        except Exception as e:
+            if step.required:
+                logger.error(f"❌ Запуск: шаг {step.name} - {e}")
+                raise StartupError(f"{step.name}: {e}") from e
+            logger.warning(f"⚠️ Запуск: шаг {step.name} - {e}")
+            return None
+
+        finally:
+            self.durations[step.name] = (time.perf_counter() - started) * 1000
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Выполнение графа; возвращает результаты нефоновых шагов.
+        Фоновые шаги продолжают работать (self.background)
+        """
+        started = time.perf_counter()
+
+        for step in self.steps.values():
+            task = asyncio.create_task(self._run_step(step), name=f"startup:{step.name}")
+            self._tasks[step.name] = task
+            if step.background:
+                self.background.append(task)
+                task.add_done_callback(self._consume_background)
+
+        foreground = {name: task for name, task in self._tasks.items() if not self.steps[name].background}
+        try:
+            await asyncio.gather(*foreground.values())
+        except BaseException:
+            self.cancel()
+            raise
+
+        logger.info(f"⏱️ Запуск: {(time.perf_counter() - started) * 1000:.0f} мс "
+                    f"({', '.join(f'{name} {self.durations.get(name, 0):.0f}' for name in foreground)})")
+        return {name: task.result() for name, task in foreground.items()}
+
+    @staticmethod
+    def _consume_background(task: asyncio.Task):
+        # Исключение фонового шага уже залогировано - не даем asyncio ругаться на него
+        if not task.cancelled():
+            task.exception()
+
+    def cancel(self):
+        """Отмена незавершенных шагов (в том числе фоновых)"""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
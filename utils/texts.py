@@ -136,31 +136,21 @@ def t(key: str, lang: str = 'ru', **kwargs) -> str:
 
 def get_game_prices(lang: str = 'ru') -> dict:
     """
-    Получает игровые цены из локализации
+    Получает игровые цены из единой таблицы цен (game.economy)
     Используется для отображения экономической информации
 
     Args:
-        lang: код языка
+        lang: код языка (цены от языка не зависят, оставлен для совместимости)
 
     Returns:
         dict: словарь с ценами
     """
-    try:
-        if lang == 'ru':
-            from locales.ru import GAME_PRICES
-            return GAME_PRICES
-        else:
-            # Fallback на русские цены
-            from locales.ru import GAME_PRICES
-            return GAME_PRICES
-    except ImportError:
-        logger.error(f"❌ Не удалось загрузить цены для языка '{lang}'")
-        # Минимальные цены по умолчанию
-        return {
-            'ryaba_price': 250,
-            'rooster_price': 500,
-            'rbtc_rate': 100
-        }
+    from game.economy import pricing
+
+    table = pricing.table
+    prices = table.prices_dict()
+    prices.setdefault('hire_cost', table.hire_cost(0))
+    return prices
 
 def validate_localization(lang: str = 'ru') -> tuple[bool, list[str]]:
     """
@@ -0,0 +1,172 @@
+"""
+Фронт-диспетчер webhook для Ryabot Island (несколько воркеров на одном хосте)
+Принимает webhook Telegram и пересылает сырой апдейт воркеру по user_id
+(utils.sharding): все апдейты игрока идут в один процесс и по порядку.
+Фронт не импортирует aiogram и обработчики - только разбор JSON и проксирование.
+
+Запуск (фронт + WEBHOOK_WORKERS процессов webhook_server):
+    WEBHOOK_WORKERS=4 python webhook_front.py
+"""
+import os
+import sys
+import json
+import signal
+import asyncio
+import logging
+import subprocess
+from typing import Dict, List, Optional
+
+import aiohttp
+from fastapi import FastAPI, Request, Response
+from dotenv import load_dotenv
+
+from utils.sharding import shard_for, shard_key, worker_count, worker_port
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+WORKERS = worker_count()
+FORWARD_TIMEOUT = float(os.getenv("FORWARD_TIMEOUT", "55"))
+
+app = FastAPI(title="Ryabot Island Front", version="1.0.0")
+
+_session: Optional[aiohttp.ClientSession] = None
+# Последний апдейт каждого игрока в пересылке: следующий ждет его завершения
+_user_tails: Dict[int, asyncio.Future] = {}
+_stats = {'forwarded': 0, 'worker_errors': 0, 'per_worker': [0] * WORKERS}
+
+
+async def _forward(worker: int, body: bytes, headers: Dict[str, str]) -> Response:
+    url = f"http://127.0.0.1:{worker_port(worker)}/webhook"
+    try:
+        async with _session.post(url, data=body, headers=headers,
+                                 timeout=aiohttp.ClientTimeout(total=FORWARD_TIMEOUT)) as response:
+            content = await response.read()
+            _stats['forwarded'] += 1
+            _stats['per_worker'][worker] += 1
+            return Response(content=content, status_code=response.status, media_type="application/json")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Не-2xx: Telegram повторит доставку, апдейт не потеряется
+        _stats['worker_errors'] += 1
+        logger.error(f"❌ Воркер {worker} недоступен: {e}")
+        return Response(content=b'{"ok": false}', status_code=503, media_type="application/json")
+
+
+@app.post("/webhook")
+async def telegram_webhook(request: Request):
+    """Пересылка апдейта воркеру игрока с сохранением порядка апдейтов игрока"""
+    body = await request.body()
+    update = json.loads(body)
+
+    user_id = shard_key(update)
+    worker = shard_for(update, WORKERS)
+    headers = {"Content-Type": "application/json"}
+    secret = request.headers.get("X-Telegram-Bot-Api-Secret-Token")
+    if secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret
+
+    if not user_id:
+        return await _forward(worker, body, headers)
+
+    previous = _user_tails.get(user_id)
+    done = asyncio.get_running_loop().create_future()
+    _user_tails[user_id] = done
+    try:
+        if previous is not None:
+            await previous
+        return await _forward(worker, body, headers)
+    finally:
+        done.set_result(None)
+        if _user_tails.get(user_id) is done:
+            del _user_tails[user_id]
+
+
+@app.get("/health")
+async def health_check():
+    """Состояние фронта и воркеров"""
+    workers: List[dict] = []
+    for index in range(WORKERS):
+        try:
+            async with _session.get(f"http://127.0.0.1:{worker_port(index)}/health",
+                                    timeout=aiohttp.ClientTimeout(total=2)) as response:
+                workers.append({"worker": index, "status": "ok" if response.status == 200 else response.status})
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            workers.append({"worker": index, "status": "down"})
+
+    return {"status": "ok", "bot": "Ryabot Island", "workers": workers,
+            "in_order_queues": len(_user_tails), **_stats}
+
+
+async def _set_webhook():
+    """Установка webhook напрямую через Bot API (без импорта aiogram)"""
+    webhook_url = os.getenv("WEBHOOK_URL")
+    if not webhook_url:
+        logger.error("❌ WEBHOOK_URL not set in environment variables")
+        return
+
+    api = f"https://api.telegram.org/bot{os.getenv('BOT_TOKEN')}"
+    try:
+        async with _session.get(f"{api}/getWebhookInfo") as response:
+            info = (await response.json()).get("result", {})
+        if info.get("url") == webhook_url:
+            logger.info(f"✅ Webhook уже установлен: {webhook_url}")
+            return
+        async with _session.post(f"{api}/setWebhook", json={"url": webhook_url}) as response:
+            result = await response.json()
+        if result.get("ok"):
+            logger.info(f"✅ Webhook установлен: {webhook_url}")
+        else:
+            logger.error(f"❌ Ошибка установки webhook: {result.get('description')}")
+    except Exception as e:
+        logger.error(f"❌ Ошибка установки webhook: {e}")
+
+
+@app.on_event("startup")
+async def on_startup():
+    global _session
+    _session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+    await _set_webhook()
+    logger.info(f"✅ Фронт запущен: {WORKERS} воркеров, порты {worker_port(0)}-{worker_port(WORKERS - 1)}")
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    if _session is not None:
+        await _session.close()
+
+
+def spawn_workers() -> List[subprocess.Popen]:
+    """Запуск воркеров webhook_server (каждый со своим WORKER_INDEX и портом)"""
+    processes = []
+    for index in range(WORKERS):
+        env = {**os.environ, "WORKER_INDEX": str(index), "WEBHOOK_WORKERS": str(WORKERS),
+               "HOST": "127.0.0.1", "PORT": str(worker_port(index))}
+        # webhook_server.run: прием апдейтов закрывается сразу по SIGTERM
+        processes.append(subprocess.Popen([sys.executable, "-m", "webhook_server"], env=env))
+    return processes
+
+
+def run():
+    """Фронт + воркеры; SIGTERM воркерам - остановка без потерь (utils.lifecycle)"""
+    import uvicorn
+
+    processes = spawn_workers()
+    try:
+        uvicorn.run(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8000")))
+    finally:
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        for process in processes:
+            try:
+                process.wait(timeout=float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "25")) + 5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+if __name__ == "__main__":
+    run()
@@ -1,10 +1,13 @@
 """
 FastAPI webhook сервер для Ryabot Island (только Supabase)
+
+Запуск (прием апдейтов закрывается сразу по SIGTERM, см. run):
+    HOST=0.0.0.0 PORT=8000 python -m webhook_server
 """
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, JSONResponse
 from aiogram import Bot, Dispatcher
 from aiogram.types import Update
-from aiogram.fsm.storage.memory import MemoryStorage
 import os
 from dotenv import load_dotenv
 import logging
@@ -18,30 +21,57 @@ logging.basicConfig(
 
 load_dotenv()
 
-# Создание приложения
+from utils.sharding import make_fsm_storage, worker_index, is_primary_worker
+
+# Создание приложения (за webhook_front.py - один из воркеров, WORKER_INDEX)
 app = FastAPI(title="Ryabot Island", version="1.0.0")
 bot = Bot(token=os.getenv("BOT_TOKEN"))
-dp = Dispatcher(storage=MemoryStorage())
+dp = Dispatcher(storage=make_fsm_storage())
 
 # Middleware
+from middlewares.lifecycle import InFlightMiddleware
+from middlewares.metrics import setup_metrics
+from middlewares.db_accounting import DBAccountingMiddleware
 from middlewares.throttling import ThrottlingMiddleware
 
-dp.callback_query.middleware(ThrottlingMiddleware(rate_limit=0.3))
+# Учет апдейтов в обработке (для остановки без потерь) - самым внешним
+dp.update.outer_middleware(InFlightMiddleware())
 
-# Все роутеры в одном блоке
-from handlers import (
-    start, academy, town, farm, work,
-    citizen, storage, rankings, referral, about, admin
-)
+throttling = ThrottlingMiddleware(rate_limit=0.3)
+setup_metrics(dp, throttling)
+
+# Контроль допуска: при перегрузке онбординг и транзакции раньше навигации
+from middlewares.admission import admission
+dp.update.outer_middleware(admission)
+
+# callback_data разбирается один раз - обработчики получают payload
+from utils.callback_codec import callback_codec_middleware
+dp.callback_query.outer_middleware(callback_codec_middleware)
+
+db_accounting = DBAccountingMiddleware()
+dp.message.middleware(db_accounting)
+dp.callback_query.middleware(db_accounting)
+
+# При недоступности БД - последний экран игрока вместо ошибки
+from middlewares.degraded_mode import degraded_mode
+dp.message.middleware(degraded_mode)
+dp.callback_query.middleware(degraded_mode)
+
+dp.callback_query.middleware(throttling)
+
+# Все роутеры в одном блоке (LAZY_ROUTERS=1 - модули импортируются на первом своем апдейте)
+from utils.lazy_routers import include_handler_routers, log_import_report, import_report
 
-routers = [
-    start.router, academy.router, town.router, farm.router,
-    work.router, citizen.router, storage.router,
-    rankings.router, referral.router, about.router, admin.router
-]
+include_handler_routers(dp)
+log_import_report()
 
-for router in routers:
-    dp.include_router(router)
+# Нажатия кнопок - по таблице callback_data, без перебора фильтров всех роутеров
+from utils.callback_routing import setup_callback_routing
+setup_callback_routing(dp)
+
+# Профилирование оборачивает уже подключенные middleware - последним
+from middlewares.profiling import setup_profiling
+setup_profiling(dp)
 
 
 # ================== ENDPOINTS ==================
@@ -49,6 +79,13 @@ for router in routers:
 @app.post("/webhook")
 async def telegram_webhook(request: Request):
     """Обработка webhook от Telegram"""
+    from utils.lifecycle import lifecycle
+
+    # При остановке не берем новые апдейты: на не-2xx Telegram повторит доставку
+    if not lifecycle.accepting:
+        lifecycle.stats['rejected'] += 1
+        return JSONResponse({"ok": False, "error": "shutting down"}, status_code=503)
+
     data = await request.json()
     update = Update(**data)
     await dp.feed_update(bot=bot, update=update)
@@ -58,14 +95,53 @@ async def telegram_webhook(request: Request):
 @app.get("/health")
 async def health_check():
     """Проверка работоспособности"""
+    from database.circuit_breaker import db_breaker
     return {
-        "status": "ok",
+        "status": "degraded" if db_breaker.is_open else "ok",
         "bot": "Ryabot Island",
         "version": "1.0.0",
-        "database": "PostgreSQL/Supabase"
+        "database": "PostgreSQL/Supabase",
+        "database_breaker": db_breaker.state,
+        "worker": worker_index()
     }
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Метрики в формате Prometheus"""
+    from utils.metrics import metrics
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/profile")
+async def profile_endpoint(format: str = "json"):
+    """Профиль цепочки обработки: ?format=collapsed - collapsed stacks для flamegraph"""
+    from utils.profiler import profiler
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return profiler.snapshot()
+
+
+@app.get("/metrics/startup")
+async def startup_report_endpoint():
+    """Время импорта модулей handlers (в ленивом режиме - по мере первых апдейтов)"""
+    return {"lazy": os.getenv("LAZY_ROUTERS", "0") == "1", "imports": import_report()}
+
+
+@app.get("/metrics/slow")
+async def slow_callbacks_endpoint(limit: int = 10):
+    """Места в коде, дольше всего блокировавшие event loop"""
+    from utils.loop_watchdog import loop_watchdog
+    return {"threshold_ms": loop_watchdog.threshold * 1000, "top": loop_watchdog.top(limit)}
+
+
+@app.get("/metrics/db")
+async def db_metrics_endpoint():
+    """Запросы к БД: по таблицам/операциям, задержки и сводка по обработчикам"""
+    from utils.db_metrics import db_metrics
+    return db_metrics.snapshot()
+
+
 # ================== LIFECYCLE EVENTS ==================
 
 @app.on_event("startup")
@@ -82,7 +158,32 @@ async def on_startup():
     await init_database()
     await create_academy_tables()
 
-    # Установка webhook
+    # Фоновые задачи: пакетное завершение экспедиций, досыпка реферальных бонусов, сверка эмиссии RBTC
+    # и слежение за ценами: файл (если задан PRICES_FILE) и опубликованная в БД версия
+    # (на каждом воркере: /reload_prices db обрабатывает только один из них)
+    from game.expedition import expedition_completion_loop
+    from game.referrals import referral_sweep_loop
+    from game.rbtc import rbtc_emission
+    from game.economy import pricing, PRICES_DB_POLL
+    from utils.loop_watchdog import loop_watchdog
+    from utils.lifecycle import register_default_flushers
+    loop_watchdog.start()
+    register_default_flushers()
+    # Завершение экспедиций и досыпка бонусов общие для всех игроков - только на одном воркере
+    if is_primary_worker():
+        app.state.expedition_task = asyncio.create_task(expedition_completion_loop())
+        app.state.referral_task = asyncio.create_task(referral_sweep_loop())
+    app.state.emission_task = asyncio.create_task(rbtc_emission.run())
+    if pricing.prices_file:
+        app.state.prices_task = asyncio.create_task(pricing.watch_file())
+    if PRICES_DB_POLL > 0:
+        app.state.prices_db_task = asyncio.create_task(pricing.watch_db())
+
+    # Установка webhook (за фронтом webhook устанавливает фронт)
+    if worker_index() is not None:
+        logging.info(f"✅ Воркер {worker_index()} запущен")
+        return
+
     webhook_url = os.getenv("WEBHOOK_URL")
     if not webhook_url:
         logging.error("❌ WEBHOOK_URL not set in environment variables")
@@ -92,12 +193,21 @@ async def on_startup():
         webhook_info = await bot.get_webhook_info()
 
         if webhook_info.url == webhook_url:
+            # Накопившиеся апдейты Telegram доставит сам (повторные попытки webhook)
             logging.info(f"✅ Webhook уже установлен: {webhook_url}")
         else:
-            await bot.delete_webhook(drop_pending_updates=True)
-            await asyncio.sleep(1)
-            await bot.set_webhook(webhook_url, drop_pending_updates=True)
+            # Очередь за время перезапуска не сбрасывается: забираем ее до установки
+            # webhook и доигрываем в фоне с ограниченной скоростью (utils.backlog)
+            from utils.backlog import backlog
+            from utils.lifecycle import lifecycle
+            await bot.delete_webhook(drop_pending_updates=not backlog.enabled)
+            pending = await backlog.fetch(bot, ["message", "callback_query"]) if backlog.enabled else []
+            await bot.set_webhook(webhook_url)
             logging.info(f"✅ Webhook установлен: {webhook_url}")
+            if pending:
+                backlog.start(bot, dp, pending)
+                # Забранные апдейты Telegram уже не повторит: при остановке доигрываются до сброса буферов
+                lifecycle.add_flusher("накопившиеся апдейты", backlog.drain, first=True)
 
     except Exception as e:
         logging.error(f"❌ Ошибка установки webhook: {e}")
@@ -108,8 +218,51 @@ async def on_shutdown():
     """Очистка при остановке"""
     from database.models import close_connection_pool
 
-    await bot.delete_webhook()
+    from utils.loop_watchdog import loop_watchdog
+    from utils.lifecycle import lifecycle
+
+    loop_watchdog.stop()
+    for task_name in ("expedition_task", "referral_task", "emission_task", "prices_task", "prices_db_task"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
+
+    # Дождаться апдейтов в обработке и сбросить буферы (отправки, рефералы, RBTC)
+    await lifecycle.shutdown()
+
+    # При rolling restart webhook нужен новому экземпляру: WEBHOOK_DELETE_ON_SHUTDOWN=0
+    if worker_index() is None and os.getenv("WEBHOOK_DELETE_ON_SHUTDOWN", "1") == "1":
+        await bot.delete_webhook()
     await bot.session.close()
     await close_connection_pool()
 
     logging.info("✅ Приложение остановлено")
+
+
+# ================== ЗАПУСК ==================
+
+def run():
+    """
+    Запуск воркера (HOST/PORT из окружения)
+    SIGTERM/SIGINT сразу закрывают прием апдейтов (503): uvicorn после сигнала
+    еще дожидается открытых запросов, а хук shutdown срабатывает только после них
+    """
+    import uvicorn
+    from utils.lifecycle import lifecycle
+
+    class Server(uvicorn.Server):
+        async def serve(self, sockets=None):
+            # Обработчики сигналов uvicorn ставит внутри serve - цикл уже известен
+            self.loop = asyncio.get_running_loop()
+            await super().serve(sockets)
+
+        def handle_exit(self, sig, frame):
+            lifecycle.stop_intake(self.loop)
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8000")))
+    Server(config).run()
+
+
+if __name__ == "__main__":
+    run()